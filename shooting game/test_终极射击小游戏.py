@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+终极射击小游戏 • 模拟状态的测试
+=====================================================
+无头运行（SDL dummy 驱动），不用开窗口：
+
+    python -m pytest "shooting game"
+    python -m unittest discover -s "shooting game"
+"""
+
+import os
+import sys
+import random
+import tempfile
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import 终极射击小游戏 as game
+
+
+def play(state, frames, aim):
+    """跑若干渲染帧：每 6 帧朝一个随机敌人开一枪（玩家原地不动）"""
+    for _ in range(frames):
+        if state.frame % 6 == 0 and state.enemies:
+            state.fire_bullet(aim.choice(state.enemies.sprites()).rect.center)
+        state.update()
+
+
+def busy_state(frames=600):
+    """跑出一个子弹、敌人、小跟班、粒子、定时都有的局面"""
+    random.seed(3)
+    state = game.GameState()
+    play(state, frames, random.Random(5))
+    return state
+
+
+# ================== 快照 ==================
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.state = busy_state()
+        self.snap = game.snapshot_state(self.state)
+
+    def test_scenario_covers_every_section(self):
+        s = self.state
+        self.assertTrue(s.bullets and s.enemies and s.followers and s.follower_bullets)
+        self.assertTrue(s.enemy_particles and s.shots and s.timers.pending)
+        self.assertTrue(any(e.is_dying for e in s.enemies))
+
+    def test_restore_round_trip(self):
+        restored = game.restore_state(self.snap)
+        self.assertEqual(game.snapshot_state(restored), self.snap)
+
+    def test_delta_round_trip(self):
+        aim = random.Random(9)
+        base = self.snap
+        for frames in (1, 1, 30):
+            play(self.state, frames, aim)
+            snap = game.snapshot_state(self.state)
+            delta = game.snapshot_delta(base, snap)
+            self.assertTrue(delta.startswith(game.DELTA_MAGIC))
+            self.assertLess(len(delta), len(snap))
+            self.assertEqual(game.apply_snapshot_delta(base, delta), snap)
+            base = snap
+
+    def test_delta_rejects_wrong_base(self):
+        play(self.state, 1, random.Random(9))
+        snap = game.snapshot_state(self.state)
+        delta = game.snapshot_delta(self.snap, snap)
+        with self.assertRaises(ValueError):
+            game.apply_snapshot_delta(snap, delta)
+
+    def test_restored_state_runs_in_lockstep(self):
+        # 原局面和恢复出来的局面（连同随机数状态）往下跑同样的帧，每帧快照都要一样
+        restored = game.restore_state(self.snap)
+        rng = random.getstate()
+        expected = []
+        play_rng = random.Random(11)
+        for _ in range(120):
+            play(self.state, 1, play_rng)
+            expected.append(game.snapshot_state(self.state))
+
+        random.setstate(rng)
+        play_rng = random.Random(11)
+        for i, snap in enumerate(expected):
+            play(restored, 1, play_rng)
+            self.assertEqual(game.snapshot_state(restored), snap, "第 {} 帧分叉".format(i))
+
+    def test_resume_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            old = game.RESUME_FILE
+            game.RESUME_FILE = os.path.join(tmp, "resume.snap")
+            try:
+                game.save_resume(self.state)
+                resumed = game.load_resume()
+                game.clear_resume()
+                self.assertIsNone(game.load_resume())
+            finally:
+                game.RESUME_FILE = old
+        self.assertEqual(game.snapshot_state(resumed), self.snap)
+
+    def test_background_autosave(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            old = game.RESUME_FILE
+            game.RESUME_FILE = os.path.join(tmp, "resume.snap")
+            try:
+                writer = game.resume_writer
+                play(self.state, 1, random.Random(9))
+                newer = game.snapshot_state(self.state)
+                writer.submit(self.snap)
+                writer.submit(newer)              # 只有最新一份要紧
+                writer.wait()
+                with open(game.RESUME_FILE, 'rb') as f:
+                    self.assertEqual(f.read(), newer)
+                writer.submit(self.snap)
+                game.clear_resume()               # 删掉之后不会再被后台写回来
+                writer.wait()
+                self.assertFalse(os.path.exists(game.RESUME_FILE))
+            finally:
+                game.RESUME_FILE = old
+
+
+# ================== 时间轮 ==================
+SLOTS = 1 << game.TIMER_WHEEL_BITS
+SPAN = SLOTS ** game.TIMER_WHEEL_LEVELS        # 超过这么远的定时先进溢出表
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fired = []
+
+    def record(self, wheel, label):
+        self.fired.append((wheel.tick, label))
+
+    def schedule(self, wheel, tick, label):
+        return wheel.schedule(tick, self.record, wheel, label)
+
+    def test_fires_on_its_tick_across_levels(self):
+        for start in (0, SLOTS - 3, SLOTS * SLOTS - 3):
+            self.fired = []
+            wheel = game.TimerWheel(start)
+            # 第 0 层、第 1 层、第 2 层、溢出表，外加正好落在各层边界上的
+            offsets = [1, 2, SLOTS - 1, SLOTS, SLOTS + 1, 5 * SLOTS + 7, SLOTS * SLOTS,
+                       SLOTS * SLOTS + 1, 3 * SLOTS * SLOTS + 9, SPAN, SPAN + 5]
+            for off in reversed(offsets):
+                self.schedule(wheel, start + off, off)
+            self.assertEqual(wheel.pending, len(offsets))
+            wheel.advance(start + SPAN + 10)
+            self.assertEqual(self.fired, [(start + off, off) for off in offsets])
+            self.assertEqual(wheel.pending, 0)
+
+    def test_same_tick_fires_in_schedule_order(self):
+        wheel = game.TimerWheel()
+        due = 3 * SLOTS + 5
+        self.schedule(wheel, due, 'far')        # 先登记时在高层
+        wheel.advance(2 * SLOTS)
+        self.schedule(wheel, due, 'middle')
+        wheel.advance(due - 1)
+        self.schedule(wheel, due, 'near')       # 登记时已经在第 0 层
+        self.schedule(wheel, due - 10, 'late')  # 已经过去的按下一步算
+        wheel.advance(due)
+        self.assertEqual(self.fired, [(due, 'far'), (due, 'middle'), (due, 'near'), (due, 'late')])
+
+    def test_cancel_on_every_level(self):
+        wheel = game.TimerWheel(7)
+        keep, drop = [], []
+        for off in ([1, SLOTS + 3, SLOTS * SLOTS + 3, SPAN + 3]):
+            keep.append(off)
+            drop.append(self.schedule(wheel, 7 + off, ('drop', off)))
+            self.schedule(wheel, 7 + off, off)
+        wheel.advance(7 + SLOTS)                # 第 0 层那个已经到期，取消它什么也不做
+        for entry in drop:
+            wheel.cancel(entry)
+            wheel.cancel(entry)                 # 重复取消不会多减
+        self.assertEqual(wheel.pending, len(keep) - 1)
+        wheel.advance(7 + SPAN + 10)
+        self.assertEqual(self.fired, [(7 + 1, ('drop', 1))] + [(7 + off, off) for off in keep])
+        self.assertEqual(wheel.pending, 0)
+
+    def test_callback_can_reschedule(self):
+        wheel = game.TimerWheel()
+
+        def tick(n):
+            self.fired.append(wheel.tick)
+            if n:
+                wheel.schedule(wheel.tick, tick, n - 1)   # 当前步登记的排到下一步
+
+        wheel.schedule(SLOTS - 2, tick, 4)
+        wheel.advance(SLOTS * 2)
+        self.assertEqual(self.fired, list(range(SLOTS - 2, SLOTS + 3)))
+
+    def test_removed_enemies_leave_no_timers(self):
+        random.seed(1)
+        state = game.GameState()
+        while not state.enemies:
+            state.update()
+        enemy = state.enemies.sprites()[0]
+        enemy.dodge()
+        entry, pending = enemy.timer, state.timers.pending
+        enemy.kill()
+        self.assertIsNone(entry[2])
+        self.assertEqual(state.timers.pending, pending - 1)
+
+    def test_pending_timers_belong_to_live_sprites(self):
+        # 撞玩家、变小跟班、淡出都跑过一遍之后：每个还在等的定时都属于场上的敌人或小跟班
+        state = busy_state()
+        live = sum(1 for e in state.enemies if e.timer is not None and e.timer[2] is not None)
+        self.assertEqual(state.timers.pending, live + len(state.followers))
+
+
+# ================== 模拟时钟 ==================
+def run_steps(scale, steps):
+    """按 scale 倍率跑到第 steps 个逻辑步；玩家不动，每 6 步开一枪（按步数而不是帧数）"""
+    random.seed(3)
+    state = game.GameState()
+    state.clock.scale = scale
+    aim = random.Random(5)
+    fired = set()
+    while state.clock.ticks < steps:
+        tick = state.clock.ticks
+        if tick % 6 == 0 and tick not in fired and state.enemies:
+            fired.add(tick)
+            state.fire_bullet(aim.choice(state.enemies.sprites()).rect.center)
+        state.update()
+    return state
+
+
+class SimClockTest(unittest.TestCase):
+
+    def test_world_view_fields_match_state(self):
+        # 字段名对错了（快照格式改了顺序）这里就会对不上
+        state = busy_state(300)
+        state.clock.paused = True
+        scalars = game.world_view(state)['scalars']
+        self.assertEqual(scalars['ticks'], state.clock.ticks)
+        self.assertEqual(scalars['paused'], True)
+        self.assertEqual(scalars['difficulty_level'], state.difficulty_level)
+        self.assertEqual(scalars['next_shot_id'], state.next_shot_id)
+        self.assertEqual(scalars['enemy_speed'], state.current_enemy_speed)
+        self.assertNotIn('time_scale', scalars)
+        self.assertNotIn('history', game.world_view(state))
+
+    def test_steps_per_frame_follow_scale(self):
+        for scale in (0.25, 0.5, 1.0, 1.5, 2.0, 3.0):
+            state = game.GameState()
+            state.clock.scale = scale
+            for _ in range(40):
+                state.update()
+            self.assertEqual(state.clock.ticks, int(40 * scale), scale)
+            self.assertEqual(state.timers.tick, state.clock.ticks)
+
+    def test_world_does_not_depend_on_scale(self):
+        expected = run_steps(1.0, 480)
+        for scale in (0.5, 2.0, 3.0):
+            state = run_steps(scale, 480)
+            self.assertEqual(state.clock.ticks, expected.clock.ticks)
+            self.assertNotEqual(state.frame, expected.frame)
+            self.assertEqual(game.world_view(state), game.world_view(expected), scale)
+
+    def test_pause_holds_the_world(self):
+        state = busy_state(300)
+        before = game.world_view(state)
+        ticks = state.clock.ticks
+        state.toggle_freeze()
+        for _ in range(30):
+            state.update()
+        state.toggle_freeze()
+        self.assertEqual(state.clock.ticks, ticks)
+        self.assertEqual(game.world_view(state), before)
+        state.update()
+        self.assertEqual(state.clock.ticks, ticks + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
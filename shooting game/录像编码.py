@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+终极射击小游戏 • 录像编码进程
+=====================================================
+游戏里按 F9 开始录像时由游戏自己启动，一般不用手动运行：
+
+    python 录像编码.py <共享内存名> <宽> <高> <行字节数> <每像素字节> <R,G,B 字节位置> <槽数> <帧率> <输出文件名（不含扩展名）>
+
+游戏把每帧屏幕像素原样（显示表面的内存布局，一次 memcpy）拷进共享内存环里的一个槽，
+再往本进程的 stdin 写一条 8 字节的帧号；本进程按顺序取槽、转换颜色、编码，
+取完一槽就把共享内存头部的“已取走帧数”加一，游戏看这个计数知道哪些槽空出来了。
+颜色转换和编码都在这里做，游戏那边每帧只多一次整屏拷贝。
+
+共享内存布局：
+    0   uint64  游戏已放入的帧数（游戏写）
+    8   uint64  本进程已取走的帧数（本进程写）
+    64  槽 0、槽 1 …，每槽 高 × 行字节数
+
+输出：
+    - 装了 OpenCV 时用 cv2.VideoWriter 写 mp4（mp4v）
+    - 没装时写原始 YUV420p（.yuv），用 ffmpeg 转：
+      ffmpeg -f rawvideo -pix_fmt yuv420p -s 1024x768 -r 60 -i xxx.yuv xxx.mp4
+帧号不连续（游戏那边丢了帧）时重复上一帧补齐，视频时长和实际游戏时间一致。
+stdin 读到负数 -1-n（整段一共 n 帧，末尾丢的帧也按它补齐）或 EOF 就收尾退出。
+"""
+
+import os
+import sys
+import time
+import struct
+import argparse
+from multiprocessing import shared_memory
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:          # 没装 OpenCV 就写原始 YUV
+    cv2 = None
+
+HEADER_SIZE = 64
+FRAME_MSG   = struct.Struct('<q')     # 帧号；负数 -1-n 表示结束，整段共 n 帧
+
+
+def attach(name):
+    """按名字打开游戏建好的共享内存（只用不删，删由游戏负责）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)   # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix':
+            # 老版本打开已有的共享内存也会登记到 resource_tracker，本进程退出时会把它删掉
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class RawYuvWriter:
+    """没有 OpenCV 时的输出：RGB -> YUV420p（BT.601 有限范围），逐帧追加到文件"""
+
+    def __init__(self, path, size):
+        self.file = open(path, 'wb')
+        self.w, self.h = size[0] & ~1, size[1] & ~1     # 4:2:0 要求宽高是偶数
+
+    def write(self, rgb):
+        rgb = rgb[:self.h, :self.w]
+        # 亮度在 uint16 里原地算（最大 255×220+128，不会溢出），整帧大数组少建几个临时量
+        r, g, b = (rgb[..., i].astype(np.uint16) for i in range(3))
+        y = r * 66
+        y += g * 129
+        y += b * 25
+        y += 128
+        y >>= 8
+        y += 16
+        # 色度取 2×2 块的平均，只有四分之一大小，用 int32 算带负数的系数
+        quad = rgb[0::2, 0::2].astype(np.int32)
+        quad += rgb[1::2, 0::2]
+        quad += rgb[0::2, 1::2]
+        quad += rgb[1::2, 1::2]
+        quad >>= 2
+        r, g, b = quad[..., 0], quad[..., 1], quad[..., 2]
+        u = ((-38 * r - 74 * g + 112 * b + 128) >> 8) + 128
+        v = ((112 * r - 94 * g - 18 * b + 128) >> 8) + 128
+        for plane in (y, u, v):
+            self.file.write(plane.astype(np.uint8).tobytes())
+
+    def release(self):
+        self.file.close()
+
+
+class CvWriter:
+    """cv2.VideoWriter，输入 BGR"""
+
+    def __init__(self, path, size, fps):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+        if not self.writer.isOpened():
+            raise OSError("cv2.VideoWriter 打不开 {}".format(path))
+
+    def write(self, bgr):
+        self.writer.write(bgr)
+
+    def release(self):
+        self.writer.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="终极射击小游戏 录像编码进程")
+    parser.add_argument('shm')
+    parser.add_argument('width', type=int)
+    parser.add_argument('height', type=int)
+    parser.add_argument('pitch', type=int)
+    parser.add_argument('bytesize', type=int)
+    parser.add_argument('channels', help="R,G,B 各在像素里的第几个字节，如 2,1,0")
+    parser.add_argument('slots', type=int)
+    parser.add_argument('fps', type=float)
+    parser.add_argument('output', help="输出文件名，扩展名按输出格式加")
+    args = parser.parse_args()
+
+    w, h = args.width, args.height
+    red, green, blue = (int(v) for v in args.channels.split(','))
+    shm = attach(args.shm)
+    counters = np.ndarray((2,), np.uint64, shm.buf)
+    frames = np.ndarray((args.slots, h, args.pitch), np.uint8, shm.buf, HEADER_SIZE)
+
+    if cv2 is not None:
+        path = args.output + '.mp4'
+        writer = CvWriter(path, (w, h), args.fps)
+        order = (blue, green, red)
+    else:
+        path = args.output + '.yuv'
+        writer = RawYuvWriter(path, (w, h))
+        order = (red, green, blue)
+
+    stdin = sys.stdin.buffer
+    taken = int(counters[1])
+    written = repeated = 0
+    last_index = -1
+    pixels = image = last = None
+    encode_time = 0.0
+    total = None
+    while True:
+        data = stdin.read(FRAME_MSG.size)
+        if len(data) < FRAME_MSG.size:
+            break
+        index, = FRAME_MSG.unpack(data)
+        if index < 0:
+            total = -1 - index
+            break
+        t0 = time.perf_counter()
+        # 按像素字节挑出三个通道，顺便拷成连续数组，拷完这槽就可以还给游戏了
+        pixels = frames[taken % args.slots, :, :w * args.bytesize].reshape(h, w, args.bytesize)
+        image = pixels[:, :, order]
+        taken += 1
+        counters[1] = taken
+        # 游戏那边丢掉的帧用上一帧补上
+        if last is not None:
+            for _ in range(index - last_index - 1):
+                writer.write(last)
+                repeated += 1
+        writer.write(image)
+        written += 1
+        last, last_index = image, index
+        encode_time += time.perf_counter() - t0
+    if last is not None and total is not None:
+        for _ in range(total - last_index - 1):
+            writer.write(last)
+            repeated += 1
+
+    writer.release()
+    del counters, frames, pixels, image, last
+    shm.close()
+    print("[Record] {} 帧（其中补帧 {}），编码平均 {:.2f} ms/帧 -> {}".format(
+        written + repeated, repeated, 1000.0 * encode_time / max(1, written), path))
+
+
+if __name__ == "__main__":
+    main()
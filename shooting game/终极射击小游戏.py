@@ -15,17 +15,33 @@
     - 完整注释，便于改动和学习
 
 注意：
-    - 只使用 Pygame（无音效/音乐）
+    - 只使用 Pygame（无音效/音乐），菜单背景的批量运算用 NumPy
     - 代码长度足够“非常完善”，可自由扩展
 """
 
 import sys
 import math
 import random
+import numpy as np
 import pygame
 from pygame.locals import QUIT, KEYDOWN, K_ESCAPE, K_UP, K_DOWN, K_LEFT, K_RIGHT, MOUSEBUTTONDOWN, K_SPACE, K_RETURN
+from pygame.locals import K_LEFTBRACKET, K_RIGHTBRACKET
 import json
 import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import deque
+from multiprocessing import shared_memory
+
+try:
+    from pygame._sdl2 import video as sdl2_video
+except ImportError:          # 老版本 pygame 没有 _sdl2，只能用软件绘制
+    sdl2_video = None
 
 # ================== 高分管理 ==================
 HIGH_SCORE_FILE = os.path.join(os.path.dirname(__file__), "highscore.json")
@@ -51,7 +67,17 @@ def save_high_score(score):
         pass
 
 # ================== 常量 ==================
-SCREEN_W, SCREEN_H      = 1024, 768
+SCREEN_W, SCREEN_H      = 1024, 768    # 逻辑分辨率：游戏坐标系，与窗口实际像素无关
+RENDERER                = os.environ.get('SHOOTER_RENDERER', 'software')  # 'software' 软件绘制 / 'texture' SDL2 纹理渲染
+WINDOW_SIZE             = os.environ.get('SHOOTER_WINDOW', '')  # texture 后端的窗口像素，如 '3840x2160'；空则等于逻辑分辨率
+WORLD_W, WORLD_H        = 2048, 1536    # 世界大小；比屏幕大时镜头跟着玩家走（设成屏幕大小就是原来的固定场地）
+WORLD_GRID              = 128           # 背景网格间距，让滚动看得出来
+ACTIVE_MARGIN           = 256           # 视口外这么远以内的敌人照常逐帧模拟
+DORMANT_INTERVAL        = 4             # 更远的敌人轮流每这么多帧才更新一次（一次走这么多帧的路）
+TIME_SCALES             = (0.25, 0.5, 1.0, 2.0, 4.0)  # [ / ] 切换的时间倍率（慢动作 / 快进）
+MENU_BALL_COUNT         = 5             # 主菜单背景的装饰小球数（固定容量，被打掉的原地重生）
+MENU_BULLET_CAPACITY    = 32            # 主菜单背景同时在飞的子弹上限
+MENU_BULLET_FIRE_INTERVAL = 30          # 主菜单中央三角形每隔多少逻辑步发射一颗子弹
 FPS                     = 60
 PLAYER_SPEED            = 5
 BULLET_SPEED            = 10
@@ -60,6 +86,11 @@ ENEMY_SPAWN_INTERVAL    = 2000      # 毫秒
 BULLET_LIMIT            = 10        # 子弹数(可无限发射，这里仅限制)
 INITIAL_LIVES           = 3
 DIFFICULTY_SCORE_STEP   = 50        # 每50分增加难度
+DODGE_STEPS             = 18        # 敌人闪避持续的逻辑步数（0.3秒）
+HEAD_AIM_PORT           = 50515     # 头部瞄准事件的本机 UDP 端口（见 头部输入.py）
+HEAD_AIM_TIMEOUT        = 0.25      # 秒，超过这么久没有新事件就当作没有头部瞄准
+HEAD_AIM_MIN_CONFIDENCE = 0.2       # 置信度低于这个的事件不用
+HEAD_AIM_PREDICT_MAX    = 0.10      # 最多按速度外推多少秒
 
 # 颜色
 COLOR_BLACK   = (0, 0, 0)
@@ -70,66 +101,411 @@ COLOR_YELLOW  = (255, 255, 0)
 COLOR_BLUE    = (0, 0, 255)
 COLOR_BLUE    = (30, 144, 255)   # 海军蓝
 
+# ================== 渲染后端 ==================
+# 默认（software）所有东西都 blit 到 set_mode 的显示表面上，填充和混合都在 CPU 上做，
+# 窗口越大越慢。texture 后端改用 SDL2 的 Renderer / Texture：
+#   - 每张图第一次画的时候上传成纹理并缓存（跟着 Surface 的生命周期走），之后只提交绘制命令，
+#     SDL 把同一帧的命令攒成批一次交给显卡
+#   - 透明度用纹理的 alpha 调制，缩放直接给目标矩形，不再在 CPU 上 smoothscale
+#   - 逻辑分辨率固定为 SCREEN_W × SCREEN_H，窗口可以是任意大小（比如 4K），
+#     由显卡拉伸；鼠标事件坐标也由 SDL 换算回逻辑坐标，游戏代码不用改
+# 两个后端对游戏代码暴露同样的接口：fill / blit / blits / get_rect，外加 present()、set_caption() 和 blit_scaled()。
+# 所以画面里不能直接对屏幕用 pygame.draw，形状都先画成小图（cached_sprite）再贴。
+# 无窗口测试：SDL_VIDEODRIVER=dummy 下会选到 SDL 的软件渲染器，照样能跑。
+
+class TextureScreen:
+    """SDL2 Renderer 后端，模仿游戏用到的那一小部分 Surface 接口"""
+
+    def __init__(self, size, window_size, title):
+        self.size = size
+        self.window = sdl2_video.Window(title, size=window_size)
+        self.renderer = sdl2_video.Renderer(self.window, vsync=False)
+        self.renderer.logical_size = size
+        self.textures = weakref.WeakKeyDictionary()   # Surface -> Texture
+        self.uploads = 0
+
+    def texture(self, image):
+        """取 image 对应的纹理，第一次用时上传（游戏里的图画好之后不再改像素，换图都是新建 Surface）"""
+        tex = self.textures.get(image)
+        if tex is None:
+            tex = sdl2_video.Texture.from_surface(self.renderer, image)
+            tex.blend_mode = 1                       # SDL_BLENDMODE_BLEND
+            self.textures[image] = tex
+            self.uploads += 1
+        return tex
+
+    def fill(self, color, rect=None):
+        self.renderer.draw_color = tuple(color)[:3] + (255,)
+        if rect is None:
+            self.renderer.clear()
+        else:
+            self.renderer.fill_rect(rect)
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        size = area.size if area is not None else source.get_size()
+        rect = pygame.Rect(dest[0], dest[1], *size)
+        self.blit_scaled(source, rect, area)
+        return rect
+
+    def blits(self, blit_sequence, doreturn=1):
+        rects = [self.blit(*item) for item in blit_sequence]
+        return rects if doreturn else None
+
+    def blit_scaled(self, source, rect, area=None):
+        tex = self.texture(source)
+        alpha = source.get_alpha()
+        tex.alpha = 255 if alpha is None else alpha
+        tex.draw(srcrect=area, dstrect=rect)
+
+    def get_size(self):
+        return self.size
+
+    def get_rect(self, **kwargs):
+        rect = pygame.Rect((0, 0), self.size)
+        for name, value in kwargs.items():
+            setattr(rect, name, value)
+        return rect
+
+    def present(self):
+        self.renderer.present()
+
+def open_screen(title):
+    """按 RENDERER 建屏幕；texture 后端建不起来就退回软件绘制"""
+    if RENDERER == 'texture':
+        window_size = (SCREEN_W, SCREEN_H)
+        if WINDOW_SIZE:
+            window_size = tuple(int(v) for v in WINDOW_SIZE.lower().split('x'))
+        try:
+            if sdl2_video is None:
+                raise pygame.error("pygame._sdl2 不可用")
+            return TextureScreen((SCREEN_W, SCREEN_H), window_size, title)
+        except pygame.error as e:
+            print("[Render] texture 后端不可用（{}），改用软件绘制".format(e))
+    pygame.display.set_caption(title)
+    return pygame.display.set_mode((SCREEN_W, SCREEN_H))
+
+def set_caption(title):
+    """改窗口标题（texture 后端的窗口不归 pygame.display 管）"""
+    if isinstance(screen, TextureScreen):
+        screen.window.title = title
+    else:
+        pygame.display.set_caption(title)
+
+def present():
+    """把这一帧显示出来（代替 pygame.display.flip）；录像时先把画面交给录像"""
+    if recorder.active:
+        recorder.capture(screen)
+    if isinstance(screen, TextureScreen):
+        screen.present()
+    else:
+        pygame.display.flip()
+
+def blit_scaled(surf, image, rect):
+    """把 image 缩放到 rect 的大小画上去：texture 后端交给显卡，软件后端按画质选 smoothscale / scale"""
+    if isinstance(surf, TextureScreen):
+        surf.blit_scaled(image, rect)
+        return
+    scaler = pygame.transform.smoothscale if quality.settings['smooth_combo'] else pygame.transform.scale
+    scaled = scaler(image, rect.size)
+    scaled.set_alpha(image.get_alpha())
+    surf.blit(scaled, rect)
+
+# 文字小图缓存：(字体, 文本, 颜色) -> Surface。HUD 和菜单文字大多帧帧相同，
+# 不用每帧重新排版；texture 后端也就不用每帧重新上传纹理
+TEXT_CACHE_SIZE = 256
+_text_cache = {}
+
+def render_text(fnt, text, color):
+    """font.render(text, True, color) 的缓存版；返回的图透明度已复位，调用方可以再 set_alpha"""
+    key = (id(fnt), text, tuple(color))
+    image = _text_cache.get(key)
+    if image is None:
+        if len(_text_cache) >= TEXT_CACHE_SIZE:
+            _text_cache.clear()
+        image = fnt.render(text, True, color)
+        _text_cache[key] = image
+    image.set_alpha(255)
+    return image
+
+# 形状小图缓存：key -> Surface，paint(surface) 只在第一次调用
+_sprite_cache = {}
+
+def cached_sprite(key, size, paint):
+    """按 key 取一张画好的 SRCALPHA 小图（圆、三角形、爱心、准星等），两个后端共用"""
+    image = _sprite_cache.get(key)
+    if image is None:
+        image = pygame.Surface(size, pygame.SRCALPHA)
+        paint(image)
+        _sprite_cache[key] = image
+    return image
+
+def circle_sprite(color, r):
+    """实心圆小图，尺寸 2r × 2r；贴在 (x - r, y - r) 与 pygame.draw.circle(surf, color, (x, y), r) 一致"""
+    return cached_sprite(('circle', tuple(color), r), (2 * r, 2 * r),
+                         lambda img: pygame.draw.circle(img, color, (r, r), r))
+
 # ================== 初始化 ==================
 pygame.init()
-pygame.display.set_caption("键盘走位 + 鼠标射击 • 终极射击小游戏")
-screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
+screen = open_screen("键盘走位 + 鼠标射击 • 终极射击小游戏")
 clock  = pygame.time.Clock()
 # 使用英文避免字体编码问题
 font   = pygame.font.SysFont(None, 32)
 big_font = pygame.font.SysFont(None, 72)
 
-# 主界面装饰小球（移动并碰撞反弹）- 现在是5个
-MENU_BALLS = []
-MENU_BALL_POSITIONS = [
-    (150, 100),
-    (SCREEN_W - 150, 120),
-    (SCREEN_W // 2 - 200, SCREEN_H - 100),
-    (SCREEN_W // 2 + 200, SCREEN_H - 120),
-    (SCREEN_W // 2, SCREEN_H // 2 + 150),  # 新增第5个小球
+# ================== 画质调节 ==================
+# 清屏扣血时每个敌人爆 20 个粒子、高等级多弹道都会让帧时间突然变长。
+# QualityGovernor 盯着最近若干帧的耗时（不含 clock.tick 的等待），超出帧预算就降一档，
+# 余量充足并保持一段时间再升一档（滞回，避免来回跳）。
+# 只调纯视觉的东西：粒子数量和寿命、连击字缩放方式、半透明遮罩、菜单装饰小球数量；
+# 模拟结果与画质无关（粒子用独立的随机数，不影响敌人生成等游戏逻辑）。
+QUALITY_LEVELS = [
+    # 粒子数量倍率, 粒子寿命倍率, 连击字平滑缩放, 半透明遮罩, 菜单小球比例（MENU_BALL_COUNT 的几成）
+    {'particles': 1.0,  'lifetime': 1.0,  'smooth_combo': True,  'overlay': True,  'menu_balls': 1.0},
+    {'particles': 0.5,  'lifetime': 0.75, 'smooth_combo': True,  'overlay': True,  'menu_balls': 1.0},
+    {'particles': 0.25, 'lifetime': 0.5,  'smooth_combo': False, 'overlay': True,  'menu_balls': 0.6},
+    {'particles': 0.1,  'lifetime': 0.5,  'smooth_combo': False, 'overlay': False, 'menu_balls': 0.4},
 ]
-for i in range(5):
-    base_x, base_y = MENU_BALL_POSITIONS[i]
-    x = base_x + random.uniform(-40, 40)
-    y = base_y + random.uniform(-40, 40)
-    # 随机方向与速度（稍微更快），速度范围 1.8 - 3.0
-    angle = random.uniform(0, 2 * math.pi)
-    speed = random.uniform(1.8, 3.0)
-    vx = math.cos(angle) * speed
-    vy = math.sin(angle) * speed
-    MENU_BALLS.append({'x': float(x), 'y': float(y), 'vx': vx, 'vy': vy, 'r': 18, 'alive': True})
-
-# 主界面子弹系统（中央三角形发射）
-MENU_BULLETS = []
-MENU_BULLET_FIRE_TIMER = 0
-MENU_BULLET_FIRE_INTERVAL = 30  # 每30帧发射一次
-    
-# 主界面暂停标志（右键切换）
-MENU_PAUSED = False
-
-def spawn_menu_ball():
-    """在主菜单中生成一个新的小球（在原球死亡后）"""
-    base_x, base_y = random.choice(MENU_BALL_POSITIONS)
-    x = base_x + random.uniform(-40, 40)
-    y = base_y + random.uniform(-40, 40)
-    angle = random.uniform(0, 2 * math.pi)
-    speed = random.uniform(1.8, 3.0)
-    vx = math.cos(angle) * speed
-    vy = math.sin(angle) * speed
-    MENU_BALLS.append({'x': float(x), 'y': float(y), 'vx': vx, 'vy': vy, 'r': 18, 'alive': True})
+QUALITY_WINDOW   = 30       # 滚动平均的帧数
+QUALITY_DOWN     = 0.90     # 平均耗时超过预算的这个比例就降档
+QUALITY_UP       = 0.50     # 平均耗时低于预算的这个比例……
+QUALITY_UP_HOLD  = 180      # ……并持续这么多帧才升档
+QUALITY_LOG_INTERVAL = 5.0  # 秒，换档提示最多这么久打印一次（来回跳时不刷屏）
+
+class QualityGovernor:
+    """按滚动帧耗时分档调节视觉质量"""
+
+    def __init__(self, budget_ms=1000.0 / FPS):
+        self.budget_ms = budget_ms
+        self.level = 0
+        self.samples = deque(maxlen=QUALITY_WINDOW)
+        self.total = 0.0
+        self.calm = 0            # 连续多少帧余量充足
+        self.cooldown = 0        # 刚换档后等一个窗口再判断
+        self.last_log = None     # 上次打印换档提示的时间
+        self.unlogged = 0        # 之后又换了几次档还没打印
+
+    @property
+    def settings(self):
+        return QUALITY_LEVELS[self.level]
+
+    def frame(self, work_ms):
+        """每帧调用一次，work_ms 为本帧实际工作耗时（毫秒）"""
+        if len(self.samples) == QUALITY_WINDOW:
+            self.total -= self.samples[0]    # append 会把最老的一帧挤出去
+        self.samples.append(work_ms)
+        self.total += work_ms
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return
+        avg = self.total / len(self.samples)
+        if avg > self.budget_ms * QUALITY_DOWN and self.level < len(QUALITY_LEVELS) - 1:
+            self.set_level(self.level + 1)
+        elif avg < self.budget_ms * QUALITY_UP and self.level > 0:
+            self.calm += 1
+            if self.calm >= QUALITY_UP_HOLD:
+                self.set_level(self.level - 1)
+        else:
+            self.calm = 0
+
+    def set_level(self, level):
+        self.level = level
+        self.calm = 0
+        self.cooldown = QUALITY_WINDOW
+        self.unlogged += 1
+        now = time.perf_counter()
+        if self.last_log is None or now - self.last_log >= QUALITY_LOG_INTERVAL:
+            extra = " ({} changes since last report)".format(self.unlogged) if self.unlogged > 1 else ""
+            print("[Quality] level -> {}{}".format(level, extra))
+            self.last_log = now
+            self.unlogged = 0
+
+quality = QualityGovernor()
+
+# 全屏半透明遮罩缓存：(alpha) -> Surface，不再每帧新建 3MB 的表面
+_overlay_cache = {}
+
+def blit_overlay(surf, alpha):
+    """整屏盖一层半透明黑色；低画质时直接跳过"""
+    if not quality.settings['overlay']:
+        return
+    overlay = _overlay_cache.get(alpha)
+    if overlay is None:
+        overlay = pygame.Surface((SCREEN_W, SCREEN_H), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, alpha))
+        _overlay_cache[alpha] = overlay
+    surf.blit(overlay, (0, 0))
+
+# ================== 头部瞄准（可选） ==================
+# 头部输入.py 把头部姿态作为瞄准事件发到本机 UDP 端口；游戏每帧把数据报读空，
+# 只保留最新的一条。格式必须和 头部输入.AIM_FORMAT 保持一致。
+HEAD_AIM_MAGIC  = b'HAIM'
+HEAD_AIM_FORMAT = struct.Struct('<4sIdfffff')
+
+class HeadAimReceiver:
+    """非阻塞接收头部瞄准事件，aim_pos() 返回外推到当前时刻的屏幕坐标"""
+
+    def __init__(self, port=HEAD_AIM_PORT):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', port))
+        self.sock.setblocking(False)
+        self.latest = None      # (序号, 采集时刻, x, y, vx, vy, 置信度)，坐标已归一化
+
+    def poll(self):
+        """读空接收缓冲区，只保留最新事件"""
+        while True:
+            try:
+                data = self.sock.recv(64)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            if len(data) != HEAD_AIM_FORMAT.size:
+                continue
+            magic, seq, stamp, x, y, vx, vy, conf = HEAD_AIM_FORMAT.unpack(data)
+            if magic == HEAD_AIM_MAGIC:
+                self.latest = (seq, stamp, x, y, vx, vy, conf)
+
+    def aim_pos(self):
+        """当前头部瞄准点（屏幕像素）；没有可用事件时返回 None"""
+        if self.latest is None:
+            return None
+        _, stamp, x, y, vx, vy, conf = self.latest
+        age = time.perf_counter() - stamp
+        if conf < HEAD_AIM_MIN_CONFIDENCE or age > HEAD_AIM_TIMEOUT:
+            return None
+        dt = min(max(age, 0.0), HEAD_AIM_PREDICT_MAX)
+        x = min(max(x + vx * dt, 0.0), 1.0)
+        y = min(max(y + vy * dt, 0.0), 1.0)
+        return int(x * (SCREEN_W - 1)), int(y * (SCREEN_H - 1))
+
+    def close(self):
+        self.sock.close()
+
+def open_head_aim():
+    """打开头部瞄准接收端；端口被占用等情况返回 None"""
+    try:
+        return HeadAimReceiver()
+    except OSError as e:
+        print("[HeadAim] 无法监听端口 {}: {}".format(HEAD_AIM_PORT, e))
+        return None
+
+def draw_head_aim(surf, pos):
+    """头部瞄准准星"""
+    if pos is None:
+        return
+    surf.blit(cached_sprite('head_aim', (41, 41), _paint_head_aim), (pos[0] - 20, pos[1] - 20))
+
+def _paint_head_aim(img):
+    pygame.draw.circle(img, COLOR_GREEN, (20, 20), 14, 2)
+    pygame.draw.line(img, COLOR_GREEN, (0, 20), (40, 20), 1)
+    pygame.draw.line(img, COLOR_GREEN, (20, 0), (20, 40), 1)
+
+def draw_clown(clown):
+    """在 clown 表面上画小丑头像（敌人闪避时的样子）"""
+    w, h = clown.get_size()
+    cx, cy = w // 2, h // 2
+    # 面部半径
+    face_r = int(min(w, h) * 0.38)
+    # 皮肤颜色
+    skin = (255, 224, 189)
+    # 头发（左右两侧）颜色
+    hair_colors = [(220, 20, 60), (30, 144, 255), (34, 139, 34)]
+
+    # 画脸
+    pygame.draw.circle(clown, skin, (cx, cy), face_r)
+
+    # 画头发（左中右三簇小圆）
+    hair_r = int(face_r * 0.45)
+    offsets = [(-face_r, -int(face_r*0.2)), (0, -int(face_r*0.6)), (face_r, -int(face_r*0.2))]
+    for i, (ox, oy) in enumerate(offsets):
+        col = hair_colors[i % len(hair_colors)]
+        pygame.draw.circle(clown, col, (cx + ox, cy + oy), hair_r)
+
+    # 眼睛
+    eye_r = max(2, face_r // 6)
+    eye_x_off = int(face_r * 0.45)
+    eye_y_off = int(face_r * -0.15)
+    pygame.draw.circle(clown, (0, 0, 0), (cx - eye_x_off, cy + eye_y_off), eye_r)
+    pygame.draw.circle(clown, (0, 0, 0), (cx + eye_x_off, cy + eye_y_off), eye_r)
+    # 白眼珠（小高光）
+    pygame.draw.circle(clown, (255, 255, 255), (cx - eye_x_off - 1, cy + eye_y_off - 1), max(1, eye_r//3))
+    pygame.draw.circle(clown, (255, 255, 255), (cx + eye_x_off - 1, cy + eye_y_off - 1), max(1, eye_r//3))
+
+    # 鼻子（红色）
+    nose_r = max(3, face_r // 5)
+    pygame.draw.circle(clown, (220, 20, 60), (cx, cy + int(face_r*0.05)), nose_r)
+
+    # 嘴巴（用弧线）
+    mouth_w = int(face_r * 1.0)
+    mouth_h = int(face_r * 0.55)
+    mouth_rect = pygame.Rect(cx - mouth_w//2, cy + int(face_r*0.15), mouth_w, mouth_h)
+    try:
+        pygame.draw.arc(clown, (139, 0, 0), mouth_rect, math.radians(20), math.radians(160), max(2, face_r//10))
+    except Exception:
+        # 若 arc 不可用，画一个简单的红色椭圆代表嘴巴
+        pygame.draw.ellipse(clown, (139, 0, 0), mouth_rect)
+
+    # 轻微边缘描边，增加识别度
+    pygame.draw.circle(clown, (0, 0, 0, 30), (cx, cy), face_r, 1)
+
+# ================== 世界与镜头 ==================
+# 场地是 WORLD_W × WORLD_H 的世界，屏幕只是跟着玩家走的一个视口。
+# 所有精灵的 rect 都是世界坐标；只在画的时候减去视口左上角，换成屏幕坐标，
+# 鼠标 / 头部瞄准的屏幕坐标反过来用 GameState.to_world 换成世界坐标。
+# 画面只画和视口相交的精灵；离所有视口都远的敌人降频模拟（Enemy.update_dormant），
+# 所以敌人再多、世界再大，每帧的绘制和更新开销也主要取决于视口附近有多少东西。
+WORLD_RECT = pygame.Rect(0, 0, WORLD_W, WORLD_H)
+
+def view_rect(center):
+    """以 center 为中心、屏幕大小的视口（世界坐标），贴着世界边缘时不越界"""
+    rect = pygame.Rect(0, 0, SCREEN_W, SCREEN_H)
+    rect.center = center
+    rect.clamp_ip(WORLD_RECT)
+    return rect
+
+def draw_world_grid(surf, view):
+    """背景网格（世界和屏幕一样大时不画，保持原来的纯黑背景）"""
+    if WORLD_RECT.size == (SCREEN_W, SCREEN_H):
+        return
+    color = (28, 28, 36)
+    hline = cached_sprite(('grid_h', color), (SCREEN_W, 1), lambda img: img.fill(color))
+    vline = cached_sprite(('grid_v', color), (1, SCREEN_H), lambda img: img.fill(color))
+    for x in range(view.left - view.left % WORLD_GRID, view.right, WORLD_GRID):
+        surf.blit(vline, (x - view.left, 0))
+    for y in range(view.top - view.top % WORLD_GRID, view.bottom, WORLD_GRID):
+        surf.blit(hline, (0, y - view.top))
+
 # ================== 定义类 ==================
+# 同类实体共用一张贴图（只读：谁也不能在上面画或改透明度，要改先 copy()）；
+# 实体类都用 __slots__，字段在 __init__ 里全部赋初值，热路径上不再 hasattr/getattr 探测。
+# pygame.sprite.Sprite 本身没有 __slots__，实例仍带一个只装所属分组集合的小 __dict__。
+
+def player_image(color=COLOR_BLUE):
+    return cached_sprite(('player', tuple(color)), (48, 48),
+                         lambda img: pygame.draw.polygon(img, color, [(24, 0), (48, 48), (24, 64), (0, 48)]))
+
+def bullet_image():
+    return circle_sprite(COLOR_YELLOW, 6)
+
+def follower_bullet_image():
+    return circle_sprite((100, 200, 255), 5)     # 浅蓝色，区别于玩家子弹
+
+def enemy_image():
+    return circle_sprite(COLOR_RED, 18)
+
+def clown_image():
+    return cached_sprite('clown', (36, 36), draw_clown)
+
 class Player(pygame.sprite.Sprite):
     """玩家角色"""
 
+    __slots__ = ('image', 'rect', 'lives', 'score', 'dead', 'color', 'base_speed', 'current_speed',
+                 'max_speed', 'accel_per_frame', 'angle', 'velocity', 'net_id')
+
     def __init__(self):
         super().__init__()
-        self.image = pygame.Surface((48, 48), pygame.SRCALPHA)
-        pygame.draw.polygon(
-            self.image,
-            COLOR_BLUE,
-            [(24, 0), (48, 48), (24, 64), (0, 48)]
-        )
-        self.rect    = self.image.get_rect(center=(SCREEN_W // 2, SCREEN_H // 2))
+        self.image = player_image()
+        self.rect    = self.image.get_rect(center=(WORLD_W // 2, WORLD_H // 2))
         self.lives   = INITIAL_LIVES
         self.score   = 0
         self.dead    = False
@@ -142,17 +518,12 @@ class Player(pygame.sprite.Sprite):
         # 小跟班跟随所需属性
         self.angle = 0  # 玩家移动方向角度
         self.velocity = (0, 0)  # 玩家速度向量
+        self.net_id = 0  # 联机用的网络 id，0 表示还没分配（单机不用）
 
     def darken(self):
         """死亡时变为深蓝色"""
         self.color = (0, 0, 100)  # 深蓝色
-        # 重绘玩家形状
-        self.image = pygame.Surface((48, 48), pygame.SRCALPHA)
-        pygame.draw.polygon(
-            self.image,
-            self.color,
-            [(24, 0), (48, 48), (24, 64), (0, 48)]
-        )
+        self.image = player_image(self.color)
 
     def lose_life(self, state=None):
         """减少一条生命值，并杀死所有敌人"""
@@ -204,15 +575,16 @@ class Player(pygame.sprite.Sprite):
         self.velocity = (dx, dy)
 
         # 边界检测
-        self.rect.clamp_ip(screen.get_rect())
+        self.rect.clamp_ip(WORLD_RECT)
 
 class Bullet(pygame.sprite.Sprite):
     """子弹, 朝鼠标目标发射，支持墙壁反弹"""
 
+    __slots__ = ('image', 'rect', 'velocity', 'owner', 'shot_id', 'bounces_remaining', 'net_id')
+
     def __init__(self, pos, target_pos, owner=None, shot_id=None, bounces_remaining=0):
         super().__init__()
-        self.image = pygame.Surface((12, 12), pygame.SRCALPHA)
-        pygame.draw.circle(self.image, COLOR_YELLOW, (6, 6), 6)
+        self.image = bullet_image()
         self.rect   = self.image.get_rect(center=pos)
 
         # 计算方向
@@ -224,11 +596,9 @@ class Bullet(pygame.sprite.Sprite):
         # 记录所属发射批次/所有者（用于连击判定）
         self.owner = owner
         self.shot_id = shot_id
-        # 冻结控制：当全局冻结时，子弹应停止移动但保留初始速度用于恢复
-        self.stored_velocity = self.velocity
-        self.frozen = False
         # 反弹系统：剩余反弹次数
         self.bounces_remaining = bounces_remaining
+        self.net_id = 0
 
     def update(self):
         """子弹移动与反弹"""
@@ -245,8 +615,8 @@ class Bullet(pygame.sprite.Sprite):
                 self.velocity = (-vx, vy)
                 self.bounces_remaining -= 1
                 bounced = True
-            elif self.rect.right > SCREEN_W:
-                self.rect.right = SCREEN_W
+            elif self.rect.right > WORLD_W:
+                self.rect.right = WORLD_W
                 self.velocity = (-vx, vy)
                 self.bounces_remaining -= 1
                 bounced = True
@@ -257,17 +627,17 @@ class Bullet(pygame.sprite.Sprite):
                 self.velocity = (self.velocity[0], -vy)
                 if not bounced:
                     self.bounces_remaining -= 1
-            elif self.rect.bottom > SCREEN_H:
-                self.rect.bottom = SCREEN_H
+            elif self.rect.bottom > WORLD_H:
+                self.rect.bottom = WORLD_H
                 self.velocity = (self.velocity[0], -vy)
                 if not bounced:
                     self.bounces_remaining -= 1
         else:
-            # 无反弹次数时，出屏幕外消失
-            if not screen.get_rect().colliderect(self.rect):
+            # 无反弹次数时，出世界外消失
+            if not WORLD_RECT.colliderect(self.rect):
                 # 通知所属 GameState：此子弹未命中（如果属于某次发射）
                 try:
-                    if hasattr(self, 'owner') and self.owner is not None:
+                    if self.owner is not None:
                         self.owner.on_bullet_removed(self.shot_id, hit=False)
                 except Exception:
                     pass
@@ -275,78 +645,33 @@ class Bullet(pygame.sprite.Sprite):
 
 class Follower(pygame.sprite.Sprite):
     """玩家的小跟班（被击杀的闪避敌人）"""
-    
+
+    __slots__ = ('image', 'rect', 'player', 'state', 'index', 'fire_interval', 'next_fire',
+                 'follow_distance', 'move_speed', 'position_x', 'position_y', 'net_id')
+
     def __init__(self, player, state=None, index=0):
         super().__init__()
-        # 绘制小丑图标（与敌人闪避时相同）
-        self.image = pygame.Surface((36, 36), pygame.SRCALPHA)
-        w, h = self.image.get_size()
-        cx, cy = w // 2, h // 2
-        
-        # 面部半径
-        face_r = int(min(w, h) * 0.38)
-        # 皮肤颜色
-        skin = (255, 224, 189)
-        # 头发（左右两侧）颜色
-        hair_colors = [(220, 20, 60), (30, 144, 255), (34, 139, 34)]
-
-        # 画脸
-        pygame.draw.circle(self.image, skin, (cx, cy), face_r)
-
-        # 画头发（左中右三簇小圆）
-        hair_r = int(face_r * 0.45)
-        offsets = [(-face_r, -int(face_r*0.2)), (0, -int(face_r*0.6)), (face_r, -int(face_r*0.2))]
-        for i, (ox, oy) in enumerate(offsets):
-            col = hair_colors[i % len(hair_colors)]
-            pygame.draw.circle(self.image, col, (cx + ox, cy + oy), hair_r)
-
-        # 眼睛
-        eye_r = max(2, face_r // 6)
-        eye_x_off = int(face_r * 0.45)
-        eye_y_off = int(face_r * -0.15)
-        pygame.draw.circle(self.image, (0, 0, 0), (cx - eye_x_off, cy + eye_y_off), eye_r)
-        pygame.draw.circle(self.image, (0, 0, 0), (cx + eye_x_off, cy + eye_y_off), eye_r)
-        # 白眼珠（小高光）
-        pygame.draw.circle(self.image, (255, 255, 255), (cx - eye_x_off - 1, cy + eye_y_off - 1), max(1, eye_r//3))
-        pygame.draw.circle(self.image, (255, 255, 255), (cx + eye_x_off - 1, cy + eye_y_off - 1), max(1, eye_r//3))
-
-        # 鼻子（红色）
-        nose_r = max(3, face_r // 5)
-        pygame.draw.circle(self.image, (220, 20, 60), (cx, cy + int(face_r*0.05)), nose_r)
-
-        # 嘴巴（用弧线）
-        mouth_w = int(face_r * 1.0)
-        mouth_h = int(face_r * 0.55)
-        mouth_rect = pygame.Rect(cx - mouth_w//2, cy + int(face_r*0.15), mouth_w, mouth_h)
-        try:
-            pygame.draw.arc(self.image, (139, 0, 0), mouth_rect, math.radians(20), math.radians(160), max(2, face_r//10))
-        except Exception:
-            pygame.draw.ellipse(self.image, (139, 0, 0), mouth_rect)
-
-        # 轻微边缘描边，增加识别度
-        pygame.draw.circle(self.image, (0, 0, 0, 30), (cx, cy), face_r, 1)
-        
+        self.image = clown_image()   # 小丑图标（与敌人闪避时相同）
         self.rect = self.image.get_rect()
         self.player = player
         self.state = state
         self.index = index  # 在队伍中的位置（用于排队跟随）
         
-        # 发射计时器（每60帧发射一次，速度更慢）
-        self.fire_timer = 0
+        # 每60步发射一次（速度更慢），到点由时间轮调用 fire
         self.fire_interval = 60
+        self.next_fire = 0
+        if state is not None:
+            self.schedule_fire(state.clock.ticks + self.fire_interval)
         
         # 跟随相关属性
         self.follow_distance = 60 + self.index * 60  # 每个跟班间隔60像素（更稀疏）
         self.move_speed = 6.0  # 移动速度（能跟上玩家）
         self.position_x = float(self.rect.centerx)
         self.position_y = float(self.rect.centery)
+        self.net_id = 0
     
     def update(self):
         """更新小跟班（沿着玩家历史轨迹跟随）"""
-        # 如果处于暂停状态，不更新位置和发射
-        if self.state is not None and getattr(self.state, 'freeze_mode', False):
-            return
-        
         # 根据历史轨迹计算目标位置
         target_x, target_y = self.get_target_position()
         
@@ -369,13 +694,15 @@ class Follower(pygame.sprite.Sprite):
         
         self.rect.centerx = int(self.position_x)
         self.rect.centery = int(self.position_y)
-        
-        # 更新发射计时器
-        self.fire_timer += 1
-        if self.fire_timer >= self.fire_interval and self.state is not None:
-            # 发射子弹朝向玩家前方的随机方向
-            self.fire_bullet()
-            self.fire_timer = 0
+
+    def schedule_fire(self, tick):
+        self.next_fire = tick
+        self.state.timers.schedule(tick, self.fire)
+
+    def fire(self):
+        """定时开火：发射后登记下一次"""
+        self.fire_bullet()
+        self.schedule_fire(self.next_fire + self.fire_interval)
     
     def get_target_position(self):
         """根据历史轨迹计算目标位置"""
@@ -416,55 +743,57 @@ class Follower(pygame.sprite.Sprite):
 
 class FollowerBullet(pygame.sprite.Sprite):
     """小跟班发射的子弹（对玩家无伤害）"""
-    
+
+    __slots__ = ('image', 'rect', 'velocity', 'owner', 'state', 'net_id')
+
     def __init__(self, pos, vx, vy, owner=None, state=None):
         super().__init__()
-        self.image = pygame.Surface((10, 10), pygame.SRCALPHA)
-        # 使用浅蓝色以区别于玩家子弹
-        pygame.draw.circle(self.image, (100, 200, 255), (5, 5), 5)
+        self.image = follower_bullet_image()
         self.rect = self.image.get_rect(center=pos)
         self.velocity = (vx, vy)
         self.owner = owner
         self.state = state
+        self.net_id = 0
     
     def update(self):
         """小跟班子弹移动"""
-        # 冻结时不移动
-        if self.state is not None and getattr(self.state, 'freeze_mode', False):
-            return
-
         vx, vy = self.velocity
         self.rect.x += vx
         self.rect.y += vy
         
-        # 出屏幕外消失
-        if not (0 <= self.rect.centerx < SCREEN_W and 0 <= self.rect.centery < SCREEN_H):
+        # 出世界外消失
+        if not WORLD_RECT.collidepoint(self.rect.center):
             self.kill()
 
 
 class Enemy(pygame.sprite.Sprite):
     """敌方怪物"""
 
+    __slots__ = ('image', 'rect', 'target', 'state', 'speed', 'random_angle', 'sway_offset', 'sway_direction',
+                 'random_motion_intensity', 'is_dying', 'death_tick', 'death_duration', 'alpha',
+                 'is_dodging', 'dodge_tick', 'dodge_direction', 'has_dodged_before', 'vx', 'vy', 'angle', 'timer',
+                 'net_id')
+
     def __init__(self, target, speed=None, state=None):
         super().__init__()
-        self.image = pygame.Surface((36, 36), pygame.SRCALPHA)
-        pygame.draw.circle(self.image, COLOR_RED, (18, 18), 18)
+        self.image = enemy_image()
         self.rect = self.image.get_rect()
 
-        # 生成在屏幕外随机位置（四个边缘）
+        # 生成在目标视口外随机位置（四个边缘）
+        area = view_rect(target.rect.center)
         side = random.choice(['top', 'bottom', 'left', 'right'])
         if side == 'top':
-            self.rect.centerx = random.randint(0, SCREEN_W)
-            self.rect.top    = -36
+            self.rect.centerx = random.randint(area.left, area.right)
+            self.rect.top    = area.top - 36
         elif side == 'bottom':
-            self.rect.centerx = random.randint(0, SCREEN_W)
-            self.rect.bottom = SCREEN_H + 36
+            self.rect.centerx = random.randint(area.left, area.right)
+            self.rect.bottom = area.bottom + 36
         elif side == 'left':
-            self.rect.centery = random.randint(0, SCREEN_H)
-            self.rect.left = -36
+            self.rect.centery = random.randint(area.top, area.bottom)
+            self.rect.left = area.left - 36
         else:  # right
-            self.rect.centery = random.randint(0, SCREEN_H)
-            self.rect.right = SCREEN_W + 36
+            self.rect.centery = random.randint(area.top, area.bottom)
+            self.rect.right = area.right + 36
 
         self.target = target
         self.state = state  # 游戏状态引用
@@ -474,23 +803,21 @@ class Enemy(pygame.sprite.Sprite):
         self.random_angle = random.uniform(-0.3, 0.3)  # 随机偏转角度
         self.sway_offset = 0  # 摇摆偏移
         self.sway_direction = random.choice([-1, 1])  # 摇摆方向
+        self.random_motion_intensity = 0.0  # 随机运动强度，0 为走直线（见 set_random_motion）
         
         # 死亡状态
         self.is_dying = False  # 是否正在死亡
-        self.death_time = 0  # 死亡时长
+        self.death_tick = 0  # 死亡时的逻辑步
+        self.death_duration = 0  # 淡出总步数（die 时按难度设定）
         self.alpha = 255  # 透明度
         
         # 闪避状态
         self.is_dodging = False  # 是否正在闪避
-        self.dodge_time = 0  # 闪避时间计数
+        self.dodge_tick = 0  # 开始闪避时的逻辑步
         self.dodge_direction = (0, 0)  # 闪避方向
         self.has_dodged_before = False  # 是否曾经闪避过（用于小跟班转换）
-
-        # 保存原始图像以便恢复
-        try:
-            self._orig_image = self.image.copy()
-        except Exception:
-            self._orig_image = None
+        self.timer = None  # 时间轮里等着的定时（闪避结束或淡出结束），同时只有一个
+        self.net_id = 0
 
         # 方向将根据目标位置更新
         self.update_direction()
@@ -499,9 +826,6 @@ class Enemy(pygame.sprite.Sprite):
         """设置随机运动强度（难度参数）"""
         self.random_motion_intensity = intensity
 
-        # 冻结标记
-        self.is_frozen = False
-
     def update_direction(self):
         """根据玩家位置更新朝向（关键修复：朝玩家跑而不是往中心跑）"""
         dx = self.target.rect.centerx - self.rect.centerx
@@ -516,37 +840,17 @@ class Enemy(pygame.sprite.Sprite):
 
     def update(self):
         """敌人移动并监测碰撞"""
-        # 如果正在死亡，只处理淡出
+        # 如果正在死亡，只处理淡出（按死亡后经过的步数降低透明度，到期由时间轮移除）
         if self.is_dying:
-            self.death_time += 1
-            # 根据死亡时长淡出
-            if self.death_time > self.death_duration:
-                self.kill()
-            else:
-                # 逐渐降低透明度
-                self.alpha = int(255 * (1 - self.death_time / self.death_duration))
-                self.image.set_alpha(self.alpha)
-            return
-        # 如果被全局冻结且不是死亡状态，直接不移动（保留视觉状态）
-        if getattr(self, 'is_frozen', False) and not self.is_dying:
+            elapsed = self.state.clock.ticks - self.death_tick
+            self.alpha = max(0, int(255 * (1 - elapsed / self.death_duration)))
+            self.image.set_alpha(self.alpha)
             return
         
-        # 如果正在闪避，处理闪避动画
+        # 如果正在闪避，快速闪避移动（到期由时间轮调用 end_dodge）
         if self.is_dodging:
-            self.dodge_time += 1
-            # 闪避持续0.3秒（18帧）
-            if self.dodge_time > 18:
-                self.is_dodging = False
-                # 恢复原始图像
-                try:
-                    if hasattr(self, '_orig_image') and self._orig_image is not None:
-                        self.image = self._orig_image
-                except Exception:
-                    pass
-            else:
-                # 快速闪避移动
-                self.rect.x += self.dodge_direction[0]
-                self.rect.y += self.dodge_direction[1]
+            self.rect.x += self.dodge_direction[0]
+            self.rect.y += self.dodge_direction[1]
             return
         
         # 每帧重新计算朝向（追踪玩家移动）
@@ -557,7 +861,7 @@ class Enemy(pygame.sprite.Sprite):
         y_move = self.vy
         
         # 添加随机摇摆运动（非正弦，而是随机偏转）
-        if hasattr(self, 'random_motion_intensity') and self.random_motion_intensity > 0:
+        if self.random_motion_intensity > 0:
             # 随机改变摇摆方向
             if random.random() < 0.1:  # 10%概率改变方向
                 self.sway_direction = random.choice([-1, 1])
@@ -575,21 +879,48 @@ class Enemy(pygame.sprite.Sprite):
         if self.rect.colliderect(self.target.rect):
             self.target.lose_life(self.state)
             self.kill()
+
+    def update_dormant(self, steps):
+        """离所有视口都很远时的简化模拟：一次直线走 steps 帧的路，不摇摆、不判碰撞（离玩家太远碰不到）"""
+        if self.is_dying or self.is_dodging:
+            for _ in range(steps):
+                self.update()
+            return
+        self.update_direction()
+        self.rect.x += self.vx * steps
+        self.rect.y += self.vy * steps
     
+    def set_timer(self, tick, callback):
+        """登记这个敌人唯一的定时，替换掉还没到期的那个（淡出会取消闪避结束）"""
+        timers = self.state.timers
+        timers.cancel(self.timer)
+        self.timer = timers.schedule(tick, callback)
+
+    def kill(self):
+        """离场（撞到玩家、变成小跟班、淡出结束）时把还没到期的定时一起撤掉"""
+        if self.timer is not None:
+            self.state.timers.cancel(self.timer)
+            self.timer = None
+        super().kill()
+
     def die(self, difficulty_level=1):
         """敌人死亡，进入淡出状态"""
         self.is_dying = True
-        self.death_time = 0
+        self.death_tick = self.state.clock.ticks
         # 难度越高淡出越快：基础60帧，难度每增加1就减少10帧（最低20帧）
         self.death_duration = max(20, 60 - (difficulty_level - 1) * 10)
+        self.set_timer(self.death_tick + self.death_duration + 1, self.kill)
         self.vx = 0
         self.vy = 0
+        # 淡出要改贴图透明度：换成自己的一份拷贝，不能动共用的贴图
+        self.image = self.image.copy()
     
     def dodge(self):
         """敌人闪避"""
         self.is_dodging = True
         self.has_dodged_before = True  # 标记为曾经闪避过
-        self.dodge_time = 0
+        self.dodge_tick = self.state.clock.ticks
+        self.set_timer(self.dodge_tick + DODGE_STEPS, self.end_dodge)
         # 随机选择闪避方向（垂直于追踪方向）
         perp_angle = self.angle + random.choice([-1, 1]) * (math.pi / 2)
         dodge_speed = 8
@@ -598,57 +929,114 @@ class Enemy(pygame.sprite.Sprite):
             dodge_speed * math.sin(perp_angle)
         )
         # 将敌人替换为绘制的小丑图标以示闪避（确保跨平台显示）
-        try:
-            w, h = self.image.get_size()
-            clown = pygame.Surface((w, h), pygame.SRCALPHA)
-            cx, cy = w // 2, h // 2
-            # 面部半径
-            face_r = int(min(w, h) * 0.38)
-            # 皮肤颜色
-            skin = (255, 224, 189)
-            # 头发（左右两侧）颜色
-            hair_colors = [(220, 20, 60), (30, 144, 255), (34, 139, 34)]
-
-            # 画脸
-            pygame.draw.circle(clown, skin, (cx, cy), face_r)
-
-            # 画头发（左中右三簇小圆）
-            hair_r = int(face_r * 0.45)
-            offsets = [(-face_r, -int(face_r*0.2)), (0, -int(face_r*0.6)), (face_r, -int(face_r*0.2))]
-            for i, (ox, oy) in enumerate(offsets):
-                col = hair_colors[i % len(hair_colors)]
-                pygame.draw.circle(clown, col, (cx + ox, cy + oy), hair_r)
-
-            # 眼睛
-            eye_r = max(2, face_r // 6)
-            eye_x_off = int(face_r * 0.45)
-            eye_y_off = int(face_r * -0.15)
-            pygame.draw.circle(clown, (0, 0, 0), (cx - eye_x_off, cy + eye_y_off), eye_r)
-            pygame.draw.circle(clown, (0, 0, 0), (cx + eye_x_off, cy + eye_y_off), eye_r)
-            # 白眼珠（小高光）
-            pygame.draw.circle(clown, (255, 255, 255), (cx - eye_x_off - 1, cy + eye_y_off - 1), max(1, eye_r//3))
-            pygame.draw.circle(clown, (255, 255, 255), (cx + eye_x_off - 1, cy + eye_y_off - 1), max(1, eye_r//3))
-
-            # 鼻子（红色）
-            nose_r = max(3, face_r // 5)
-            pygame.draw.circle(clown, (220, 20, 60), (cx, cy + int(face_r*0.05)), nose_r)
-
-            # 嘴巴（用弧线）
-            mouth_w = int(face_r * 1.0)
-            mouth_h = int(face_r * 0.55)
-            mouth_rect = pygame.Rect(cx - mouth_w//2, cy + int(face_r*0.15), mouth_w, mouth_h)
-            try:
-                pygame.draw.arc(clown, (139, 0, 0), mouth_rect, math.radians(20), math.radians(160), max(2, face_r//10))
-            except Exception:
-                # 若 arc 不可用，画一个简单的红色椭圆代表嘴巴
-                pygame.draw.ellipse(clown, (139, 0, 0), mouth_rect)
+        self.image = clown_image()
 
-            # 轻微边缘描边，增加识别度
-            pygame.draw.circle(clown, (0, 0, 0, 30), (cx, cy), face_r, 1)
+    def end_dodge(self):
+        self.is_dodging = False
+        self.timer = None
+        self.image = enemy_image()   # 恢复原始图像
 
-            self.image = clown
-        except Exception:
-            pass
+# ================== 模拟时钟 ==================
+# 世界（敌人、子弹、小跟班、粒子、敌人生成计时）只按模拟时钟走：每个渲染帧往 carry 里加 scale，
+# 攒够一个整数就跑一个逻辑步。scale = 0.5 每两帧走一步（慢动作），2.0 每帧走两步（快进），
+# 暂停就是不走——停表、改速都是 O(1)，不用再逐个实体保存 / 恢复速度。
+# 玩家不受时间倍率影响（和原来的冻结一样：时间停止时玩家照样能走、能开火）。
+# 每个逻辑步的内容和倍率无关：玩家在每一步的操作相同（比如站着不动）时，不同倍率下走满同样多步，
+# 快照里除了倍率、零头和按渲染帧记录的玩家位置历史，其余各段逐字节一致（见 test_终极射击小游戏.py）。
+
+class SimClock:
+    """带倍率的模拟时钟，以逻辑步（1/FPS 秒）计时"""
+
+    def __init__(self):
+        self.scale = 1.0       # 时间倍率
+        self.paused = False    # 时间停止（右键），恢复后仍是原来的倍率
+        self.carry = 0.0       # 攒着还没走的零头
+        self.ticks = 0         # 已经走过的逻辑步数
+
+    def advance(self):
+        """推进一个渲染帧，返回这一帧要跑几个逻辑步（每跑一步由 step_world 计入 ticks）"""
+        if self.paused:
+            return 0
+        self.carry += self.scale
+        steps = int(self.carry)
+        self.carry -= steps
+        return steps
+
+    def ms_since(self, tick):
+        """从逻辑步 tick 到现在过了多少模拟毫秒"""
+        return (self.ticks - tick) * 1000.0 / FPS
+
+# 定时效果（闪避结束、死亡淡出结束、小跟班开火）不再由每个实体每步累加计数器去轮询，
+# 而是把到期的逻辑步登记进分层时间轮：每步只看当前这一格，只有到期的实体才被调用。
+# 第 0 层每格一步，往上每层每格是下一层的一整圈；一格转到时把上一层对应格里的定时分散下来。
+# 同一步到期的回调按登记先后执行，和它们在哪一层待过无关——快照恢复时按实体顺序重新登记，结果逐字节一致。
+TIMER_WHEEL_BITS   = 6          # 每层 64 格
+TIMER_WHEEL_LEVELS = 3          # 64³ 步（约 73 分钟）以内进轮子，更远的先放溢出表
+_WHEEL_SLOTS = 1 << TIMER_WHEEL_BITS
+_WHEEL_MASK  = _WHEEL_SLOTS - 1
+
+class TimerWheel:
+    """按逻辑步登记到期回调的分层时间轮；句柄是 [到期步, 序号, 回调, 参数]"""
+
+    def __init__(self, tick=0):
+        self.tick = tick         # 已经处理完的逻辑步
+        self.levels = [[[] for _ in range(_WHEEL_SLOTS)] for _ in range(TIMER_WHEEL_LEVELS)]
+        self.overflow = []
+        self.seq = 0
+        self.pending = 0         # 还没到期也没取消的定时数（调试浮层显示）
+
+    def schedule(self, tick, callback, *args):
+        """第 tick 步（早于下一步的按下一步算）调用 callback(*args)，返回可以 cancel 的句柄"""
+        entry = [max(tick, self.tick + 1), self.seq, callback, args]
+        self.seq += 1
+        self.pending += 1
+        self._place(entry)
+        return entry
+
+    def cancel(self, entry):
+        if entry is not None and entry[2] is not None:
+            entry[2] = None
+            self.pending -= 1
+
+    def _place(self, entry):
+        tick = entry[0]
+        for level in range(TIMER_WHEEL_LEVELS):
+            shift = TIMER_WHEEL_BITS * level
+            if tick >> (shift + TIMER_WHEEL_BITS) == self.tick >> (shift + TIMER_WHEEL_BITS):
+                self.levels[level][(tick >> shift) & _WHEEL_MASK].append(entry)
+                return
+        self.overflow.append(entry)
+
+    def advance(self, tick):
+        """处理到第 tick 步为止到期的回调"""
+        while self.tick < tick:
+            self.tick += 1
+            t = self.tick
+            if t & _WHEEL_MASK == 0:
+                # 低层转完一圈：从最高的一层起，把这一格的定时分到下面各层
+                top = 1
+                while top < TIMER_WHEEL_LEVELS and (t >> (TIMER_WHEEL_BITS * top)) & _WHEEL_MASK == 0:
+                    top += 1
+                if top == TIMER_WHEEL_LEVELS:
+                    pending, self.overflow = self.overflow, []
+                    for entry in pending:
+                        self._place(entry)
+                for level in range(min(top, TIMER_WHEEL_LEVELS - 1), 0, -1):
+                    slot = self.levels[level][(t >> (TIMER_WHEEL_BITS * level)) & _WHEEL_MASK]
+                    pending = slot[:]
+                    slot.clear()
+                    for entry in pending:
+                        self._place(entry)
+            slot = self.levels[0][t & _WHEEL_MASK]
+            if slot:
+                due = sorted(slot, key=lambda entry: entry[1])
+                slot.clear()
+                for entry in due:
+                    callback = entry[2]
+                    if callback is not None:
+                        entry[2] = None
+                        self.pending -= 1
+                        callback(*entry[3])
 
 # ================== 主游戏状态 ==================
 class GameState:
@@ -661,8 +1049,10 @@ class GameState:
         self.player        = Player()
         self.all_sprites.add(self.player)
 
-        # 计时器
-        self.last_spawn = pygame.time.get_ticks()
+        # 模拟时钟与计时器（以逻辑步计）
+        self.clock = SimClock()
+        self.timers = TimerWheel()
+        self.last_spawn = 0
         
         # 难度参数
         self.difficulty_level = 1
@@ -692,13 +1082,13 @@ class GameState:
         # 敌人血溅粒子
         self.enemy_particles = []
 
-        # 全局冻结模式（按空格切换）——敌人与子弹停止移动，但玩家可继续操作
-        self.freeze_mode = False
-        
         # 弹道系统
         self.num_trajectories = 1  # 当前弹道数（初始为1）
         self.last_bullet_angles = []  # 记录上一次射击的角度用于计算新弹道
 
+        # 逻辑帧计数（快照用）
+        self.frame = 0
+
     def update_difficulty(self):
         """根据分数更新难度"""
         new_level = self.player.score // DIFFICULTY_SCORE_STEP + 1
@@ -715,71 +1105,28 @@ class GameState:
             # 每升高2级增加一条弹道
             self.num_trajectories = 1 + (new_level - 1) // 2
 
-    # 冻结/恢复控制
-    def toggle_freeze(self):
-        if self.freeze_mode:
-            self.exit_freeze()
-        else:
-            self.enter_freeze()
-        try:
-            print(f"[GameState] freeze_mode -> {self.freeze_mode}")
-        except Exception:
-            pass
+    # 冻结/恢复控制：只是停表，世界不推进，敌人和子弹自然静止
+    @property
+    def freeze_mode(self):
+        return self.clock.paused
 
-    def enter_freeze(self):
-        self.freeze_mode = True
-        # 冻结所有敌人（保存原速度以便恢复）
-        for enemy in list(self.enemies):
-            try:
-                enemy.prev_vx = getattr(enemy, 'vx', 0)
-                enemy.prev_vy = getattr(enemy, 'vy', 0)
-                enemy.is_frozen = True
-            except Exception:
-                pass
-        # 冻结所有现有子弹（保存速度）
-        for bullet in list(self.bullets):
-            try:
-                bullet.stored_velocity = getattr(bullet, 'velocity', (0, 0))
-                bullet.velocity = (0, 0)
-                bullet.frozen = True
-            except Exception:
-                pass
-        # 重置生成计时器，避免暂停期间累计导致解冻后立刻刷新敌人
-        try:
-            self.last_spawn = pygame.time.get_ticks()
-        except Exception:
-            pass
+    def toggle_freeze(self):
+        self.clock.paused = not self.clock.paused
+        print(f"[GameState] freeze_mode -> {self.freeze_mode}")
 
-    def exit_freeze(self):
-        self.freeze_mode = False
-        # 恢复敌人速度
-        for enemy in list(self.enemies):
-            try:
-                enemy.is_frozen = False
-                if hasattr(enemy, 'prev_vx'):
-                    enemy.vx = enemy.prev_vx
-                    enemy.vy = enemy.prev_vy
-            except Exception:
-                pass
-        # 恢复子弹速度
-        for bullet in list(self.bullets):
-            try:
-                if getattr(bullet, 'frozen', False):
-                    bullet.velocity = getattr(bullet, 'stored_velocity', bullet.velocity)
-                    bullet.frozen = False
-            except Exception:
-                pass
+    def step_time_scale(self, direction):
+        """在 TIME_SCALES 里往慢（-1）或快（+1）挪一档"""
+        scales = sorted(set(TIME_SCALES) | {self.clock.scale})
+        i = scales.index(self.clock.scale) + direction
+        self.clock.scale = scales[max(0, min(len(scales) - 1, i))]
+        print(f"[GameState] time_scale -> {self.clock.scale}")
 
     def spawn_enemy(self):
-        """按间隔生成敌人"""
-        # 不在冻结模式下才生成新敌人
-        if getattr(self, 'freeze_mode', False):
-            return
-        curr_time = pygame.time.get_ticks()
-        if curr_time - self.last_spawn > self.current_spawn_interval:
+        """按间隔生成敌人（间隔按模拟时间算，暂停时自然不刷）"""
+        if self.clock.ms_since(self.last_spawn) > self.current_spawn_interval:
             # 生成一个批次的敌人（数量随等级增长）
             for i in range(self.spawn_burst):
-                enemy = Enemy(self.player, self.current_enemy_speed, self)
+                enemy = Enemy(self.enemy_target(), self.current_enemy_speed, self)
                 # 根据难度添加随机运动强度
                 if self.difficulty_level >= 2:
                     intensity = 0.5 + (self.difficulty_level - 2) * 0.3
@@ -789,7 +1136,7 @@ class GameState:
                 enemy.rect.y += random.randint(-30, 30)
                 self.enemies.add(enemy)
                 self.all_sprites.add(enemy)
-            self.last_spawn = curr_time
+            self.last_spawn = self.clock.ticks
 
     def fire_bullet(self, target_pos):
         """发射子弹，支持多弹道，根据死亡次数设置反弹次数"""
@@ -813,55 +1160,70 @@ class GameState:
                 angles.append(main_angle + offset)
         
         # 发射所有弹道（并创建一次发射的记录，用于连击判定）
-        shot_id = self.next_shot_id
-        self.next_shot_id += 1
-        self.shots[shot_id] = {'pending': len(angles), 'any_hit': False}
+        shot_id = self.new_shot()
+        info = self.shots[shot_id]
         
         # 根据死亡次数计算反弹次数：第一次死亡后1次，第二次死亡后2次
         bounces_remaining = self.death_count
 
         for angle in angles:
+            # 超过子弹上限的弹道不发射，也不计入这次发射等待的子弹数
+            if len(self.bullets) >= BULLET_LIMIT * self.num_trajectories:
+                break
             bullet_speed_vx = BULLET_SPEED * math.cos(angle)
             bullet_speed_vy = BULLET_SPEED * math.sin(angle)
 
             bullet = Bullet(self.player.rect.center, target_pos, owner=self, shot_id=shot_id, bounces_remaining=bounces_remaining)
             # 覆盖速度方向
             bullet.velocity = (bullet_speed_vx, bullet_speed_vy)
-            # 保存真实速度以便冻结/恢复
-            bullet.stored_velocity = bullet.velocity
-            if self.freeze_mode:
-                bullet.velocity = (0, 0)
-                bullet.frozen = True
+            self.bullets.add(bullet)
+            self.all_sprites.add(bullet)
+            info['pending'] += 1
+
+        # 一颗都没放出去的发射不留记录（否则它永远等不到子弹结束，长时间游戏后越积越多）
+        if info['pending'] == 0:
+            del self.shots[shot_id]
 
-            if len(self.bullets) < BULLET_LIMIT * self.num_trajectories:
-                self.bullets.add(bullet)
-                self.all_sprites.add(bullet)
+    def new_shot(self):
+        """登记一次发射，返回批次号；pending 由发射方按实际放出的子弹数累加"""
+        shot_id = self.next_shot_id
+        self.next_shot_id += 1
+        self.shots[shot_id] = {'pending': 0, 'any_hit': False}
+        return shot_id
 
     def update(self):
-        """更新所有逻辑"""
-        keys = pygame.key.get_pressed()
-        self.player.update(keys)
-        
-        # 记录玩家位置历史（每帧记录一次）
-        self.player_position_history.append((self.player.rect.centerx, self.player.rect.centery))
-        # 保持历史长度不超过1000个位置点（防止内存过度消耗）
-        if len(self.player_position_history) > 1000:
-            self.player_position_history.pop(0)
+        """更新所有逻辑：玩家每帧一步，世界按模拟时钟走 0 到若干步"""
+        self.frame += 1
+        self.update_player()
+        for _ in range(self.clock.advance()):
+            self.step_world()
+
+    def step_world(self):
+        """世界的一个逻辑步：难度、生成、移动、碰撞"""
+        self.clock.ticks += 1
 
         # 更新难度
         self.update_difficulty()
         
-        # 这里将处理所有更新与碰撞
         self.spawn_enemy()
         # 更新子弹和敌人，但不更新玩家（已单独处理）
         for bullet in self.bullets:
             bullet.update()
-        for enemy in self.enemies:
-            enemy.update()
+        # 视口附近的敌人每步都模拟；更远的按顺序轮流，每 DORMANT_INTERVAL 步走一大步
+        active = [view.inflate(2 * ACTIVE_MARGIN, 2 * ACTIVE_MARGIN) for view in self.views()]
+        phase = self.clock.ticks % DORMANT_INTERVAL
+        for i, enemy in enumerate(self.enemies):
+            if enemy.rect.collidelist(active) >= 0:
+                enemy.update()
+            elif i % DORMANT_INTERVAL == phase:
+                enemy.update_dormant(DORMANT_INTERVAL)
         
         # 更新小跟班
         for follower in self.followers[:]:
             follower.update()
+
+        # 到期的定时：小跟班开火、闪避结束、淡出结束
+        self.timers.advance(self.clock.ticks)
         
         # 更新小跟班子弹
         for fbullet in self.follower_bullets[:]:
@@ -872,10 +1234,38 @@ class GameState:
         
         # 更新敌人血溅粒子
         if self.enemy_particles:
-            draw_death_particles(None, self.enemy_particles)
+            update_death_particles(self.enemy_particles)
         
         self.handle_collisions()
 
+    def update_player(self):
+        """玩家走位（读本地键盘）并记录位置历史；联机服务器改为读各客户端的输入"""
+        keys = pygame.key.get_pressed()
+        self.player.update(keys)
+        
+        # 记录玩家位置历史（每帧记录一次）
+        self.player_position_history.append((self.player.rect.centerx, self.player.rect.centery))
+        # 保持历史长度不超过1000个位置点（防止内存过度消耗）
+        if len(self.player_position_history) > 1000:
+            self.player_position_history.pop(0)
+
+    def enemy_target(self):
+        """新生成的敌人追谁（单人就是玩家）"""
+        return self.player
+
+    def views(self):
+        """所有玩家的视口（世界坐标），决定哪些敌人逐帧模拟；联机版每个活着的玩家一个"""
+        return [self.camera()]
+
+    def camera(self):
+        """本地画面的视口：跟着 self.player 走"""
+        return view_rect(self.player.rect.center)
+
+    def to_world(self, pos):
+        """屏幕坐标（鼠标、头部瞄准）-> 世界坐标"""
+        view = self.camera()
+        return pos[0] + view.left, pos[1] + view.top
+
     def handle_collisions(self):
         """
         子弹-敌人碰撞判定:
@@ -893,7 +1283,7 @@ class GameState:
             for bullet, enemies_hit in collisions.items():
                 # 标记当前子弹为命中（用于连击判断）
                 try:
-                    if hasattr(bullet, 'shot_id'):
+                    if bullet.shot_id is not None:
                         self.on_bullet_removed(bullet.shot_id, hit=True)
                 except Exception:
                     pass
@@ -903,7 +1293,7 @@ class GameState:
                         enemy.dodge()
                     else:
                         # 检查敌人是否曾经闪避过 - 如果是，则转为小跟班而不是死亡
-                        if getattr(enemy, 'has_dodged_before', False) and len(self.followers) < 3:
+                        if enemy.has_dodged_before and len(self.followers) < 3:
                             # 曾经闪避过的敌人被击中 -> 转为小跟班（上限3个）
                             follower = Follower(self.player, state=self, index=len(self.followers))
                             # 小跟班初始位置在玩家后面（沿着历史轨迹），不是敌人处
@@ -972,15 +1362,21 @@ class GameState:
     def draw(self, surf):
         """绘制全部"""
         surf.fill(COLOR_BLACK)
-        self.all_sprites.draw(surf)
+        view = self.camera()
+        ox, oy = view.topleft
+        draw_world_grid(surf, view)
+        # 只画和视口相交的精灵，坐标减去视口左上角
+        visible = view.colliderect
+        surf.blits([(spr.image, spr.rect.move(-ox, -oy)) for spr in self.all_sprites if visible(spr.rect)], 0)
         
         # 绘制小跟班子弹
         for fbullet in self.follower_bullets:
-            surf.blit(fbullet.image, fbullet.rect)
+            if visible(fbullet.rect):
+                surf.blit(fbullet.image, fbullet.rect.move(-ox, -oy))
         
         # 绘制敌人血溅粒子
         if self.enemy_particles:
-            draw_death_particles(surf, self.enemy_particles)
+            draw_death_particles(surf, self.enemy_particles, (ox, oy))
         
         # 绘制爱心血量（右上角）
         draw_hearts(surf, self.player.lives, INITIAL_LIVES)
@@ -989,7 +1385,9 @@ class GameState:
         hud = "Score: {}   Level: {}   Trajectories: {}".format(
             self.player.score, self.difficulty_level, self.num_trajectories
         )
-        hud_surf = font.render(hud, True, COLOR_WHITE)
+        if self.clock.scale != 1.0:
+            hud += "   Speed: x{:g}".format(self.clock.scale)
+        hud_surf = render_text(font, hud, COLOR_WHITE)
         surf.blit(hud_surf, (10, 10))
 
         # 连击显示与动画（在玩家上方）
@@ -1014,157 +1412,186 @@ class GameState:
                 color = red
 
             # 渲染文本并进行缩放
-            combo_surf = big_font.render(combo_text, True, color)
+            combo_surf = render_text(big_font, combo_text, color)
             # 应用缩放
             sw, sh = combo_surf.get_size()
-            combo_surf = pygame.transform.smoothscale(combo_surf, (int(sw * scale), int(sh * scale)))
-            combo_rect = combo_surf.get_rect(center=(self.player.rect.centerx, self.player.rect.top - 30))
+            combo_rect = pygame.Rect(0, 0, int(sw * scale), int(sh * scale))
+            combo_rect.center = (self.player.rect.centerx - ox, self.player.rect.top - 30 - oy)
             # 逐渐淡出（使用 progress 做 alpha）
             try:
                 alpha = int(255 * progress)
                 combo_surf.set_alpha(alpha)
             except Exception:
                 pass
-            surf.blit(combo_surf, combo_rect)
+            blit_scaled(surf, combo_surf, combo_rect)
             # 计时器减少
             self.combo_anim_timer -= 1
 
         # 冻结模式可视化提示（在屏幕中央顶部）
-        if getattr(self, 'freeze_mode', False):
+        if self.freeze_mode:
             try:
-                overlay = pygame.Surface((SCREEN_W, SCREEN_H), pygame.SRCALPHA)
-                overlay.fill((0, 0, 0, 100))
-                surf.blit(overlay, (0, 0))
-                pause_surf = big_font.render("PAUSED", True, (255, 255, 0))
+                blit_overlay(surf, 100)
+                pause_surf = render_text(big_font, "PAUSED", (255, 255, 0))
                 pause_rect = pause_surf.get_rect(center=(SCREEN_W // 2, 60))
                 surf.blit(pause_surf, pause_rect)
-                hint_surf = font.render("Right-click to resume", True, COLOR_WHITE)
+                hint_surf = render_text(font, "Right-click to resume", COLOR_WHITE)
                 hint_rect = hint_surf.get_rect(center=(SCREEN_W // 2, 110))
                 surf.blit(hint_surf, hint_rect)
             except Exception:
                 pass
 
+# ================== 菜单背景 ==================
+# 主菜单背后的装饰场景：中央三角形朝随机方向发射子弹，打中四处乱跑的小球就让它在别处重生。
+# 和游戏一样由 SimClock 按逻辑步推进（右键暂停）、发射由 TimerWheel 定时，实体放在固定容量的 NumPy 数组里，
+# 每步整批运算，没有逐个实体的 Python 循环；小球和子弹都是原地复用的槽位，挂机多久内存都不涨。
+# 用独立的随机数发生器，不影响游戏逻辑的随机序列。
+MENU_BALL_RADIUS   = 18
+MENU_BULLET_RADIUS = 3
+MENU_BULLET_SPEED  = 5.0
+MENU_BALL_JITTER   = 0.18               # 每步速度的随机扰动，让运动更自然
+MENU_BALL_SPEED    = (1.2, 3.5)         # 扰动后速度限制在这个范围内
+MENU_BALL_POSITIONS = np.array([
+    (150, 100),
+    (SCREEN_W - 150, 120),
+    (SCREEN_W // 2 - 200, SCREEN_H - 100),
+    (SCREEN_W // 2 + 200, SCREEN_H - 120),
+    (SCREEN_W // 2, SCREEN_H // 2 + 150),
+], dtype=float)
+
+class AttractScene:
+    """主菜单背景：小球和子弹各一组定长数组（位置、速度、存活标记）"""
+
+    def __init__(self, balls=MENU_BALL_COUNT, bullets=MENU_BULLET_CAPACITY):
+        self.rng = np.random.default_rng()
+        self.clock = SimClock()
+        self.timers = TimerWheel()
+        self.timers.schedule(MENU_BULLET_FIRE_INTERVAL, self.fire)
+        self.ball_pos = np.empty((balls, 2))
+        self.ball_vel = np.empty((balls, 2))
+        self.bullet_pos = np.zeros((bullets, 2))
+        self.bullet_vel = np.zeros((bullets, 2))
+        self.bullet_alive = np.zeros(bullets, dtype=bool)
+        self.center = np.array((SCREEN_W // 2, SCREEN_H // 2), dtype=float)
+        r = MENU_BALL_RADIUS
+        self.ball_max = np.array((SCREEN_W - r, SCREEN_H - r), dtype=float)
+        # 开局小球依次放在几个锚点附近，之后重生时随机挑锚点
+        self.respawn(np.arange(balls), np.arange(balls) % len(MENU_BALL_POSITIONS))
+
+    def respawn(self, slots, anchors=None):
+        """在锚点附近 ±40 像素重生 slots 这些小球，随机方向，速度 1.8 ~ 3.0"""
+        n = len(slots)
+        if anchors is None:
+            anchors = self.rng.integers(len(MENU_BALL_POSITIONS), size=n)
+        self.ball_pos[slots] = MENU_BALL_POSITIONS[anchors] + self.rng.uniform(-40, 40, (n, 2))
+        angle = self.rng.uniform(0, 2 * math.pi, n)
+        speed = self.rng.uniform(1.8, 3.0, n)
+        self.ball_vel[slots] = np.column_stack((np.cos(angle), np.sin(angle))) * speed[:, None]
+
+    def active_balls(self):
+        """低画质时只动、只画前几成的小球"""
+        return max(1, int(len(self.ball_pos) * quality.settings['menu_balls']))
+
+    def update(self):
+        for _ in range(self.clock.advance()):
+            self.step()
+
+    def fire(self):
+        """中央三角形定时朝随机方向发射一颗子弹，并登记下一次"""
+        free = np.flatnonzero(~self.bullet_alive)
+        if len(free):                               # 槽位满了就少打一发
+            i = free[0]
+            angle = self.rng.uniform(0, 2 * math.pi)
+            self.bullet_pos[i] = self.center
+            self.bullet_vel[i] = (math.cos(angle) * MENU_BULLET_SPEED, math.sin(angle) * MENU_BULLET_SPEED)
+            self.bullet_alive[i] = True
+        self.timers.schedule(self.clock.ticks + MENU_BULLET_FIRE_INTERVAL, self.fire)
+
+    def step(self):
+        """一个逻辑步：发射、移动、反弹、碰撞"""
+        self.clock.ticks += 1
+        self.timers.advance(self.clock.ticks)
+
+        # 子弹直线飞，出屏即回收
+        pos = self.bullet_pos
+        pos += self.bullet_vel
+        self.bullet_alive &= ((pos >= 0) & (pos <= (SCREEN_W, SCREEN_H))).all(axis=1)
+
+        # 小球移动、碰边反弹、随机扰动并限速
+        n = self.active_balls()
+        bpos, bvel = self.ball_pos[:n], self.ball_vel[:n]
+        bpos += bvel
+        r = MENU_BALL_RADIUS
+        out = (bpos < r) | (bpos > self.ball_max)
+        bvel[out] = -bvel[out]
+        np.clip(bpos, r, self.ball_max, out=bpos)
+        bvel += self.rng.uniform(-MENU_BALL_JITTER, MENU_BALL_JITTER, bvel.shape)
+        speed = np.hypot(bvel[:, 0], bvel[:, 1])
+        moving = speed > 0
+        bvel[moving] *= (np.clip(speed[moving], *MENU_BALL_SPEED) / speed[moving])[:, None]
+
+        # 子弹 × 小球一次算出全部距离；命中很少，只对命中的配对逐个处理：
+        # 每颗子弹最多打掉一个球，每个球只被打掉一次
+        live = np.flatnonzero(self.bullet_alive)
+        if len(live):
+            d = self.bullet_pos[live, None, :] - bpos[None, :, :]
+            hits = np.argwhere((d ** 2).sum(axis=2) < (r + MENU_BULLET_RADIUS) ** 2)
+            if len(hits):
+                used, killed = set(), []
+                for b, ball in hits.tolist():
+                    if b not in used and ball not in killed:
+                        used.add(b)
+                        killed.append(ball)
+                        self.bullet_alive[live[b]] = False
+                self.respawn(np.array(killed))
+        self.bullet_vel[~self.bullet_alive] = 0.0     # 回收的槽位停在原地
+
+    def draw(self, surf):
+        """无论是否暂停都按当前位置画"""
+        n = self.active_balls()
+        r, br = MENU_BALL_RADIUS, MENU_BULLET_RADIUS
+        bullet = circle_sprite((255, 255, 100), br)
+        surf.blits([(bullet, p) for p in (self.bullet_pos[self.bullet_alive].astype(int) - br).tolist()], 0)
+        ball = circle_sprite((100, 0, 0), r)
+        surf.blits([(ball, p) for p in (self.ball_pos[:n].astype(int) - r).tolist()], 0)
+
+menu_scene = AttractScene()
+
 # ================== 辅助函数 ==================
-def draw_main_menu(surf, fade_alpha=255, high_score=0):
-    """首屏/结束界面 - 带背景敌人和玩家"""
-    global MENU_BULLETS, MENU_BULLET_FIRE_TIMER
-    
+def draw_main_menu(surf, fade_alpha=255, high_score=0, can_resume=False):
+    """首屏/结束界面 - 带背景敌人和玩家；can_resume 时提示可按 C 继续上一局"""
     surf.fill(COLOR_BLACK)
+    menu_scene.update()
+    menu_scene.draw(surf)
 
-    # 处理子弹发射计时
-    if not MENU_PAUSED:
-        MENU_BULLET_FIRE_TIMER += 1
-        if MENU_BULLET_FIRE_TIMER >= MENU_BULLET_FIRE_INTERVAL:
-            # 中央三角形发射一颗子弹
-            triangle_cx = SCREEN_W // 2
-            triangle_cy = SCREEN_H // 2
-            angle = random.uniform(0, 2 * math.pi)
-            bullet_speed = 5.0
-            vx = math.cos(angle) * bullet_speed
-            vy = math.sin(angle) * bullet_speed
-            MENU_BULLETS.append({'x': float(triangle_cx), 'y': float(triangle_cy), 'vx': vx, 'vy': vy})
-            MENU_BULLET_FIRE_TIMER = 0
-
-    # 更新和绘制子弹
-    for bullet in MENU_BULLETS[:]:
-        if not MENU_PAUSED:
-            bullet['x'] += bullet['vx']
-            bullet['y'] += bullet['vy']
-        # 检查是否超出边界
-        if bullet['x'] < 0 or bullet['x'] > SCREEN_W or bullet['y'] < 0 or bullet['y'] > SCREEN_H:
-            MENU_BULLETS.remove(bullet)
-        else:
-            pygame.draw.circle(surf, (255, 255, 100), (int(bullet['x']), int(bullet['y'])), 3)
-
-    # 绘制装饰性移动小球（在边缘反弹）并处理碰撞
-    try:
-        for b in MENU_BALLS[:]:
-            if not b.get('alive', True):
-                continue
-            r = b.get('r', 18)
-            if not MENU_PAUSED:
-                # 更新位置
-                b['x'] += b['vx']
-                b['y'] += b['vy']
-                # 边界反弹
-                if b['x'] - r < 0:
-                    b['x'] = r
-                    b['vx'] = -b['vx']
-                if b['x'] + r > SCREEN_W:
-                    b['x'] = SCREEN_W - r
-                    b['vx'] = -b['vx']
-                if b['y'] - r < 0:
-                    b['y'] = r
-                    b['vy'] = -b['vy']
-                if b['y'] + r > SCREEN_H:
-                    b['y'] = SCREEN_H - r
-                    b['vy'] = -b['vy']
-
-                # 小幅随机扰动方向，使运动更自然
-                jitter_strength = 0.18
-                b['vx'] += random.uniform(-jitter_strength, jitter_strength)
-                b['vy'] += random.uniform(-jitter_strength, jitter_strength)
-                # 限制速度幅度，防止无限加速
-                spd = math.hypot(b['vx'], b['vy'])
-                min_spd, max_spd = 1.2, 3.5
-                if spd < min_spd and spd > 0:
-                    scale = min_spd / spd
-                    b['vx'] *= scale
-                    b['vy'] *= scale
-                elif spd > max_spd:
-                    scale = max_spd / spd
-                    b['vx'] *= scale
-                    b['vy'] *= scale
-
-            # 无论是否暂停，都绘制小球在当前位置
-            pygame.draw.circle(surf, (100, 0, 0), (int(b['x']), int(b['y'])), r)
-
-        # 检测子弹与小球碰撞
-        for bullet in MENU_BULLETS[:]:
-            for ball in MENU_BALLS:
-                if not ball.get('alive', True):
-                    continue
-                dx = bullet['x'] - ball['x']
-                dy = bullet['y'] - ball['y']
-                dist = math.hypot(dx, dy)
-                if dist < ball.get('r', 18) + 3:  # 3 是子弹半径
-                    # 碰撞：小球死亡，立即生成新小球
-                    ball['alive'] = False
-                    spawn_menu_ball()
-                    if bullet in MENU_BULLETS:
-                        MENU_BULLETS.remove(bullet)
-                    break
-    except Exception:
-        pass
-    
     # 绘制中心的蓝色玩家三角形
     player_center_x = SCREEN_W // 2
     player_center_y = SCREEN_H // 2
-    pygame.draw.polygon(
-        surf,
+    triangle = cached_sprite('menu_triangle', (61, 61), lambda img: pygame.draw.polygon(
+        img,
         COLOR_BLUE,
         [
-            (player_center_x, player_center_y - 30),  # 顶点
-            (player_center_x + 30, player_center_y + 30),  # 右下
-            (player_center_x - 30, player_center_y + 30)  # 左下
+            (30, 0),  # 顶点
+            (60, 60),  # 右下
+            (0, 60)  # 左下
         ]
-    )
+    ))
+    surf.blit(triangle, (player_center_x - 30, player_center_y - 30))
 
-    title_surf = big_font.render("TOP-DOWN Shooting Game", True, COLOR_GREEN)
+    title_surf = render_text(big_font, "TOP-DOWN Shooting Game", COLOR_GREEN)
     title_rect = title_surf.get_rect(center=(SCREEN_W // 2, SCREEN_H // 3))
     
-    instr_surf = font.render(
+    instr_surf = render_text(font,
         "Up/Down/Left/Right - Move | Mouse Left Click - Shoot | ESC - Quit",
-        True,
         COLOR_WHITE
     )
     instr_rect = instr_surf.get_rect(center=(SCREEN_W // 2, SCREEN_H // 2 + 60))
     
-    start_surf = font.render("Press ENTER to start", True, COLOR_WHITE)
+    start_text = "Press ENTER to start | C to continue" if can_resume else "Press ENTER to start"
+    start_surf = render_text(font, start_text, COLOR_WHITE)
     start_rect = start_surf.get_rect(center=(SCREEN_W // 2, SCREEN_H // 2 + 120))
     
     # 最高得分显示
-    high_score_surf = font.render("High Score: {}".format(high_score), True, COLOR_YELLOW)
+    high_score_surf = render_text(font, "High Score: {}".format(high_score), COLOR_YELLOW)
     high_score_rect = high_score_surf.get_rect(center=(SCREEN_W // 2, SCREEN_H - 40))
     
     # 应用淡入效果
@@ -1178,20 +1605,17 @@ def draw_main_menu(surf, fade_alpha=255, high_score=0):
     surf.blit(instr_surf, instr_rect)
     surf.blit(start_surf, start_rect)
     surf.blit(high_score_surf, high_score_rect)
-    pygame.display.flip()
 
 def draw_game_over(surf, score, fade_alpha=255, show_bg=True):
     """游戏结束弹窗"""
     if show_bg:
-        overlay = pygame.Surface((SCREEN_W, SCREEN_H), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))  # 半透明
-        surf.blit(overlay, (0, 0))
+        blit_overlay(surf, 180)  # 半透明
 
     msg = "Game Over! Score: {}".format(score)
-    msg_surf = big_font.render(msg, True, COLOR_RED)
+    msg_surf = render_text(big_font, msg, COLOR_RED)
     msg_rect = msg_surf.get_rect(center=(SCREEN_W // 2, SCREEN_H // 2 - 40))
     
-    replay_surf = font.render("Press R to restart or ESC to quit", True, COLOR_WHITE)
+    replay_surf = render_text(font, "Press R to restart or ESC to quit", COLOR_WHITE)
     replay_rect = replay_surf.get_rect(center=(SCREEN_W // 2, SCREEN_H // 2 + 30))
     
     # 应用淡入效果
@@ -1201,7 +1625,6 @@ def draw_game_over(surf, score, fade_alpha=255, show_bg=True):
     
     surf.blit(msg_surf, msg_rect)
     surf.blit(replay_surf, replay_rect)
-    pygame.display.flip()
 
 def draw_hearts(surf, lives, max_lives=3):
     """在右上角绘制爱心血量"""
@@ -1221,55 +1644,689 @@ def draw_hearts(surf, lives, max_lives=3):
         else:
             color = (50, 50, 50)  # 黑色（无血）
         
-        # 绘制简单爱心形状（两个圆形 + 三角形）
-        # 上方两个圆（心房）
-        pygame.draw.circle(surf, color, (int(heart_x - 5), int(heart_y)), 5)
-        pygame.draw.circle(surf, color, (int(heart_x + 5), int(heart_y)), 5)
-        # 下方三角形（心尖）
-        pygame.draw.polygon(surf, color, [
-            (int(heart_x - 8), int(heart_y + 2)),
-            (int(heart_x + 8), int(heart_y + 2)),
-            (int(heart_x), int(heart_y + 12))
-        ])
-
-def draw_death_particles(surf, particles):
-    """绘制和更新血溅粒子效果"""
-    for particle in particles[:]:
-        x, y, vx, vy, lifetime, max_lifetime = particle
-        # 计算粒子透明度
-        alpha = int(255 * (lifetime / max_lifetime))
-        
-        # 如果有surface才绘制，否则只更新
-        if surf is not None:
-            # 创建粒子表面
-            particle_surf = pygame.Surface((6, 6), pygame.SRCALPHA)
-            pygame.draw.circle(particle_surf, (255, 0, 0, alpha), (3, 3), 3)
-            particle_surf.set_alpha(alpha)
-            # 绘制粒子
-            surf.blit(particle_surf, (int(x), int(y)))
-        
-        # 更新粒子
-        new_x = x + vx
-        new_y = y + vy
+        # 爱心小图按颜色缓存，左上角对应 (heart_x - 10, heart_y - 5)
+        heart = cached_sprite(('heart', color), (20, 18), lambda img: _paint_heart(img, color))
+        surf.blit(heart, (int(heart_x - 10), int(heart_y - 5)))
+
+def _paint_heart(img, color):
+    """简单爱心形状（两个圆形 + 三角形）"""
+    # 上方两个圆（心房）
+    pygame.draw.circle(img, color, (5, 5), 5)
+    pygame.draw.circle(img, color, (15, 5), 5)
+    # 下方三角形（心尖）
+    pygame.draw.polygon(img, color, [(2, 7), (18, 7), (10, 17)])
+
+def draw_death_particles(surf, particles, offset=(0, 0)):
+    """绘制血溅粒子（只画不动，移动和衰减在 update_death_particles）；offset 为视口左上角（粒子坐标是世界坐标）"""
+    ox, oy = offset
+    # 共用一张粒子小图，只改透明度（原来像素 alpha 和表面 alpha 各乘一次，效果是 alpha²）
+    particle_surf = circle_sprite(COLOR_RED, 3)
+    for x, y, vx, vy, lifetime, max_lifetime in particles:
+        # 屏幕外的不画
+        if -6 < x - ox < SCREEN_W and -6 < y - oy < SCREEN_H:
+            alpha = int(255 * (lifetime / max_lifetime))
+            particle_surf.set_alpha(alpha * alpha // 255)
+            surf.blit(particle_surf, (int(x - ox), int(y - oy)))
+    particle_surf.set_alpha(255)
+
+def update_death_particles(particles):
+    """血溅粒子走一个逻辑步：移动、下落加速、寿命减一，寿命到了就去掉"""
+    # 原地重建列表：一次清屏几千个粒子时不再逐个 index / remove
+    survivors = []
+    for x, y, vx, vy, lifetime, max_lifetime in particles:
         new_lifetime = lifetime - 1
-        
-        if new_lifetime <= 0:
-            particles.remove(particle)
-        else:
-            particles[particles.index(particle)] = (new_x, new_y, vx, vy * 1.05, new_lifetime, max_lifetime)
+        if new_lifetime > 0:
+            survivors.append((x + vx, y + vy, vx, vy * 1.05, new_lifetime, max_lifetime))
+    particles[:] = survivors
 
 def create_death_particles(center_x, center_y, count=30):
-    """创建死亡血溅效果粒子"""
+    """创建死亡血溅效果粒子（数量和寿命随画质缩放）
+
+    粒子是纯视觉效果，用按位置播种的独立随机数生成：不消耗全局 random，
+    所以不管画质怎么变，敌人生成、闪避等模拟结果都一样，快照回放也能逐字节复现。
+    """
+    q = quality.settings
+    rng = random.Random(hash((center_x, center_y, count)))
+    count = max(1, int(count * q['particles']))
+    life_scale = q['lifetime']
     particles = []
     for _ in range(count):
-        angle = random.uniform(0, 2 * math.pi)
-        speed = random.uniform(2, 8)
+        angle = rng.uniform(0, 2 * math.pi)
+        speed = rng.uniform(2, 8)
         vx = speed * math.cos(angle)
         vy = speed * math.sin(angle)
-        lifetime = random.randint(20, 40)
+        lifetime = max(5, int(rng.randint(20, 40) * life_scale))
         particles.append((center_x, center_y, vx, vy, lifetime, lifetime))
     return particles
 
+# ================== 快照（回滚 / 倒带调试 / 崩溃续玩） ==================
+# 整个模拟状态打成一段紧凑的二进制：
+#   头部  魔数 b'GSNP'、版本、逻辑帧号、段数
+#   各段  每段前面 4 字节长度，依次是：标量 / 玩家 / 子弹 / 敌人 / 小跟班 / 小跟班子弹 /
+#         连击记录 / 粒子 / 玩家位置历史 / 绘制顺序 / 随机数状态
+# 增量快照只记录和基准快照相比变了的段；位置历史只是尾部追加时，只存新增的点。
+# 计时器（敌人生成）按模拟时钟的逻辑步计，时钟的倍率、零头和步数都在标量段里。
+
+SNAPSHOT_MAGIC    = b'GSNP'
+DELTA_MAGIC       = b'GSND'
+SNAPSHOT_VERSION  = 2
+RESUME_FILE       = os.path.join(os.path.dirname(__file__), "resume.snap")
+AUTOSAVE_INTERVAL = 60      # 每多少逻辑帧自动存一次续玩快照（主循环只打快照，写盘在后台线程）
+
+_SNAP_HEADER   = struct.Struct('<4sBIB')       # 魔数、版本、帧号、段数
+_DELTA_HEADER  = struct.Struct('<4sBIIB')      # 魔数、版本、基准帧号、帧号、段数
+_SNAP_LEN      = struct.Struct('<I')
+_SNAP_SCALARS  = struct.Struct('<iiidiiIiii?iddI')
+_SNAP_PLAYER   = struct.Struct('<iiii??dddd')
+_SNAP_BULLET   = struct.Struct('<iiddii')
+_SNAP_ENEMY    = struct.Struct('<iidddbBiiiidddddd')
+_SNAP_FOLLOWER = struct.Struct('<iiddii')
+_SNAP_FBULLET  = struct.Struct('<iiddb')
+_SNAP_SHOT     = struct.Struct('<Ii?')
+_SNAP_PARTICLE = struct.Struct('<ddddhh')
+_SNAP_POINT    = struct.Struct('<hh')
+_SNAP_RNG      = struct.Struct('<i625I?d')
+
+# 各段和标量段各字段的名字（和 snapshot_state 里的打包顺序一致），world_view 和测试按名字取
+SNAPSHOT_SECTIONS = ('scalars', 'player', 'bullets', 'enemies', 'followers', 'follower_bullets',
+                     'shots', 'particles', 'history', 'order', 'rng')
+SNAPSHOT_SCALARS  = ('difficulty_level', 'spawn_interval', 'spawn_burst', 'enemy_speed', 'death_count',
+                     'combo_count', 'next_shot_id', 'combo_anim_timer', 'combo_display_duration',
+                     'num_trajectories', 'paused', 'since_last_spawn', 'time_scale', 'time_carry', 'ticks')
+_SEC_HISTORY   = SNAPSHOT_SECTIONS.index('history')     # 增量时特殊处理
+
+# 敌人的布尔状态打包成一个字节
+_ENEMY_DYING, _ENEMY_DODGING, _ENEMY_DODGED = 1, 2, 4
+
+def snapshot_state(state, include_rng=True):
+    """把 GameState 打成二进制快照（bytes）"""
+    p = state.player
+    clock = state.clock
+    sections = [
+        _SNAP_SCALARS.pack(state.difficulty_level, state.current_spawn_interval, state.spawn_burst,
+                           state.current_enemy_speed, state.death_count, state.combo_count,
+                           state.next_shot_id, state.combo_anim_timer, state.combo_display_duration,
+                           state.num_trajectories, clock.paused, clock.ticks - state.last_spawn,
+                           clock.scale, clock.carry, clock.ticks),
+        _SNAP_PLAYER.pack(p.rect.x, p.rect.y, p.lives, p.score, p.dead, p.color != COLOR_BLUE,
+                          p.current_speed, p.angle, p.velocity[0], p.velocity[1]),
+    ]
+
+    # 按 all_sprites 的顺序走一遍，各类精灵分别打包，同时记下绘制顺序
+    bullets, enemies, followers, fbullets, order = [], [], [], [], []
+    owner_index = {id(f): i for i, f in enumerate(state.followers)}
+    for spr in state.all_sprites:
+        kind = type(spr)
+        if kind is Bullet:
+            bullets.append(_SNAP_BULLET.pack(
+                spr.rect.x, spr.rect.y, spr.velocity[0], spr.velocity[1], spr.bounces_remaining, -1 if spr.shot_id is None else spr.shot_id))
+            order.append(b'B')
+        elif kind is Enemy:
+            flags = ((_ENEMY_DYING if spr.is_dying else 0) | (_ENEMY_DODGING if spr.is_dodging else 0) |
+                     (_ENEMY_DODGED if spr.has_dodged_before else 0))
+            enemies.append(_SNAP_ENEMY.pack(
+                spr.rect.x, spr.rect.y, spr.speed, spr.random_angle, spr.sway_offset,
+                spr.sway_direction, flags, clock.ticks - spr.death_tick if spr.is_dying else 0, spr.death_duration,
+                spr.alpha, clock.ticks - spr.dodge_tick if spr.is_dodging else 0,
+                spr.dodge_direction[0], spr.dodge_direction[1],
+                spr.vx, spr.vy, spr.angle, spr.random_motion_intensity))
+            order.append(b'E')
+        elif kind is Follower:
+            followers.append(_SNAP_FOLLOWER.pack(spr.rect.x, spr.rect.y, spr.position_x, spr.position_y,
+                                                 spr.index, spr.fire_interval - (spr.next_fire - clock.ticks)))
+            order.append(b'F')
+        elif kind is FollowerBullet:
+            fbullets.append(_SNAP_FBULLET.pack(spr.rect.x, spr.rect.y, spr.velocity[0], spr.velocity[1],
+                                               owner_index.get(id(spr.owner), -1)))
+            order.append(b'f')
+        else:
+            order.append(b'P')
+    sections += [b''.join(bullets), b''.join(enemies), b''.join(followers), b''.join(fbullets)]
+
+    sections.append(b''.join([_SNAP_SHOT.pack(k, v['pending'], v['any_hit']) for k, v in state.shots.items()]))
+    sections.append(b''.join([_SNAP_PARTICLE.pack(*pt) for pt in state.enemy_particles]))
+    history = state.player_position_history
+    sections.append(struct.pack('<%dh' % (2 * len(history)), *[c for pos in history for c in pos]))
+    sections.append(b''.join(order))
+    if include_rng:
+        version, internal, gauss = random.getstate()
+        sections.append(_SNAP_RNG.pack(version, *internal, gauss is not None, gauss or 0.0))
+    else:
+        sections.append(b'')
+
+    parts = [_SNAP_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, state.frame, len(sections))]
+    for sec in sections:
+        parts.append(_SNAP_LEN.pack(len(sec)))
+        parts.append(sec)
+    return b''.join(parts)
+
+def world_view(state):
+    """快照里只由逻辑步数决定的部分 {段名: 内容}（标量段拆成 {字段名: 值}）
+
+    去掉时间倍率、零头和按渲染帧记录的玩家位置历史，用来对比不同倍率、暂停前后的模拟结果。
+    """
+    _, sections = _split_snapshot(snapshot_state(state), _SNAP_HEADER, SNAPSHOT_MAGIC)
+    view = dict(zip(SNAPSHOT_SECTIONS, sections))
+    values = _SNAP_SCALARS.unpack(view['scalars'])
+    if len(values) != len(SNAPSHOT_SCALARS) or len(sections) != len(SNAPSHOT_SECTIONS):
+        raise ValueError("SNAPSHOT_SCALARS / SNAPSHOT_SECTIONS 和快照格式对不上")
+    scalars = dict(zip(SNAPSHOT_SCALARS, values))
+    del scalars['time_scale'], scalars['time_carry']
+    view['scalars'] = scalars
+    del view['history']
+    return view
+
+def _split_snapshot(data, header, magic):
+    """拆出头部字段和各段（不做拷贝以外的解析）"""
+    fields = header.unpack_from(data, 0)
+    if fields[0] != magic or fields[1] != SNAPSHOT_VERSION:
+        raise ValueError("不是本版本的快照数据")
+    offset = header.size
+    sections = []
+    for _ in range(fields[-1]):
+        n, = _SNAP_LEN.unpack_from(data, offset)
+        offset += _SNAP_LEN.size
+        sections.append(data[offset:offset + n])
+        offset += n
+    return fields, sections
+
+def _blank_sprite(cls, image, x, y):
+    """不调用 cls.__init__，只建一个带贴图和位置的空精灵"""
+    spr = cls.__new__(cls)
+    pygame.sprite.Sprite.__init__(spr)
+    spr.image = image
+    spr.rect = image.get_rect(topleft=(x, y))
+    spr.net_id = 0
+    return spr
+
+def restore_state(data):
+    """从快照重建一个 GameState（随机数状态一并恢复）"""
+    fields, sec = _split_snapshot(data, _SNAP_HEADER, SNAPSHOT_MAGIC)
+    state = GameState()
+    state.frame = fields[2]
+
+    (state.difficulty_level, state.current_spawn_interval, state.spawn_burst, state.current_enemy_speed,
+     state.death_count, state.combo_count, state.next_shot_id, state.combo_anim_timer,
+     state.combo_display_duration, state.num_trajectories, state.clock.paused,
+     spawn_elapsed, state.clock.scale, state.clock.carry, state.clock.ticks) = _SNAP_SCALARS.unpack(sec[0])
+    ticks = state.clock.ticks
+    state.last_spawn = ticks - spawn_elapsed
+    # 时间轮不进快照：从恢复的那一步起空轮子开始，下面按精灵顺序把各自的定时重新登记
+    state.timers = TimerWheel(ticks)
+
+    p = state.player
+    x, y, p.lives, p.score, p.dead, darkened, p.current_speed, p.angle, vx, vy = _SNAP_PLAYER.unpack(sec[1])
+    p.rect.topleft = (x, y)
+    p.velocity = (vx, vy)
+    if darkened:
+        p.darken()
+
+    # 重建精灵时不走构造函数（构造函数会消耗随机数），而是用共用贴图、直接填字段；
+    # 各类都有 __slots__，这里必须把 __init__ 里设置的字段全部填上
+    bullets = _SNAP_BULLET.iter_unpack(sec[2])
+    enemies = _SNAP_ENEMY.iter_unpack(sec[3])
+    followers = _SNAP_FOLLOWER.iter_unpack(sec[4])
+    fbullets = _SNAP_FBULLET.iter_unpack(sec[5])
+    state.all_sprites.empty()
+    for code in sec[9]:
+        if code == ord('B'):
+            x, y, vx, vy, bounces, shot_id = next(bullets)
+            b = _blank_sprite(Bullet, bullet_image(), x, y)
+            b.velocity = (vx, vy)
+            b.owner = state
+            b.shot_id = None if shot_id < 0 else shot_id
+            b.bounces_remaining = bounces
+            state.bullets.add(b)
+            state.all_sprites.add(b)
+        elif code == ord('E'):
+            (x, y, speed, random_angle, sway_offset, sway_direction, flags, death_elapsed, death_duration,
+             alpha, dodge_elapsed, ddx, ddy, evx, evy, angle, intensity) = next(enemies)
+            e = _blank_sprite(Enemy, enemy_image(), x, y)
+            e.target = p
+            e.state = state
+            e.speed = speed
+            e.random_angle, e.sway_offset, e.sway_direction = random_angle, sway_offset, sway_direction
+            e.vx, e.vy, e.angle = evx, evy, angle
+            e.random_motion_intensity = intensity
+            e.is_dying = bool(flags & _ENEMY_DYING)
+            e.death_tick = ticks - death_elapsed
+            e.death_duration = death_duration
+            e.alpha = alpha
+            e.is_dodging = bool(flags & _ENEMY_DODGING)
+            e.dodge_tick = ticks - dodge_elapsed
+            e.dodge_direction = (ddx, ddy)
+            e.has_dodged_before = bool(flags & _ENEMY_DODGED)
+            e.timer = None
+            if e.is_dodging:
+                e.image = clown_image()
+            if e.is_dying:
+                e.image = e.image.copy()          # 淡出中的敌人各自一份贴图（同 Enemy.die）
+                e.image.set_alpha(alpha)
+                e.set_timer(e.death_tick + death_duration + 1, e.kill)
+            elif e.is_dodging:
+                e.set_timer(e.dodge_tick + DODGE_STEPS, e.end_dodge)
+            state.enemies.add(e)
+            state.all_sprites.add(e)
+        elif code == ord('F'):
+            x, y, px, py, index, fire_elapsed = next(followers)
+            f = _blank_sprite(Follower, clown_image(), x, y)
+            f.player = p
+            f.state = state
+            f.index = index
+            f.fire_interval = 60
+            f.schedule_fire(ticks + f.fire_interval - fire_elapsed)
+            f.follow_distance = 60 + index * 60
+            f.move_speed = 6.0
+            f.position_x, f.position_y = px, py
+            state.followers.append(f)
+            state.all_sprites.add(f)
+        elif code == ord('f'):
+            x, y, vx, vy, owner = next(fbullets)
+            fb = _blank_sprite(FollowerBullet, follower_bullet_image(), x, y)
+            fb.velocity = (vx, vy)
+            fb.owner = state.followers[owner] if 0 <= owner < len(state.followers) else None
+            fb.state = state
+            state.follower_bullets.append(fb)
+            state.all_sprites.add(fb)
+        else:
+            state.all_sprites.add(p)
+
+    state.shots = {k: {'pending': n, 'any_hit': hit} for k, n, hit in _SNAP_SHOT.iter_unpack(sec[6])}
+    state.enemy_particles = list(_SNAP_PARTICLE.iter_unpack(sec[7]))
+    state.player_position_history = list(_SNAP_POINT.iter_unpack(sec[8]))
+
+    # 随机数状态最后恢复：上面 GameState() 等消耗的随机数不影响之后的模拟
+    if sec[10]:
+        values = _SNAP_RNG.unpack(sec[10])
+        random.setstate((values[0], values[1:626], values[627] if values[626] else None))
+    return state
+
+def snapshot_delta(base, snap):
+    """两个完整快照之间的增量；apply_snapshot_delta(base, 增量) 还原出 snap"""
+    (_, _, base_frame, _), base_secs = _split_snapshot(base, _SNAP_HEADER, SNAPSHOT_MAGIC)
+    (_, _, frame, _), secs = _split_snapshot(snap, _SNAP_HEADER, SNAPSHOT_MAGIC)
+    parts = [_DELTA_HEADER.pack(DELTA_MAGIC, SNAPSHOT_VERSION, base_frame, frame, len(secs))]
+    for i, (old, new) in enumerate(zip(base_secs, secs)):
+        if old == new:
+            parts.append(b'\x00')                       # 没变
+            continue
+        if i == _SEC_HISTORY:
+            # 位置历史每帧追加一个点（4 字节），超过上限时从头部丢弃
+            tail = 4 * (frame - base_frame)
+            keep = len(new) - tail
+            drop = len(old) - keep
+            if 0 < tail <= len(new) and drop >= 0 and old[drop:] == new[:keep]:
+                parts.append(b'\x02' + _SNAP_LEN.pack(drop) + _SNAP_LEN.pack(tail) + new[keep:])
+                continue
+        parts.append(b'\x01' + _SNAP_LEN.pack(len(new)) + new)  # 整段替换
+    return b''.join(parts)
+
+def apply_snapshot_delta(base, delta):
+    """基准快照 + 增量 -> 新的完整快照"""
+    magic, version, base_frame, frame, count = _DELTA_HEADER.unpack_from(delta, 0)
+    if magic != DELTA_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("不是本版本的增量快照数据")
+    (_, _, frame0, _), base_secs = _split_snapshot(base, _SNAP_HEADER, SNAPSHOT_MAGIC)
+    if frame0 != base_frame:
+        raise ValueError("增量的基准帧 {} 与快照帧 {} 不一致".format(base_frame, frame0))
+    offset = _DELTA_HEADER.size
+    parts = [_SNAP_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, frame, count)]
+    for old in base_secs:
+        op = delta[offset]
+        offset += 1
+        if op == 0:
+            new = old
+        elif op == 1:
+            n, = _SNAP_LEN.unpack_from(delta, offset)
+            offset += _SNAP_LEN.size
+            new = delta[offset:offset + n]
+            offset += n
+        else:
+            drop, n = struct.unpack_from('<II', delta, offset)
+            offset += 8
+            new = old[drop:] + delta[offset:offset + n]
+            offset += n
+        parts.append(_SNAP_LEN.pack(len(new)))
+        parts.append(new)
+    return b''.join(parts)
+
+def _write_resume(data):
+    """写续玩快照（先写临时文件再替换，崩溃时不会留下半个文件）"""
+    try:
+        tmp = RESUME_FILE + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, RESUME_FILE)
+    except Exception:
+        pass
+
+class ResumeWriter:
+    """自动存档的后台写盘：主循环交来快照字节就返回，只保留最新一份，旧的还没写就被顶掉"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.pending = None      # 等着写的快照
+        self.busy = False        # 后台正在写
+        self.thread = None       # 第一次交快照时才启动
+
+    def submit(self, data):
+        with self.cond:
+            self.pending = data
+            self.cond.notify_all()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+
+    def wait(self, discard=False):
+        """等后台写完；discard=True 时还没开始写的那份直接丢掉"""
+        with self.cond:
+            if discard:
+                self.pending = None
+            while self.pending is not None or self.busy:
+                self.cond.wait()
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                data, self.pending = self.pending, None
+                self.busy = True
+            _write_resume(data)
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+
+resume_writer = ResumeWriter()
+
+def save_resume(state):
+    """立即写续玩快照（退出时用）；后台还没写的自动存档作废"""
+    resume_writer.wait(discard=True)
+    _write_resume(snapshot_state(state))
+
+def load_resume():
+    """读续玩快照，没有或损坏时返回 None"""
+    resume_writer.wait()
+    try:
+        if os.path.exists(RESUME_FILE):
+            with open(RESUME_FILE, 'rb') as f:
+                return restore_state(f.read())
+    except Exception:
+        pass
+    return None
+
+def clear_resume():
+    resume_writer.wait(discard=True)     # 别让后台晚到的自动存档把删掉的文件又写回来
+    try:
+        if os.path.exists(RESUME_FILE):
+            os.remove(RESUME_FILE)
+    except Exception:
+        pass
+
+# ================== 内存统计（调试浮层） ==================
+# F3 打开调试浮层时才启动 tracemalloc（开着时每次分配都要记调用栈，帧时间会明显变长，画质调节可能跟着降档），
+# 之后每 MEMORY_SAMPLE_INTERVAL 秒拍一次快照，按分配发生在哪个函数里把仍存活的内存归到子系统：
+#   sprites   实体对象及其字段（各实体类、生成、发射、击杀转小跟班、快照恢复）
+#   particles 血溅粒子
+#   trail     玩家位置历史（小跟班沿它跟随）
+#   shots     发射批次记录（连击判定）
+# 调用栈从最近一层往外找，第一个落在登记函数里的帧决定归属，都不在的算 other。
+# Surface 的像素由 SDL 分配，tracemalloc 看不到，另按精灵实际引用的不重复贴图统计。
+MEMORY_SAMPLE_INTERVAL = 2.0     # 秒
+MEMORY_TRACE_FRAMES    = 8       # 每次分配记录的调用栈深度
+MEMORY_SUBSYSTEMS      = ('sprites', 'particles', 'trail', 'shots')
+
+def _memory_sites():
+    """子系统 -> 登记的类 / 函数（类表示它的全部方法）"""
+    return {
+        'sprites': [Player, Bullet, Follower, FollowerBullet, Enemy, GameState.spawn_enemy,
+                    GameState.fire_bullet, GameState.handle_collisions, _blank_sprite],
+        'particles': [create_death_particles, update_death_particles],
+        'trail': [GameState.update_player],
+        'shots': [GameState.new_shot, GameState.on_bullet_removed],
+    }
+
+class MemoryReport:
+    """tracemalloc 快照按子系统归类，给调试浮层显示"""
+
+    def __init__(self):
+        self.spans = {}          # 文件名 -> [(起始行, 结束行, 子系统)]
+        self.site_cache = {}     # (文件名, 行号) -> 子系统或 None
+        self.sizes = {}          # 子系统 -> 存活字节数；还没采过样时为空
+        self.traced = 0          # tracemalloc 跟踪到的全部存活字节
+        self.last = None
+        for name, items in _memory_sites().items():
+            for item in items:
+                funcs = [f for f in vars(item).values() if hasattr(f, '__code__')] if isinstance(item, type) else [item]
+                for func in funcs:
+                    code = func.__code__
+                    last = max(line for _, _, line in code.co_lines() if line is not None)
+                    self.spans.setdefault(code.co_filename, []).append((code.co_firstlineno, last, name))
+
+    @property
+    def active(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        tracemalloc.start(MEMORY_TRACE_FRAMES)
+        self.sizes = {}
+        self.last = None
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def site(self, frame):
+        """某一帧属于哪个子系统（不属于任何登记函数返回 None）"""
+        key = (frame.filename, frame.lineno)
+        try:
+            return self.site_cache[key]
+        except KeyError:
+            pass
+        name = None
+        for first, last, subsystem in self.spans.get(frame.filename, ()):
+            if first <= frame.lineno <= last:
+                name = subsystem
+                break
+        self.site_cache[key] = name
+        return name
+
+    def sample(self, now):
+        """距上次采样超过 MEMORY_SAMPLE_INTERVAL 秒就拍一次快照重新归类"""
+        if not self.active or (self.last is not None and now - self.last < MEMORY_SAMPLE_INTERVAL):
+            return
+        self.last = now
+        sizes = dict.fromkeys(MEMORY_SUBSYSTEMS + ('other',), 0)
+        # 先按调用栈合并（同一调用栈的分配很多），每个调用栈只归类一次
+        for stat in tracemalloc.take_snapshot().statistics('traceback'):
+            name = next(filter(None, map(self.site, reversed(stat.traceback))), 'other')
+            sizes[name] += stat.size
+        self.sizes = sizes
+        self.traced = tracemalloc.get_traced_memory()[0]
+
+def sprite_surface_bytes(sprites):
+    """精灵引用的不重复贴图占的像素字节数和张数（共用贴图只算一次）"""
+    images = {id(spr.image): spr.image for spr in sprites}
+    return sum(img.get_pitch() * img.get_height() for img in images.values()), len(images)
+
+def draw_debug_overlay(surf, state, report):
+    """F3 调试浮层：帧率、画质档位、实体数、按子系统的内存，录像时加上抓帧耗时"""
+    entities = len(state.all_sprites)
+    surface_bytes, surface_count = sprite_surface_bytes(state.all_sprites)
+    lines = [
+        "FPS {:.0f}   quality {}   speed x{:g}".format(clock.get_fps(), quality.level, state.clock.scale),
+        "entities {} (enemies {}, bullets {}, followers {})   particles {}   trail {}   shots {}   timers {}".format(
+            entities, len(state.enemies), len(state.bullets) + len(state.follower_bullets), len(state.followers),
+            len(state.enemy_particles), len(state.player_position_history), len(state.shots), state.timers.pending),
+        "surfaces {:.1f} KB in {} images".format(surface_bytes / 1024.0, surface_count),
+    ]
+    sizes = report.sizes
+    if sizes:
+        lines.append("sprites {:.1f} KB ({:.0f} B/entity)   heap {:.0f} KB".format(
+            sizes['sprites'] / 1024.0, sizes['sprites'] / max(1, entities), report.traced / 1024.0))
+        lines.append("particles {:.1f} KB   trail {:.1f} KB   shots {:.1f} KB   other {:.0f} KB".format(
+            sizes['particles'] / 1024.0, sizes['trail'] / 1024.0, sizes['shots'] / 1024.0, sizes['other'] / 1024.0))
+    else:
+        lines.append("memory: sampling...")
+    if recorder.active:
+        frames, dropped, grab_avg, grab_max = recorder.stats()
+        lines.append("recording {} frames   dropped {} ({})   grab {:.2f} ms avg / {:.2f} ms max".format(
+            frames, dropped, RECORD_DROP, grab_avg, grab_max))
+    y = 50
+    for line in lines:
+        surf.blit(render_text(font, line, (160, 255, 160)), (10, y))
+        y += 26
+
+# ================== 录像 ==================
+# F9 开始 / 停止录像。为了不拖慢游戏，游戏进程每帧只做一件事：把画好的屏幕像素原样拷进共享内存环
+# 的一个空槽（一次整屏 memcpy，不转颜色、不编码），再通知编码进程（录像编码.py）这一槽有帧了。
+# 颜色转换和编码都在编码进程里做，和游戏并行。
+#   - software 后端：get_view('0') 直接拿到显示表面的像素内存（不拷贝），整块拷进槽里
+#   - texture 后端：画面在显卡上，只能 renderer.to_surface 读回到一张复用的 Surface 再拷，会贵一些
+# 编码跟不上、环里没有空槽时按 RECORD_DROP 处理：
+#   'drop'  丢掉这一帧，游戏不等（视频里由编码进程重复上一帧补上，时长不变）
+#   'block' 最多等 RECORD_BLOCK_TIMEOUT 秒让编码进程腾出槽位，画面不丢但游戏帧率可能掉
+# 每帧的抓取耗时和丢帧数显示在 F3 调试浮层里，停止录像时也会打印。
+RECORD_SLOTS         = 8        # 共享内存环的帧槽数（1024×768 一槽 3 MB）
+RECORD_DROP          = os.environ.get('SHOOTER_RECORD_DROP', 'drop')  # 'drop' / 'block'，见上
+RECORD_BLOCK_TIMEOUT = 0.1      # 秒，'block' 策略最多等这么久，还没空槽就照样丢
+RECORD_DIR           = os.path.join(os.path.dirname(__file__), "recordings")
+RECORD_ENCODER       = os.path.join(os.path.dirname(__file__), "录像编码.py")
+RECORD_HEADER        = 64       # 共享内存开头的计数区：[0] 已放入帧数（游戏写）、[1] 已取走帧数（编码进程写）
+RECORD_FRAME_MSG     = struct.Struct('<q')   # 通知编码进程的帧号；负数 -1-n 表示结束，整段共 n 帧
+
+class FrameRecorder:
+    """把每帧屏幕交给后台编码进程；present() 在显示之前调用 capture()"""
+
+    def __init__(self):
+        self.proc = None
+        self.shm = None
+        self.frames = None       # 共享内存里的槽，(槽数, 高, 行字节数) 的 uint8 视图
+        self.counters = None     # 共享内存开头的两个 uint64 计数
+        self.readback = None     # texture 后端读回像素用的复用 Surface
+        self.sent = 0            # 已放进环里的帧数
+        self.index = 0           # 录像开始后的第几帧（含丢掉的）
+        self.dropped = 0
+        self.grab_time = 0.0     # 累计抓取耗时（秒）
+        self.grab_max = 0.0
+
+    @property
+    def active(self):
+        return self.proc is not None
+
+    def grab_surface(self, surf):
+        """本帧像素所在的 Surface：软件后端就是显示表面本身，texture 后端读回到复用的 Surface"""
+        if isinstance(surf, TextureScreen):
+            if self.readback is None:
+                self.readback = surf.renderer.to_surface()
+            else:
+                surf.renderer.to_surface(self.readback)
+            return self.readback
+        return surf
+
+    def start(self, surf):
+        """按当前屏幕的像素格式建共享内存环并启动编码进程；失败返回 False"""
+        image = self.grab_surface(surf)
+        w, h = image.get_size()
+        pitch, bytesize = image.get_pitch(), image.get_bytesize()
+        # 每个颜色通道在像素里是第几个字节（小端机器上 shift 8 的通道就是第 1 个字节）
+        shifts = image.get_shifts()[:3]
+        if sys.byteorder == 'big':
+            shifts = [8 * (bytesize - 1) - s for s in shifts]
+        channels = ",".join(str(s // 8) for s in shifts)
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        path = os.path.join(RECORD_DIR, time.strftime("record_%Y%m%d_%H%M%S"))   # 扩展名由编码进程按输出格式加
+        self.shm = shared_memory.SharedMemory(create=True, size=RECORD_HEADER + RECORD_SLOTS * h * pitch)
+        self.counters = np.ndarray((2,), np.uint64, self.shm.buf)
+        self.counters[:] = 0
+        self.frames = np.ndarray((RECORD_SLOTS, h, pitch), np.uint8, self.shm.buf, RECORD_HEADER)
+        self.frames.fill(0)      # 先把每一页都碰一遍，免得录像开头几帧的拷贝撞上缺页
+        try:
+            self.proc = subprocess.Popen(
+                [sys.executable, RECORD_ENCODER, self.shm.name, str(w), str(h), str(pitch), str(bytesize),
+                 channels, str(RECORD_SLOTS), str(FPS), path],
+                stdin=subprocess.PIPE)
+        except OSError as e:
+            print("[Record] 无法启动编码进程: {}".format(e))
+            self.release()
+            return False
+        self.sent = self.index = self.dropped = 0
+        self.grab_time = self.grab_max = 0.0
+        print("[Record] 开始录像 -> {}（丢帧策略 {}）".format(path, RECORD_DROP))
+        return True
+
+    def free_slot(self):
+        """环里还有空槽吗；'block' 策略下没空槽会等一会儿"""
+        if self.sent - int(self.counters[1]) < RECORD_SLOTS:
+            return True
+        if RECORD_DROP != 'block':
+            return False
+        deadline = time.perf_counter() + RECORD_BLOCK_TIMEOUT
+        while time.perf_counter() < deadline:
+            time.sleep(0.001)
+            if self.sent - int(self.counters[1]) < RECORD_SLOTS:
+                return True
+        return False
+
+    def capture(self, surf):
+        """把这一帧放进环里；必须在 present 之前调用（texture 后端 present 之后后台缓冲就没了）"""
+        t0 = time.perf_counter()
+        index = self.index
+        self.index += 1
+        if not self.free_slot():
+            self.dropped += 1
+            if self.proc.poll() is not None:     # 环一直满着，也可能是编码进程挂了
+                print("[Record] 编码进程已退出，停止录像")
+                self.stop()
+            return
+        image = self.grab_surface(surf)
+        view = image.get_view('0')
+        pixels = np.frombuffer(view, np.uint8).reshape(self.frames.shape[1:])
+        self.frames[self.sent % RECORD_SLOTS] = pixels
+        del pixels, view         # 释放视图，显示表面才能解锁
+        self.sent += 1
+        self.counters[0] = self.sent
+        try:
+            self.proc.stdin.write(RECORD_FRAME_MSG.pack(index))
+            self.proc.stdin.flush()
+        except OSError:
+            print("[Record] 编码进程已退出，停止录像")
+            self.stop()
+            return
+        cost = time.perf_counter() - t0
+        self.grab_time += cost
+        self.grab_max = max(self.grab_max, cost)
+
+    def stats(self):
+        """(已录帧数, 丢帧数, 平均抓取毫秒, 最大抓取毫秒)"""
+        grabbed = max(1, self.sent)
+        return self.index, self.dropped, 1000.0 * self.grab_time / grabbed, 1000.0 * self.grab_max
+
+    def stop(self):
+        """通知编码进程收尾，等它写完文件"""
+        if self.proc is None:
+            return
+        frames, dropped, grab_avg, grab_max = self.stats()
+        for finish in (lambda: self.proc.stdin.write(RECORD_FRAME_MSG.pack(-1 - frames)), self.proc.stdin.close):
+            try:
+                finish()
+            except OSError:      # 编码进程已经退出
+                pass
+        self.proc.wait()
+        self.release()
+        print("[Record] 停止录像：{} 帧，丢 {} 帧，抓取平均 {:.2f} ms / 最大 {:.2f} ms".format(
+            frames, dropped, grab_avg, grab_max))
+
+    def release(self):
+        self.frames = self.counters = None
+        self.readback = None
+        self.proc = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+recorder = FrameRecorder()
+
 # ================== 主程序 ==================
 def main():
     state = GameState()
@@ -1292,17 +2349,50 @@ def main():
     death_effect_time = 0  # 死亡效果持续时间
     death_stage = 0  # 死亡阶段 (0=血溅, 1=屏幕变红, 2=结束界面弹出)
 
+    # 上一局没打完（退出或崩溃）时留下的续玩快照
+    can_resume = os.path.exists(RESUME_FILE)
+
+    # 头部瞄准（H 键切换），接收端第一次打开时才创建
+    head_aim = None
+    head_aim_on = False
+
+    # F3 调试浮层（打开时才跟踪内存分配）
+    debug_on = False
+    memory = None
+
     while True:
+        frame_start = time.perf_counter()
+
+        # ⓪ 头部瞄准事件：和鼠标事件一样每帧读一次，取最新
+        head_pos = None
+        if head_aim_on:
+            head_aim.poll()
+            head_pos = head_aim.aim_pos()
+
         # ① 处理全局事件
         for event in pygame.event.get():
             if event.type == QUIT:
+                if in_game:
+                    save_resume(state)
+                recorder.stop()
                 pygame.quit()
                 sys.exit()
 
             if event.type == KEYDOWN:
                 if event.key == K_ESCAPE:
+                    if in_game:
+                        save_resume(state)
+                    recorder.stop()
                     pygame.quit()
                     sys.exit()
+                if event.key == pygame.K_c and show_menu and can_resume:
+                    resumed = load_resume()
+                    if resumed is not None:
+                        state = resumed
+                        in_game = True
+                        show_menu = False
+                        high_score_saved = False
+                    can_resume = False
                 if event.key == pygame.K_RETURN:
                     if show_menu or show_gameover:
                         state = GameState()
@@ -1312,24 +2402,44 @@ def main():
                         fade_start_time = pygame.time.get_ticks()
                         animation_done = False
                         high_score_saved = False  # 重置高分保存标记
-                # (SPACE handling removed; freeze now via right mouse button)
+                # H 切换头部瞄准；头部瞄准开启时空格朝头部瞄准点射击
+                if event.key == pygame.K_h:
+                    if head_aim is None:
+                        head_aim = open_head_aim()
+                    head_aim_on = head_aim is not None and not head_aim_on
+                    print("[HeadAim] {}".format("on" if head_aim_on else "off"))
+                if event.key == pygame.K_F3:
+                    if memory is None:
+                        memory = MemoryReport()
+                    debug_on = not debug_on
+                    if debug_on:
+                        memory.start()
+                    else:
+                        memory.stop()
+                if event.key == pygame.K_F9:
+                    if recorder.active:
+                        recorder.stop()
+                    else:
+                        recorder.start(screen)
+                if event.key == K_SPACE:
+                    if in_game and head_pos is not None:
+                        state.fire_bullet(state.to_world(head_pos))
+                # [ / ] 慢动作 / 快进
+                if event.key in (K_LEFTBRACKET, K_RIGHTBRACKET) and in_game:
+                    state.step_time_scale(-1 if event.key == K_LEFTBRACKET else 1)
 
             if event.type == MOUSEBUTTONDOWN:
                 # 左键发射
                 if event.button == 1:
                     if in_game:
-                        state.fire_bullet(event.pos)
+                        state.fire_bullet(state.to_world(event.pos))
                 # 右键切换冻结（游戏中）、暂停菜单（菜单界面）或重启（结束界面）
                 elif event.button == 3:
                     if in_game:
-                        try:
-                            state.toggle_freeze()
-                        except Exception:
-                            pass
+                        state.toggle_freeze()
                     elif show_menu:
                         # 菜单界面右键切换暂停
-                        global MENU_PAUSED
-                        MENU_PAUSED = not MENU_PAUSED
+                        menu_scene.clock.paused = not menu_scene.clock.paused
                     elif show_gameover:
                         state = GameState()
                         in_game = True
@@ -1345,11 +2455,17 @@ def main():
             elapsed = (pygame.time.get_ticks() - fade_start_time) / 1000.0
             progress = min(elapsed / fade_in_duration, 1.0)
             fade_alpha = int(255 * progress)
-            draw_main_menu(screen, fade_alpha, high_score)
+            draw_main_menu(screen, fade_alpha, high_score, can_resume)
 
         elif in_game:
             state.update()
+            if state.frame % AUTOSAVE_INTERVAL == 0:
+                resume_writer.submit(snapshot_state(state))
             state.draw(screen)
+            draw_head_aim(screen, head_pos)
+            if debug_on:
+                memory.sample(time.perf_counter())
+                draw_debug_overlay(screen, state, memory)
             
             # 处理死亡效果
             if show_death_effect:
@@ -1362,7 +2478,7 @@ def main():
                 
                 # 绘制血溅粒子
                 if death_particles:
-                    draw_death_particles(screen, death_particles)
+                    draw_death_particles(screen, death_particles, state.camera().topleft)
                 
                 death_effect_time += 1
                 # 立即进入结束界面渐出阶段
@@ -1371,11 +2487,11 @@ def main():
                     fade_start_time = pygame.time.get_ticks()
                     in_game = False
                     show_gameover = True
+                    clear_resume()
+                    can_resume = False
                     show_death_effect = False
                     death_stage = 0
                     death_particles = []
-            
-            pygame.display.flip()
 
             # 检查生命值
             if state.player.lives <= 0 and not show_death_effect:
@@ -1403,8 +2519,12 @@ def main():
             
             state.draw(screen)
             draw_game_over(screen, state.player.score, fade_alpha, show_bg=True)
-            pygame.display.flip()
 
+        # 每帧只在这里 present 一次（录像也按这里一帧一张）
+        present()
+
+        # 本帧实际工作耗时交给画质调节（不含下面 tick 的等待）
+        quality.frame((time.perf_counter() - frame_start) * 1000.0)
         clock.tick(FPS)
 
 
@@ -1412,5 +2532,6 @@ if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
+        recorder.stop()
         pygame.quit()
         sys.exit()
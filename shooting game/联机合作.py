@@ -0,0 +1,681 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+终极射击小游戏 • 本机联机合作
+=====================================================
+    python 联机合作.py server [--port 50600]          # 权威服务器（无窗口）
+    python 联机合作.py client [--host 127.0.0.1]      # 一个玩家一个客户端窗口
+    python 联机合作.py bots 24                        # 压测：一个进程里跑 24 个无头机器人客户端
+
+结构：
+    - 服务器以固定 60Hz 跑 CoopState（GameState 的多人版），每 SEND_EVERY 帧给每个
+      客户端发一个快照，里面只有相对该客户端最后确认的快照变化了的实体（增量压缩），
+      实体坐标量化成 int16，一个实体 8 字节
+    - 客户端把快照缓冲起来，按落后 INTERP_TICKS 帧的时间插值显示，然后照常调用
+      GameState.draw；自己的玩家做客户端预测：按键立刻本地走位，收到服务器确认的
+      输入序号后从服务器位置重放尚未确认的输入
+    - 服务器每 STATS_INTERVAL 秒打印每帧耗时（模拟 / 编码）和每个客户端的带宽
+
+键位和单人版一样：方向键走位，左键射击，右键冻结（所有人一起冻结），ESC 退出。
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import struct
+import argparse
+
+# 服务器和机器人不需要窗口；必须在 import pygame 之前设置
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in ('server', 'bots'):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+from pygame.locals import QUIT, KEYDOWN, K_ESCAPE, K_UP, K_DOWN, K_LEFT, K_RIGHT, MOUSEBUTTONDOWN
+
+import 终极射击小游戏 as game
+
+# ================== 常量 ==================
+NET_PORT        = 50600
+TICK_RATE       = 60        # 服务器模拟频率（游戏里的速度都是按 60 帧/秒定的）
+SEND_EVERY      = 2         # 每几帧发一次快照（30Hz）
+INTERP_TICKS    = 4         # 客户端显示落后最新快照多少帧，用来插值
+HISTORY_TICKS   = 128       # 服务器保留多少帧的实体表，用作增量基准
+INPUT_REDUNDANCY = 3        # 每个输入包带上最近几帧的输入，丢包也不丢射击
+CLIENT_TIMEOUT  = 3.0       # 秒，客户端多久没消息就踢掉
+ROUND_RESTART   = 3.0       # 全员阵亡后几秒开新一局
+STATS_INTERVAL  = 5.0       # 秒，服务器统计打印间隔
+OTHER_PLAYER_COLOR = (255, 140, 0)
+
+# 包格式（小端）
+MSG_JOIN, MSG_WELCOME, MSG_INPUT, MSG_SNAPSHOT, MSG_LEAVE = b'J', b'W', b'I', b'S', b'L'
+WELCOME   = struct.Struct('<cHB')              # 类型、你的玩家实体 id、服务器帧率
+INPUT_HDR = struct.Struct('<cIB')              # 类型、已收到的最新快照帧号、输入条数
+INPUT_REC = struct.Struct('<IBBhh')            # 输入序号、方向键位、按钮位、瞄准 x、y
+SNAP_HDR  = struct.Struct('<cIIIiBBH?hhfBHH')  # 见 encode_snapshot
+ENTITY    = struct.Struct('<HBhhBB')           # id、种类、x、y、标志、附加值
+REMOVED   = struct.Struct('<H')
+
+# 方向键位
+KEY_BITS = {K_UP: 1, K_DOWN: 2, K_LEFT: 4, K_RIGHT: 8}
+# 按钮位
+BTN_FIRE, BTN_FREEZE = 1, 2
+# 实体种类
+KIND_PLAYER, KIND_BULLET, KIND_ENEMY, KIND_FOLLOWER, KIND_FBULLET = range(5)
+KIND_OF = {game.Player: KIND_PLAYER, game.Bullet: KIND_BULLET, game.Enemy: KIND_ENEMY,
+           game.Follower: KIND_FOLLOWER, game.FollowerBullet: KIND_FBULLET}
+# 敌人标志
+ENEMY_DYING, ENEMY_DODGING = 1, 2
+
+
+class InputKeys:
+    """把方向键位包装成 pygame.key.get_pressed() 那样可以按键码索引的对象"""
+
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    def __getitem__(self, key):
+        return bool(self.bits & KEY_BITS.get(key, 0))
+
+
+def local_key_bits():
+    pressed = pygame.key.get_pressed()
+    return sum(bit for key, bit in KEY_BITS.items() if pressed[key])
+
+
+# ================== 多人游戏状态 ==================
+class CoopState(game.GameState):
+    """多人版 GameState：每个客户端一个 Player，敌人追随机一名活着的玩家
+
+    self.player 仍然保留，只作为全队的计分板（得分、难度都按它算），不参与模拟和绘制。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.all_sprites.remove(self.player)
+        self.players = []
+        self.inputs = {}         # Player -> InputKeys（本帧）
+        self.next_net_id = 0     # 上一次分配出去的网络 id（id 记在精灵的 net_id 字段上）
+
+    def add_player(self):
+        p = game.Player()
+        p.rect.center = (game.WORLD_W // 2 + random.randint(-120, 120),
+                         game.WORLD_H // 2 + random.randint(-120, 120))
+        self.players.append(p)
+        self.all_sprites.add(p)
+        return p
+
+    def remove_player(self, p):
+        p.kill()
+        if p in self.players:
+            self.players.remove(p)
+        self.inputs.pop(p, None)
+
+    def alive_players(self):
+        return [p for p in self.players if p.alive()]
+
+    def enemy_target(self):
+        alive = self.alive_players()
+        return random.choice(alive) if alive else self.player
+
+    def views(self):
+        return [game.view_rect(p.rect.center) for p in self.alive_players()]
+
+    def fire_from(self, player, target_pos):
+        """以某个玩家为枪口发射；fire_bullet 固定从 self.player 发射，这里临时换一下"""
+        team = self.player
+        self.player = player
+        try:
+            self.fire_bullet(target_pos)
+        finally:
+            self.player = team
+
+    def update_player(self):
+        alive = self.alive_players()
+        for p in alive:
+            p.update(self.inputs.get(p) or InputKeys())
+            if p.lives <= 0:
+                p.kill()                 # 阵亡：观战到本局结束
+        alive = self.alive_players()
+        if not alive:
+            return
+        # 小跟班跟着第一个活着的玩家走
+        lead = alive[0]
+        self.player_position_history.append((lead.rect.centerx, lead.rect.centery))
+        if len(self.player_position_history) > 1000:
+            self.player_position_history.pop(0)
+        # 追的人阵亡了就换一个
+        for enemy in self.enemies:
+            if not enemy.target.alive():
+                enemy.target = random.choice(alive)
+
+
+# ================== 快照编码 ==================
+def entity_table(state):
+    """当前帧所有实体 -> {网络 id: 8 字节记录}；第一次出现的精灵顺便分配 id"""
+    table = {}
+    fresh = []
+    for spr in state.all_sprites:
+        if spr.net_id:
+            table[spr.net_id] = entity_record(spr)
+        else:
+            fresh.append(spr)
+    if fresh:
+        # id 转一圈后会回到小号：跳过还在场上的实体和所有玩家（阵亡的玩家客户端还认着自己的 id）
+        used = set(table)
+        used.update(p.net_id for p in state.players)
+        net_id = state.next_net_id
+        for spr in fresh:
+            net_id = net_id % 65535 + 1
+            while net_id in used:
+                net_id = net_id % 65535 + 1
+            used.add(net_id)
+            spr.net_id = net_id
+            table[net_id] = entity_record(spr)
+        state.next_net_id = net_id
+    return table
+
+
+def entity_record(spr):
+    """一个实体的 8 字节记录"""
+    kind = KIND_OF[type(spr)]
+    flags = value = 0
+    if kind == KIND_ENEMY:
+        flags = (ENEMY_DYING if spr.is_dying else 0) | (ENEMY_DODGING if spr.is_dodging else 0)
+        value = max(0, min(255, spr.alpha))
+    elif kind == KIND_PLAYER:
+        value = spr.lives
+    return ENTITY.pack(spr.net_id, kind, spr.rect.x, spr.rect.y, flags, value)
+
+
+def encode_snapshot(state, tick, base_tick, base_table, table, client, player):
+    """给一个客户端编码快照：相对 base_table 的变化 + 删除列表；base_table 为 None 时发全量"""
+    if base_table is None:
+        base_tick, changed, removed = 0, list(table.values()), []
+    else:
+        changed = [rec for net_id, rec in table.items() if base_table.get(net_id) != rec]
+        removed = [net_id for net_id in base_table if net_id not in table]
+    header = SNAP_HDR.pack(MSG_SNAPSHOT, tick, base_tick, client.ack_input, state.player.score,
+                           min(255, state.difficulty_level), min(255, state.num_trajectories),
+                           min(65535, state.combo_count), state.freeze_mode,
+                           player.rect.x, player.rect.y, player.current_speed, player.lives,
+                           len(changed), len(removed))
+    return b''.join([header] + changed + [REMOVED.pack(i) for i in removed])
+
+
+def decode_snapshot(data, tables):
+    """解码快照，返回 (帧号, 头部字段, 实体表)；基准丢了返回 None"""
+    fields = SNAP_HDR.unpack_from(data, 0)
+    tick, base_tick, n_changed, n_removed = fields[1], fields[2], fields[-2], fields[-1]
+    if base_tick:
+        base = tables.get(base_tick)
+        if base is None:
+            return None
+        table = dict(base)
+    else:
+        table = {}
+    offset = SNAP_HDR.size
+    for rec in ENTITY.iter_unpack(data[offset:offset + n_changed * ENTITY.size]):
+        table[rec[0]] = rec
+    offset += n_changed * ENTITY.size
+    for (net_id,) in REMOVED.iter_unpack(data[offset:offset + n_removed * REMOVED.size]):
+        table.pop(net_id, None)
+    return tick, fields, table
+
+
+# ================== 服务器 ==================
+class ClientSlot:
+    def __init__(self, addr, player, net_id):
+        self.addr = addr
+        self.player = player
+        self.net_id = net_id
+        self.last_seen = time.perf_counter()
+        self.ack_tick = 0          # 客户端确认收到的最新快照
+        self.ack_input = 0         # 已经应用的最新输入序号
+        self.queue = []            # 待应用的输入 (序号, 键位, 按钮, x, y)
+        self.keys = InputKeys()
+        self.bytes_sent = 0
+
+
+def run_server(args):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((args.host, args.port))
+    sock.setblocking(False)
+    print("co-op server on {}:{} ({} Hz, snapshot every {} ticks)".format(
+        args.host, args.port, TICK_RATE, SEND_EVERY))
+
+    state = CoopState()
+    clients = {}              # 地址 -> ClientSlot
+    history = {}              # 帧号 -> 实体表
+    tick = 0
+    round_over_at = None
+    dt = 1.0 / TICK_RATE
+    next_time = time.perf_counter()
+    stats = {'sim': 0.0, 'net': 0.0, 'max': 0.0, 'ticks': 0, 'bytes': 0}
+    stats_time = time.perf_counter()
+
+    def join(addr):
+        player = state.add_player()
+        slot = ClientSlot(addr, player, 0)
+        clients[addr] = slot
+        return slot
+
+    while True:
+        # ① 收包
+        now = time.perf_counter()
+        while True:
+            try:
+                data, addr = sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                continue              # Windows 上对端关闭会报 ConnectionReset，忽略
+            if not data:
+                continue
+            kind = data[:1]
+            slot = clients.get(addr)
+            if kind == MSG_JOIN:
+                if slot is None:
+                    slot = join(addr)
+                    print("join {} ({} clients)".format(addr, len(clients)))
+                entity_table(state)               # 给新玩家分配 id
+                slot.net_id = slot.player.net_id
+                sock.sendto(WELCOME.pack(MSG_WELCOME, slot.net_id, TICK_RATE), addr)
+            elif kind == MSG_LEAVE and slot is not None:
+                state.remove_player(slot.player)
+                del clients[addr]
+                print("leave {} ({} clients)".format(addr, len(clients)))
+            elif kind == MSG_INPUT and slot is not None:
+                _, ack_tick, count = INPUT_HDR.unpack_from(data, 0)
+                slot.ack_tick = max(slot.ack_tick, ack_tick)
+                slot.last_seen = now
+                last = slot.queue[-1][0] if slot.queue else slot.ack_input
+                for rec in INPUT_REC.iter_unpack(data[INPUT_HDR.size:INPUT_HDR.size + count * INPUT_REC.size]):
+                    if rec[0] > last:              # 冗余发送的旧输入直接跳过
+                        slot.queue.append(rec)
+                        last = rec[0]
+
+        # 掉线的客户端
+        for addr in [a for a, c in clients.items() if now - c.last_seen > CLIENT_TIMEOUT]:
+            state.remove_player(clients.pop(addr).player)
+            print("timeout {} ({} clients)".format(addr, len(clients)))
+
+        # ② 模拟一帧
+        t0 = time.perf_counter()
+        for slot in clients.values():
+            # 每帧消化一条输入；客户端跑得比服务器快时队列变长，积压的在这一帧里当场补走
+            # （和客户端重放用同一个 player.update），确认过的输入服务器都真的应用过
+            while slot.queue:
+                seq, bits, buttons, tx, ty = slot.queue.pop(0)
+                slot.ack_input = seq
+                slot.keys = InputKeys(bits)
+                if buttons & BTN_FIRE and slot.player.alive():
+                    state.fire_from(slot.player, (tx, ty))
+                if buttons & BTN_FREEZE:
+                    state.toggle_freeze()
+                if len(slot.queue) < 4:
+                    break                # 最后这条的移动交给下面的 state.update
+                if slot.player.alive():
+                    slot.player.update(slot.keys)
+            state.inputs[slot.player] = slot.keys
+        if clients:
+            state.update()
+        tick += 1
+
+        # 全员阵亡：过一会儿开新一局，所有人重新上场
+        if clients and not state.alive_players():
+            if round_over_at is None:
+                round_over_at = now
+                print("round over, score {}".format(state.player.score))
+            elif now - round_over_at > ROUND_RESTART:
+                state = CoopState()
+                history.clear()
+                for slot in clients.values():
+                    slot.player = state.add_player()
+                    slot.queue.clear()
+                    slot.ack_tick = 0
+                entity_table(state)
+                for slot in clients.values():
+                    slot.net_id = slot.player.net_id
+                    sock.sendto(WELCOME.pack(MSG_WELCOME, slot.net_id, TICK_RATE), slot.addr)
+                round_over_at = None
+        t1 = time.perf_counter()
+
+        # ③ 发快照：实体表每帧只建一次，每个客户端只做一次字典比较
+        if clients and tick % SEND_EVERY == 0:
+            table = entity_table(state)
+            history[tick] = table
+            history.pop(tick - HISTORY_TICKS, None)
+            for slot in clients.values():
+                packet = encode_snapshot(state, tick, slot.ack_tick, history.get(slot.ack_tick),
+                                         table, slot, slot.player)
+                try:
+                    sock.sendto(packet, slot.addr)
+                except OSError:
+                    continue
+                slot.bytes_sent += len(packet)
+                stats['bytes'] += len(packet)
+        t2 = time.perf_counter()
+
+        stats['sim'] += t1 - t0
+        stats['net'] += t2 - t1
+        stats['max'] = max(stats['max'], t2 - t0)
+        stats['ticks'] += 1
+        if t2 - stats_time >= STATS_INTERVAL:
+            n, span = stats['ticks'], t2 - stats_time
+            sim_ms = stats['sim'] / n * 1000.0
+            net_ms = stats['net'] / n * 1000.0
+            line = "clients {:3d} | tick sim {:6.3f} ms  net {:6.3f} ms  max {:6.2f} ms".format(
+                len(clients), sim_ms, net_ms, stats['max'] * 1000.0)
+            if clients:
+                per_client = net_ms / len(clients)
+                budget = dt * 1000.0 - sim_ms
+                line += " | {:6.2f} KB/s per client | ~{} clients/core".format(
+                    stats['bytes'] / span / len(clients) / 1024.0,
+                    int(budget / per_client) if per_client > 0 else '-')
+            print(line)
+            stats = {'sim': 0.0, 'net': 0.0, 'max': 0.0, 'ticks': 0, 'bytes': 0}
+            stats_time = t2
+
+        # ④ 固定帧率：落后太多就直接追上，不补帧
+        next_time += dt
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -0.25:
+            next_time = time.perf_counter()
+
+
+# ================== 客户端 ==================
+class NetClient:
+    """收发包 + 快照重建 + 输入预测；画面部分在 run_client 里"""
+
+    def __init__(self, host, port):
+        self.addr = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.net_id = None
+        self.tables = {}          # 帧号 -> 实体表（增量基准）
+        self.snapshots = []       # [(帧号, 头部, 实体表)]，按帧号递增，插值用
+        self.latest = None
+        self.seq = 0
+        self.pending = []         # 还没被服务器确认的输入 (序号, 键位, 按钮, x, y)
+        self.clock_offset = None  # 本地时间 - 帧号/帧率 的最小值，用来估计服务器时间
+        self.bytes_recv = 0
+
+    def join(self):
+        self.sock.sendto(MSG_JOIN, self.addr)
+
+    def leave(self):
+        try:
+            self.sock.sendto(MSG_LEAVE, self.addr)
+        except OSError:
+            pass
+
+    def send_input(self, bits, buttons=0, target=(0, 0)):
+        self.seq += 1
+        rec = (self.seq, bits, buttons, int(target[0]), int(target[1]))
+        self.pending.append(rec)
+        recent = self.pending[-INPUT_REDUNDANCY:]
+        packet = INPUT_HDR.pack(MSG_INPUT, self.latest[0] if self.latest else 0, len(recent))
+        packet += b''.join(INPUT_REC.pack(*r) for r in recent)
+        try:
+            self.sock.sendto(packet, self.addr)
+        except OSError:
+            pass
+        return rec
+
+    def poll(self):
+        """收完所有包；返回是否有新快照"""
+        got = False
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            self.bytes_recv += len(data)
+            kind = data[:1]
+            if kind == MSG_WELCOME:
+                _, self.net_id, _ = WELCOME.unpack(data)
+                # 新一局：之前的基准全部作废
+                self.tables.clear()
+                self.snapshots.clear()
+                self.latest = None
+            elif kind == MSG_SNAPSHOT:
+                result = decode_snapshot(data, self.tables)
+                if result is None or (self.latest and result[0] <= self.latest[0]):
+                    continue
+                tick, fields, table = result
+                self.tables[tick] = table
+                self.tables.pop(tick - HISTORY_TICKS, None)
+                self.latest = result
+                self.snapshots.append(result)
+                del self.snapshots[:-16]
+                offset = time.perf_counter() - tick / TICK_RATE
+                if self.clock_offset is None or offset < self.clock_offset:
+                    self.clock_offset = offset
+                # 服务器已经应用到哪条输入
+                ack = fields[3]
+                self.pending = [r for r in self.pending if r[0] > ack]
+                got = True
+        return got
+
+    def reconcile(self, player):
+        """把本地玩家拉回服务器位置，再重放还没确认的输入"""
+        fields = self.latest[1]
+        player.rect.topleft = (fields[9], fields[10])
+        player.current_speed = fields[11]
+        player.lives = fields[12]
+        for rec in self.pending:
+            player.update(InputKeys(rec[1]))
+
+    def render_tick(self):
+        """当前应该显示的（小数）帧号"""
+        return (time.perf_counter() - self.clock_offset) * TICK_RATE - INTERP_TICKS
+
+    def interpolated(self):
+        """插值后的实体列表 [(id, 种类, x, y, 标志, 附加值)]"""
+        snaps = self.snapshots
+        t = self.render_tick()
+        older, newer = snaps[0], snaps[-1]
+        for a, b in zip(snaps, snaps[1:]):
+            if a[0] <= t <= b[0]:
+                older, newer = a, b
+                break
+        else:
+            older = newer = snaps[-1] if t > snaps[-1][0] else snaps[0]
+        if older is newer:
+            return list(newer[2].values())
+        f = (t - older[0]) / float(newer[0] - older[0])
+        out = []
+        base = older[2]
+        for net_id, rec in newer[2].items():
+            prev = base.get(net_id)
+            if prev is not None:
+                x = int(prev[2] + (rec[2] - prev[2]) * f)
+                y = int(prev[3] + (rec[3] - prev[3]) * f)
+                rec = (net_id, rec[1], x, y, rec[4], rec[5])
+            out.append(rec)
+        return out
+
+
+def make_images():
+    """各种实体的贴图（和单机版共用同一批贴图）"""
+    return {
+        KIND_PLAYER: game.player_image(OTHER_PLAYER_COLOR),
+        KIND_BULLET: game.bullet_image(),
+        KIND_ENEMY: game.enemy_image(),
+        KIND_FOLLOWER: game.clown_image(),
+        KIND_FBULLET: game.follower_bullet_image(),
+        'clown': game.clown_image(),
+    }
+
+
+def run_client(args):
+    net = NetClient(args.host, args.port)
+    game.set_caption("终极射击小游戏 • 联机合作")
+    screen = game.screen
+    clock = game.clock
+    images = make_images()
+
+    view = game.GameState()              # 只用来画：all_sprites 每帧按快照重建
+    me = view.player                     # 本地预测的自己
+    pool = {}                            # 网络 id -> 显示用精灵（复用，不每帧新建）
+    dying_seen = set()
+    last_combo = 0
+    join_time = 0.0                      # 上次发加入请求的时间（重试用）
+    session_start = time.perf_counter()  # 流量统计从这里算起，重试加入不影响
+
+    running = True
+    while running:
+        now = time.perf_counter()
+        if net.net_id is None and now - join_time > 0.5:
+            net.join()                   # 没收到欢迎就每半秒重试
+            join_time = now
+
+        buttons, target = 0, (0, 0)
+        for event in pygame.event.get():
+            if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
+                running = False
+            elif event.type == MOUSEBUTTONDOWN:
+                if event.button == 1:
+                    buttons |= BTN_FIRE
+                    target = view.to_world(event.pos)
+                elif event.button == 3:
+                    buttons |= BTN_FREEZE
+
+        if net.net_id is not None:
+            # 客户端预测：先本地走一步，再把这一帧的输入发出去
+            bits = local_key_bits()
+            if me.lives > 0:
+                me.update(InputKeys(bits))
+            net.send_input(bits, buttons, target)
+
+        if net.poll():
+            net.reconcile(me)
+
+        if net.latest is None:
+            screen.fill(game.COLOR_BLACK)
+            wait = game.render_text(game.font, "Connecting to {}:{} ...".format(*net.addr), game.COLOR_WHITE)
+            screen.blit(wait, wait.get_rect(center=(game.SCREEN_W // 2, game.SCREEN_H // 2)))
+            game.present()
+            clock.tick(game.FPS)
+            continue
+
+        # 用插值后的实体重建显示用的 GameState
+        fields = net.latest[1]
+        view.player.score = fields[4]
+        view.difficulty_level = fields[5]
+        view.num_trajectories = fields[6]
+        view.clock.paused = fields[8]
+        if fields[7] > last_combo and fields[7] >= 2:
+            view.combo_anim_timer = view.combo_display_duration   # 连击动画在本地播放
+        last_combo = view.combo_count = fields[7]
+
+        view.all_sprites.empty()
+        seen = set()
+        for net_id, kind, x, y, flags, value in net.interpolated():
+            seen.add(net_id)
+            if net_id == net.net_id:
+                if me.lives > 0:
+                    view.all_sprites.add(me)
+                continue
+            spr = pool.get(net_id)
+            if spr is None:
+                spr = pool[net_id] = pygame.sprite.Sprite()
+                spr.image = images[kind]
+                spr.rect = spr.image.get_rect()
+                spr.kind = kind
+            if kind == KIND_ENEMY:
+                if flags & ENEMY_DYING:
+                    if net_id not in dying_seen:
+                        # 敌人刚死：血溅粒子在本地生成，不占带宽
+                        dying_seen.add(net_id)
+                        spr.image = (images['clown'] if flags & ENEMY_DODGING else images[KIND_ENEMY]).copy()
+                        view.enemy_particles.extend(game.create_death_particles(x + 18, y + 18, count=20))
+                    spr.image.set_alpha(value)
+                else:
+                    spr.image = images['clown'] if flags & ENEMY_DODGING else images[KIND_ENEMY]
+            spr.rect.topleft = (x, y)
+            view.all_sprites.add(spr)
+        for net_id in [i for i in pool if i not in seen]:
+            del pool[net_id]
+            dying_seen.discard(net_id)
+
+        view.draw(screen)
+        kbps = net.bytes_recv / 1024.0 / max(1e-6, now - session_start)
+        info = game.render_text(game.font, "{:.1f} KB/s".format(kbps), (120, 120, 120))
+        screen.blit(info, (10, game.SCREEN_H - 30))
+        game.present()
+        game.quality.frame((time.perf_counter() - now) * 1000.0)
+        clock.tick(game.FPS)
+
+    net.leave()
+    pygame.quit()
+
+
+# ================== 压测机器人 ==================
+def run_bots(args):
+    """一个进程里跑 N 个无头客户端：随机走位、随机射击，用来测服务器能带多少人"""
+    bots = [NetClient(args.host, args.port) for _ in range(args.count)]
+    for bot in bots:
+        bot.bits = 0
+    dt = 1.0 / TICK_RATE
+    next_time = time.perf_counter()
+    start = time.perf_counter()
+    last_report = start
+    print("{} bots -> {}:{}".format(args.count, args.host, args.port))
+    while args.seconds <= 0 or time.perf_counter() - start < args.seconds:
+        for bot in bots:
+            if bot.net_id is None:
+                if random.random() < 0.05:
+                    bot.join()
+                bot.poll()
+                continue
+            if random.random() < 0.05:
+                bot.bits = random.choice([0, 1, 2, 4, 8, 5, 6, 9, 10])
+            fire = random.random() < 0.05
+            bot.send_input(bot.bits, BTN_FIRE if fire else 0,
+                           (random.randint(0, game.WORLD_W), random.randint(0, game.WORLD_H)))
+            bot.poll()
+        now = time.perf_counter()
+        if now - last_report >= STATS_INTERVAL:
+            joined = sum(1 for b in bots if b.net_id is not None)
+            total = sum(b.bytes_recv for b in bots)
+            print("bots joined {:3d} | {:6.2f} KB/s per bot".format(
+                joined, total / (now - start) / max(1, joined) / 1024.0))
+            last_report = now
+        next_time += dt
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_time = time.perf_counter()
+    for bot in bots:
+        bot.leave()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="终极射击小游戏 本机联机合作")
+    sub = parser.add_subparsers(dest='mode', required=True)
+    for name in ('server', 'client', 'bots'):
+        p = sub.add_parser(name)
+        p.add_argument('--host', default='127.0.0.1')
+        p.add_argument('--port', type=int, default=NET_PORT)
+        if name == 'bots':
+            p.add_argument('count', type=int, help="机器人数量")
+            p.add_argument('--seconds', type=float, default=0, help="跑多久（0 = 一直跑）")
+    args = parser.parse_args()
+
+    try:
+        {'server': run_server, 'client': run_client, 'bots': run_bots}[args.mode](args)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,10 @@
+import os
+import json
+import math
+import time
+import queue
+import threading
+
 import cv2
 import numpy as np
 
@@ -10,53 +17,511 @@ detectShadows = False        # 关闭阴影检测（不需要，阴影会导致
 min_area = 500               # 小于此面积的连通块直接丢弃
 kernel_size = (5, 5)         # 形态学核
 dilation_iter = 2
+
+# 背景模型：mog2 / knn / avg（滑动平均）/ diff（帧差）/ median（N 帧中值）
+# 640x480 上背景一步的耗时大致是：avg / diff 约 0.4 ms，mog2 / knn 约 8 ms，median 约 11 ms（见 动态追踪基准.py）
+bg_backend = "mog2"
+diff_threshold = 25          # avg / diff / median 模型的前景灰度差阈值
+diff_dilate = 2              # diff 模型先把帧差膨胀这么多次，免得细边被后面的开运算吃掉
+avg_alpha = 0.02             # avg 模型的背景学习率
+median_frames = 15           # median 模型保留的采样帧数
+median_every = 5             # median 模型每隔多少帧采样一次并重算中值
+
+# 运动门控：画面静止时跳过形态学 + 轮廓，背景降频更新
+gate_enabled = True
+gate_scale = 8               # 门控用的降采样倍数（640x480 -> 80x60）
+gate_delta = 12              # 降采样后单个像素变化超过此灰度差才算“变了”
+gate_min_pixels = 3          # 变化像素数不足此值视为静止（不受小目标面积占比影响）
+gate_hold = 15               # 一旦出现运动，之后至少全速处理这么多帧
+idle_bg_interval = 10        # 静止时每隔多少帧更新一次背景模型
+
+# 运动片段录制：只保存有运动的片段（预录 + 运动 + 尾录）
+record_enabled = False
+record_dir = "motion_clips"  # 片段和索引文件的输出目录
+record_fps = 20.0            # 还没测出采集帧率时的假定帧率（片段按实测帧率写）
+record_fourcc = "mp4v"
+pre_roll = 3.0               # 运动开始前保留的秒数（内存环形缓冲）
+post_roll = 5.0              # 运动消失后继续录制的秒数，超时则结束片段
+record_queue_size = 256      # 后台写线程的队列长度，满了就丢帧而不阻塞采集
 # ----------------------------------------------------
 
-# 1. 视频读取
-cap = cv2.VideoCapture(caps)
 
-# 2. 背景减除器
-fgbg = cv2.createBackgroundSubtractorMOG2(history=history,
-                                          varThreshold=varThreshold,
-                                          detectShadows=detectShadows)
+# ================== 背景模型 ==================
+# 统一接口：apply(gray, fgmask) 把前景掩码（前景 255，背景 0）写进 fgmask 并返回它。
+
+class MOG2Backend:
+    """OpenCV 高斯混合模型（原来的默认实现）"""
+
+    def __init__(self, history=history, varThreshold=varThreshold):
+        self.model = cv2.createBackgroundSubtractorMOG2(history=history,
+                                                        varThreshold=varThreshold,
+                                                        detectShadows=detectShadows)
+
+    def apply(self, gray, fgmask):
+        return self.model.apply(gray, fgmask)
+
+
+class KNNBackend:
+    """OpenCV K 近邻模型
+
+    MOG2 的 varThreshold 是以像素方差为单位的马氏距离平方，KNN 的 dist2Threshold
+    是灰度值的欧氏距离平方。按摄像头噪声标准差约 5 个灰度级（方差 25）换算：
+    dist2Threshold = varThreshold * 25，默认的 16 正好对应 OpenCV 自己的 KNN 默认值 400。
+    """
+
+    def __init__(self, history=history, varThreshold=varThreshold):
+        self.model = cv2.createBackgroundSubtractorKNN(history=history,
+                                                       dist2Threshold=varThreshold * 25,
+                                                       detectShadows=detectShadows)
+
+    def apply(self, gray, fgmask):
+        return self.model.apply(gray, fgmask)
+
+
+class RunningAverageBackend:
+    """滑动平均背景：|当前帧 - 背景| > 阈值 即前景，然后按 alpha 更新背景
+
+    只有几次逐像素运算，比 MOG2 便宜得多，适合低功耗机器。
+    """
+
+    def __init__(self, alpha=avg_alpha, threshold=diff_threshold, **_):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.bg = None           # float32 背景
+        self.bg_u8 = None
+
+    def apply(self, gray, fgmask):
+        if self.bg is None:
+            self.bg = gray.astype(np.float32)
+            self.bg_u8 = gray.copy()
+        cv2.convertScaleAbs(self.bg, dst=self.bg_u8)
+        cv2.absdiff(gray, self.bg_u8, dst=fgmask)
+        cv2.threshold(fgmask, self.threshold, 255, cv2.THRESH_BINARY, dst=fgmask)
+        cv2.accumulateWeighted(gray, self.bg, self.alpha)
+        return fgmask
+
+
+class FrameDiffBackend(RunningAverageBackend):
+    """帧差：背景就是上一帧（alpha = 1 的滑动平均），最便宜，只对移动中的边缘敏感
+
+    纯色物体慢慢移动时，帧差只剩前后沿几个像素宽的细条，MotionDetector 的开运算
+    （5x5 核两次）会把它们整个抹掉。所以这里先膨胀 dilate 次，把细条连成物体轮廓，
+    之后的轮廓外接框就是整个物体。
+    """
+
+    def __init__(self, threshold=diff_threshold, dilate=diff_dilate, **_):
+        super().__init__(alpha=1.0, threshold=threshold)
+        self.dilate = dilate
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, kernel_size)
+
+    def apply(self, gray, fgmask):
+        super().apply(gray, fgmask)
+        if self.dilate:
+            cv2.dilate(fgmask, self.kernel, dst=fgmask, iterations=self.dilate)
+        return fgmask
+
+
+class MedianBackend:
+    """最近 N 个采样帧的逐像素中值作为背景，对偶尔经过的物体很稳
+
+    它不比 MOG2 便宜：每 every 帧对 N 帧整图求一次精确中值（15x480x640 约一百多毫秒），
+    摊到每帧还略贵于 MOG2。选它是为了背景稳：没有学习率，只要物体在采样窗口
+    （N x every 帧）里待的时间不到一半就不会被学进背景，物体离开后也不会留下残影。
+    """
+
+    def __init__(self, frames=median_frames, every=median_every, threshold=diff_threshold, **_):
+        self.frames = frames
+        self.every = every
+        self.threshold = threshold
+        self.samples = None      # (N, h, w) uint8 环形缓冲
+        self.median = None
+        self.pos = 0
+        self.count = 0
+        self.tick = 0
+
+    def apply(self, gray, fgmask):
+        if self.samples is None:
+            self.samples = np.empty((self.frames,) + gray.shape, np.uint8)
+            self.median = gray.copy()
+        if self.tick % self.every == 0:
+            np.copyto(self.samples[self.pos], gray)
+            self.pos = (self.pos + 1) % self.frames
+            self.count = min(self.count + 1, self.frames)
+            self.median[...] = np.median(self.samples[:self.count], axis=0)
+        self.tick += 1
+        cv2.absdiff(gray, self.median, dst=fgmask)
+        cv2.threshold(fgmask, self.threshold, 255, cv2.THRESH_BINARY, dst=fgmask)
+        return fgmask
+
+
+BACKENDS = {
+    'mog2': MOG2Backend,
+    'knn': KNNBackend,
+    'avg': RunningAverageBackend,
+    'diff': FrameDiffBackend,
+    'median': MedianBackend,
+}
+
+
+def make_backend(name, history=history, varThreshold=varThreshold):
+    """按名字创建背景模型；history / varThreshold 只对 mog2 / knn 有意义"""
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError("unknown background backend {!r}, choose from {}".format(
+            name, ", ".join(BACKENDS)))
+    return cls(history=history, varThreshold=varThreshold)
+
+
+class MotionDetector:
+    """背景减除 + 形态学 + 轮廓，带一个廉价的运动门控
+
+    参数默认取参数区的值；基准脚本会逐个覆盖来做调参对比。
+    backend 可以是 BACKENDS 里的名字，也可以直接传一个背景模型对象，
+    这样每路视频流可以各用各的模型。
+    profile=True 时把各阶段耗时累加到 self.timings（秒）。
+    """
+
+    def __init__(self, frame_res=frame_res, history=history, varThreshold=varThreshold,
+                 kernel_size=kernel_size, dilation_iter=dilation_iter, min_area=min_area,
+                 gate=gate_enabled, profile=False, backend=bg_backend):
+        self.frame_res = frame_res
+        self.dilation_iter = dilation_iter
+        self.min_area = min_area
+        self.gate = gate
+        self.profile = profile
+        self.timings = {}
+
+        # 背景模型
+        if isinstance(backend, str):
+            backend = make_backend(backend, history, varThreshold)
+        self.fgbg = backend
+        # 形态学核
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, kernel_size)
+
+        # 门控状态
+        self.gate_res = (max(1, frame_res[0] // gate_scale), max(1, frame_res[1] // gate_scale))
+        self.hold = 0            # 剩余全速帧数
+        self.idle_count = 0      # 连续静止帧数
+
+        # 预分配的输出缓冲区，每帧通过 dst= 复用，避免反复申请内存
+        w, h = frame_res
+        gw, gh = self.gate_res
+        self.buf = {
+            'frame_small': np.empty((h, w, 3), np.uint8),
+            'gray':        np.empty((h, w), np.uint8),
+            'fgmask':      np.empty((h, w), np.uint8),
+            'opened':      np.empty((h, w), np.uint8),
+            'dilated':     np.empty((h, w), np.uint8),
+            'tiny':        np.empty((gh, gw), np.uint8),
+            'prev_tiny':   np.empty((gh, gw), np.uint8),
+            'diff':        np.empty((gh, gw), np.uint8),
+        }
+        self.has_prev_tiny = False
+
+        # 统计（allocs：OpenCV 没能写进预分配缓冲区、另行分配的次数，正常应为 0）
+        self.stats = {'frames': 0, 'gated': 0, 'bg_updates': 0, 'allocs': 0}
+
+    def _reuse(self, name, out):
+        """确认结果写进了预分配缓冲区；否则计一次分配并改用新数组"""
+        if out is not self.buf[name]:
+            self.stats['allocs'] += 1
+            self.buf[name] = out
+        return out
+
+    def _lap(self, stage, t0):
+        """累加一个阶段的耗时，返回新的起点"""
+        t1 = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + (t1 - t0)
+        return t1
+
+    def motion_energy(self, gray):
+        """降采样帧差能量：与上一帧相比明显变化的像素数"""
+        # 交换两块缓冲区，上一帧的 tiny 变成 prev_tiny
+        self.buf['tiny'], self.buf['prev_tiny'] = self.buf['prev_tiny'], self.buf['tiny']
+        tiny = self._reuse('tiny', cv2.resize(gray, self.gate_res, dst=self.buf['tiny'],
+                                              interpolation=cv2.INTER_AREA))
+        if not self.has_prev_tiny:
+            self.has_prev_tiny = True
+            return float('inf')      # 第一帧一律当作有运动
+        diff = self._reuse('diff', cv2.absdiff(tiny, self.buf['prev_tiny'], dst=self.buf['diff']))
+        cv2.threshold(diff, gate_delta, 255, cv2.THRESH_BINARY, dst=diff)
+        return cv2.countNonZero(diff)
+
+    def is_active(self, gray):
+        """门控判断：本帧是否需要跑完整流水线"""
+        if not self.gate:
+            return True
+        if self.motion_energy(gray) >= gate_min_pixels:
+            self.hold = gate_hold
+        elif self.hold > 0:
+            self.hold -= 1
+        return self.hold > 0
+
+    def process(self, frame):
+        """处理一帧，返回 (缩放后的画面, 运动框列表)
+
+        返回的画面是内部复用的缓冲区，下一次调用 process 时会被覆盖。
+        """
+        self.stats['frames'] += 1
+        buf = self.buf
+        profile = self.profile
+        t = time.perf_counter() if profile else 0.0
+
+        # 预处理，缩放 + 灰度
+        frame_small = self._reuse('frame_small', cv2.resize(frame, self.frame_res, dst=buf['frame_small']))
+        gray = self._reuse('gray', cv2.cvtColor(frame_small, cv2.COLOR_BGR2GRAY, dst=buf['gray']))
+        if profile:
+            t = self._lap('preprocess', t)
+
+        active = self.is_active(gray)
+        if profile:
+            t = self._lap('gate', t)
+        if not active:
+            # 静止：跳过形态学和轮廓，背景模型降频更新
+            self.stats['gated'] += 1
+            self.idle_count += 1
+            if self.idle_count % idle_bg_interval == 0:
+                self._reuse('fgmask', self.fgbg.apply(gray, buf['fgmask']))
+                self.stats['bg_updates'] += 1
+                if profile:
+                    self._lap('background', t)
+            return frame_small, []
+        self.idle_count = 0
+
+        # 背景减除
+        fgmask = self._reuse('fgmask', self.fgbg.apply(gray, buf['fgmask']))
+        self.stats['bg_updates'] += 1
+        if profile:
+            t = self._lap('background', t)
+
+        # 阈值化（原地）
+        cv2.threshold(fgmask, 250, 255, cv2.THRESH_BINARY, dst=fgmask)
+
+        # 形态学清理
+        opened = self._reuse('opened', cv2.morphologyEx(fgmask, cv2.MORPH_OPEN, self.kernel,
+                                                        dst=buf['opened'], iterations=2))
+        dilated = self._reuse('dilated', cv2.dilate(opened, self.kernel, dst=buf['dilated'],
+                                                    iterations=self.dilation_iter))
+        if profile:
+            t = self._lap('morphology', t)
+
+        # 轮廓检测
+        contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        # 过滤
+        boxes = []
+        for cnt in contours:
+            area = cv2.contourArea(cnt)
+            if area < self.min_area:
+                continue
+            boxes.append(cv2.boundingRect(cnt))
+        if profile:
+            self._lap('contours', t)
+        return frame_small, boxes
+
+
+class MotionRecorder:
+    """运动事件录制：环形缓冲保存最近 pre_roll 秒，出现运动时连同预录一起写盘
+
+    写盘在后台线程里做，采集循环只负责拷贝帧和入队。每个片段旁边会生成一个
+    同名 .json 索引，记录每帧的时间戳和运动框。
+
+    环形缓冲的长度和片段的写出帧率都按实测的采集帧率算（fps 只在测出来之前顶用），
+    采集变快时缓冲扩容；开始片段时按时间戳只取最近 pre_roll 秒的帧。已经写进片段的帧不再留在缓冲里，
+    下一个片段的预录不会和上一个片段重复。
+    """
+
+    def __init__(self, out_dir=record_dir, fps=record_fps):
+        self.out_dir = out_dir
+        self.fps = fps
+        self.capture_fps = None      # 采集帧率的滑动估计
+        self.last_ts = None
+        self.ring = None             # 第一帧到来时按画面大小和采集帧率预分配
+        self.ring_len = 0
+        self.ring_ts = []
+        self.ring_boxes = []
+        self.ring_pos = 0
+        self.ring_count = 0
+
+        self.recording = False
+        self.last_motion = 0.0
+        self.index = None            # 当前片段的帧索引
+        self.clip_path = None
+        self.clip_fps = fps
+
+        self.queue = queue.Queue(maxsize=record_queue_size)
+        self.stats = {'clips': 0, 'frames_written': 0, 'dropped': 0}
+        self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
+
+    def push(self, frame, ts, boxes):
+        """每帧调用一次；frame 可以是复用缓冲区，这里会自行拷贝"""
+        self._measure_rate(ts)
+        # 预录要装下 pre_roll 秒；多留 1/4 余量应付帧率抖动
+        wanted = int(math.ceil(pre_roll * (self.capture_fps or self.fps) * 1.25)) + 1
+        if self.ring is None or wanted > self.ring_len:
+            self._resize_ring(frame, wanted)
+
+        if boxes:
+            self.last_motion = ts
+            if not self.recording:
+                self._start_clip(frame.shape, ts)
+
+        if self.recording:
+            self._enqueue_frame(frame.copy(), ts, boxes)
+            if not boxes and ts - self.last_motion > post_roll:
+                self._stop_clip()
+            return               # 已经写进片段的帧不再进预录缓冲
+
+        np.copyto(self.ring[self.ring_pos], frame)
+        self.ring_ts[self.ring_pos] = ts
+        self.ring_boxes[self.ring_pos] = boxes
+        self.ring_pos = (self.ring_pos + 1) % self.ring_len
+        self.ring_count = min(self.ring_count + 1, self.ring_len)
+
+    def _measure_rate(self, ts):
+        """按相邻两帧的时间戳估计采集帧率（指数平滑）"""
+        if self.last_ts is not None and ts > self.last_ts:
+            rate = 1.0 / (ts - self.last_ts)
+            if self.capture_fps is None:
+                self.capture_fps = rate
+            else:
+                self.capture_fps += 0.05 * (rate - self.capture_fps)
+        self.last_ts = ts
+
+    def _ring_slots(self):
+        """环形缓冲里现有帧的槽位，按时间先后"""
+        start = (self.ring_pos - self.ring_count) % max(1, self.ring_len)
+        return [(start + i) % self.ring_len for i in range(self.ring_count)]
+
+    def _resize_ring(self, frame, length):
+        """（重新）分配环形缓冲，只扩不缩；原有的帧按时间顺序搬过去"""
+        if self.ring is not None:
+            length = int(length * 1.5)   # 扩容时多给一些，避免帧率慢慢爬升时反复搬
+        ring = np.empty((length,) + frame.shape, frame.dtype)
+        ring_ts = [0.0] * length
+        ring_boxes = [[] for _ in range(length)]
+        slots = self._ring_slots()
+        for i, slot in enumerate(slots):
+            ring[i] = self.ring[slot]
+            ring_ts[i] = self.ring_ts[slot]
+            ring_boxes[i] = self.ring_boxes[slot]
+        self.ring, self.ring_ts, self.ring_boxes = ring, ring_ts, ring_boxes
+        self.ring_len = length
+        self.ring_count = len(slots)
+        self.ring_pos = self.ring_count % length
+
+    def _start_clip(self, shape, ts):
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = time.strftime("motion_%Y%m%d_%H%M%S", time.localtime(ts))
+        name += "_{:03d}".format(int(ts * 1000) % 1000)
+        self.clip_path = os.path.join(self.out_dir, name + ".mp4")
+        self.index = []
+        self.recording = True
+        # 片段按实测采集帧率写，回放速度才和现场一致；还没测出来时用 fps
+        self.clip_fps = round(self.capture_fps or self.fps, 2)
+        self.queue.put(('open', self.clip_path, (shape[1], shape[0]), self.clip_fps))
+
+        # 先把环形缓冲里最近 pre_roll 秒的预录帧按时间顺序写出去，写完清空
+        for slot in self._ring_slots():
+            if ts - self.ring_ts[slot] <= pre_roll:
+                self._enqueue_frame(self.ring[slot].copy(), self.ring_ts[slot], self.ring_boxes[slot])
+        self.ring_count = 0
+
+    def _stop_clip(self):
+        self.queue.put(('close', os.path.splitext(self.clip_path)[0] + ".json",
+                        {'clip': os.path.basename(self.clip_path), 'fps': self.clip_fps,
+                         'frames': self.index}))
+        self.recording = False
+        self.index = None
+        self.stats['clips'] += 1
+
+    def _enqueue_frame(self, frame, ts, boxes):
+        try:
+            self.queue.put_nowait(('frame', frame))
+        except queue.Full:
+            self.stats['dropped'] += 1
+            return
+        self.index.append({'t': round(ts, 3), 'boxes': [list(b) for b in boxes]})
+
+    def _writer_loop(self):
+        """后台写线程：按顺序处理 open / frame / close / stop"""
+        writer = None
+        while True:
+            item = self.queue.get()
+            kind = item[0]
+            if kind == 'open':
+                _, path, size, fps = item
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*record_fourcc), fps, size)
+            elif kind == 'frame':
+                if writer is not None:
+                    writer.write(item[1])
+                    self.stats['frames_written'] += 1
+            elif kind == 'close':
+                _, index_path, index = item
+                if writer is not None:
+                    writer.release()
+                    writer = None
+                with open(index_path, 'w') as f:
+                    json.dump(index, f)
+            else:  # stop
+                if writer is not None:
+                    writer.release()
+                break
+
+    def close(self):
+        """结束当前片段并等待后台线程写完"""
+        if self.recording:
+            self._stop_clip()
+        self.queue.put(('stop',))
+        self.writer_thread.join()
+
 
-# 形态学核
-kernel = cv2.getStructuringElement(cv2.MORPH_RECT, kernel_size)
+def main():
+    # 1. 视频读取
+    cap = cv2.VideoCapture(caps)
 
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
+    # 2. 检测器
+    detector = MotionDetector()
+    recorder = MotionRecorder() if record_enabled else None
 
-    # 3. 预处理，缩放 + 灰度
-    frame_small = cv2.resize(frame, frame_res)
-    gray = cv2.cvtColor(frame_small, cv2.COLOR_BGR2GRAY)
+    frame = None
+    while True:
+        # 读进复用的缓冲区（第一帧分配一次，之后原地覆盖）
+        prev = frame
+        ret, frame = cap.read(frame)
+        if not ret:
+            break
+        if prev is not None and frame is not prev:
+            detector.stats['allocs'] += 1
 
-    # 4. 背景减除
-    fgmask = fgbg.apply(gray)
+        # 3. 处理
+        frame_small, boxes = detector.process(frame)
+        if recorder is not None:
+            recorder.push(frame_small, time.time(), boxes)   # 录原始画面，框在索引里
 
-    # 5. 阈值化
-    _, fgmask = cv2.threshold(fgmask, 250, 255, cv2.THRESH_BINARY)
+        # 4. 绘制
+        for x, y, w, h in boxes:
+            cv2.rectangle(frame_small, (x, y), (x + w, y + h), (0, 255, 0), 2)
 
-    # 6. 形态学清理
-    fgmask = cv2.morphologyEx(fgmask, cv2.MORPH_OPEN, kernel, iterations=2)
-    fgmask = cv2.dilate(fgmask, kernel, iterations=dilation_iter)
+        # 5. 显示
+        cv2.imshow('Motion Boxes', frame_small)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
 
-    # 7. 轮廓检测
-    contours, _ = cv2.findContours(fgmask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    cap.release()
+    cv2.destroyAllWindows()
+    if recorder is not None:
+        recorder.close()
+        print("clips: {}  frames written: {}  dropped: {}".format(
+            recorder.stats['clips'], recorder.stats['frames_written'], recorder.stats['dropped']))
 
-    # 8. 过滤 & 绘制
-    for cnt in contours:
-        area = cv2.contourArea(cnt)
-        if area < min_area:
-            continue
-        x, y, w, h = cv2.boundingRect(cnt)
-        cv2.rectangle(frame_small, (x, y), (x + w, y + h), (0, 255, 0), 2)
+    s = detector.stats
+    if s['frames']:
+        print("frames: {}  gated: {} ({:.0%})  bg updates: {}  allocs: {}".format(
+            s['frames'], s['gated'], s['gated'] / s['frames'], s['bg_updates'], s['allocs']))
 
-    # 9. 显示
-    cv2.imshow('Motion Boxes', frame_small)
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
 
-cap.release()
-cv2.destroyAllWindows()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+动态追踪基准测试（不需要摄像头）
+=====================================================
+生成带移动矩形、噪声和光照漂移的合成画面，送进 动态追踪.py 里同一条
+MOG2 / 形态学 / 轮廓流水线，输出：
+    - 各阶段耗时（ms/帧）
+    - 端到端 FPS（只计检测耗时，不含画面生成）
+    - 与真实框对比的 precision / recall
+
+参数可以给逗号分隔的多个值，会跑所有组合，方便对比调参：
+    python 动态追踪基准.py --res 1280x720 --objects 5 --history 200,500 --kernel 3,5
+    python 动态追踪基准.py --backend mog2,knn,avg,diff,median
+"""
+
+import time
+import argparse
+import itertools
+
+import cv2
+import numpy as np
+
+import 动态追踪 as motion
+
+
+class SyntheticScene:
+    """合成场景：纹理背景 + 若干匀速反弹的矩形 + 高斯噪声 + 整体亮度漂移"""
+
+    def __init__(self, res, objects, noise=4.0, drift=20.0, seed=0):
+        self.w, self.h = res
+        self.noise = noise
+        self.drift = drift
+        self.rng = np.random.default_rng(seed)
+
+        # 平滑的纹理背景，比纯色更接近真实画面
+        base = self.rng.integers(40, 200, (self.h // 8 + 1, self.w // 8 + 1, 3), dtype=np.uint8)
+        self.background = cv2.resize(base, (self.w, self.h), interpolation=cv2.INTER_CUBIC)
+
+        self.objects = []
+        for _ in range(objects):
+            ow = int(self.rng.integers(self.w // 20, self.w // 8))
+            oh = int(self.rng.integers(self.h // 20, self.h // 8))
+            x = float(self.rng.uniform(0, self.w - ow))
+            y = float(self.rng.uniform(0, self.h - oh))
+            speed = self.w / 200.0
+            angle = float(self.rng.uniform(0, 2 * np.pi))
+            color = tuple(int(c) for c in self.rng.integers(0, 256, 3))
+            self.objects.append({'x': x, 'y': y, 'w': ow, 'h': oh,
+                                 'vx': speed * np.cos(angle), 'vy': speed * np.sin(angle),
+                                 'color': color})
+
+        self.frame = np.empty((self.h, self.w, 3), np.uint8)
+        self.noise_buf = np.empty((self.h, self.w, 3), np.int16)
+        self.t = 0
+
+    def next(self):
+        """生成下一帧，返回 (画面, 真实框列表)；画面缓冲区会被复用"""
+        self.t += 1
+        # 光照漂移：整体亮度做慢速正弦变化
+        gain = 1.0 + self.drift / 255.0 * np.sin(self.t / 90.0)
+        cv2.convertScaleAbs(self.background, dst=self.frame, alpha=gain)
+
+        boxes = []
+        for o in self.objects:
+            o['x'] += o['vx']
+            o['y'] += o['vy']
+            if o['x'] < 0 or o['x'] + o['w'] > self.w:
+                o['vx'] = -o['vx']
+                o['x'] = min(max(o['x'], 0), self.w - o['w'])
+            if o['y'] < 0 or o['y'] + o['h'] > self.h:
+                o['vy'] = -o['vy']
+                o['y'] = min(max(o['y'], 0), self.h - o['h'])
+            x, y = int(o['x']), int(o['y'])
+            cv2.rectangle(self.frame, (x, y), (x + o['w'], y + o['h']), o['color'], -1)
+            boxes.append((x, y, o['w'], o['h']))
+
+        if self.noise > 0:
+            self.noise_buf[...] = self.rng.normal(0, self.noise, self.noise_buf.shape)
+            np.clip(self.frame + self.noise_buf, 0, 255, out=self.noise_buf)
+            self.frame[...] = self.noise_buf
+        return self.frame, boxes
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match(detections, truths, threshold):
+    """贪心 IoU 匹配，返回 (TP, FP, FN)"""
+    unmatched = list(truths)
+    tp = 0
+    for d in detections:
+        best, best_iou = None, threshold
+        for g in unmatched:
+            v = iou(d, g)
+            if v >= best_iou:
+                best, best_iou = g, v
+        if best is not None:
+            unmatched.remove(best)
+            tp += 1
+    return tp, len(detections) - tp, len(unmatched)
+
+
+def run(args, params):
+    """用一组参数跑完整个合成视频，返回结果字典"""
+    scene = SyntheticScene(args.res, args.objects, args.noise, args.drift, args.seed)
+    detector = motion.MotionDetector(frame_res=args.proc_res, gate=not args.no_gate,
+                                     profile=True, **params)
+    sx = args.proc_res[0] / args.res[0]
+    sy = args.proc_res[1] / args.res[1]
+
+    tp = fp = fn = 0
+    total = 0.0
+    for i in range(args.frames):
+        frame, truths = scene.next()
+        t0 = time.perf_counter()
+        _, boxes = detector.process(frame)
+        total += time.perf_counter() - t0
+
+        if i < args.warmup:
+            continue          # 背景模型还没学好，不计入准确率
+        truths = [(x * sx, y * sy, w * sx, h * sy) for x, y, w, h in truths]
+        a, b, c = match(boxes, truths, args.iou)
+        tp, fp, fn = tp + a, fp + b, fn + c
+
+    return {
+        'params': params,
+        'fps': args.frames / total if total > 0 else float('inf'),
+        'stages': {k: v / args.frames * 1000.0 for k, v in detector.timings.items()},
+        'precision': tp / (tp + fp) if tp + fp else 0.0,
+        'recall': tp / (tp + fn) if tp + fn else 0.0,
+        'gated': detector.stats['gated'] / args.frames,
+        'allocs': detector.stats['allocs'],
+    }
+
+
+def parse_res(text):
+    w, h = text.lower().split('x')
+    return int(w), int(h)
+
+
+def parse_list(cast):
+    return lambda text: [cast(v) for v in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="动态追踪合成视频基准")
+    parser.add_argument('--res', type=parse_res, default=(1280, 720), help="合成画面分辨率，如 1280x720")
+    parser.add_argument('--proc-res', type=parse_res, default=motion.frame_res, help="检测用的缩放分辨率")
+    parser.add_argument('--objects', type=int, default=3, help="移动矩形数量")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=30, help="前多少帧不计入准确率")
+    parser.add_argument('--noise', type=float, default=4.0, help="高斯噪声标准差")
+    parser.add_argument('--drift', type=float, default=20.0, help="光照漂移幅度（灰度级）")
+    parser.add_argument('--iou', type=float, default=0.3, help="判定命中的 IoU 阈值")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-gate', action='store_true', help="关闭运动门控")
+    parser.add_argument('--backend', type=parse_list(str), default=[motion.bg_backend],
+                        help="背景模型：" + ",".join(motion.BACKENDS))
+    parser.add_argument('--history', type=parse_list(int), default=[motion.history])
+    parser.add_argument('--var-threshold', type=parse_list(float), default=[motion.varThreshold])
+    parser.add_argument('--kernel', type=parse_list(int), default=[motion.kernel_size[0]])
+    parser.add_argument('--dilation', type=parse_list(int), default=[motion.dilation_iter])
+    args = parser.parse_args()
+
+    print("scene {}x{} -> {}x{}, {} objects, {} frames".format(
+        args.res[0], args.res[1], args.proc_res[0], args.proc_res[1], args.objects, args.frames))
+    for backend, history, var_t, k, dil in itertools.product(args.backend, args.history,
+                                                             args.var_threshold, args.kernel,
+                                                             args.dilation):
+        params = {'backend': backend, 'history': history, 'varThreshold': var_t,
+                  'kernel_size': (k, k), 'dilation_iter': dil}
+        r = run(args, params)
+        stages = "  ".join("{} {:.2f}".format(k, v) for k, v in r['stages'].items())
+        print("{:<6} history={:<4} varThreshold={:<5g} kernel={} dilation={} | "
+              "{:7.1f} FPS  P {:.3f}  R {:.3f}  gated {:.0%}  allocs {} | ms/frame: {}".format(
+                  backend, history, var_t, k, dil, r['fps'], r['precision'], r['recall'],
+                  r['gated'], r['allocs'], stages))
+
+
+if __name__ == "__main__":
+    main()
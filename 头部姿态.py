@@ -0,0 +1,121 @@
+"""
+头部姿态求解（solvePnP）
+=====================================================
+把 MediaPipe FaceMesh 的几个关键点和一个标准 3D 人脸模型对齐，用
+cv2.solvePnP 解出完整头部姿态：yaw / pitch / roll + 平移。
+
+    - 关键点一次性拷进预分配的 NumPy 数组，不再逐点 np.array
+    - 用上一帧的解做初值（useExtrinsicGuess），每帧迭代次数很少
+    - 重投影误差换算成置信度，方便上层决定要不要相信这一帧
+
+坐标约定（和画面一致）：x 向右、y 向下、z 指向画面里面。
+yaw > 0 脸转向画面右侧，pitch > 0 低头，roll > 0 头向画面右侧歪。
+"""
+
+import math
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# MediaPipe FaceMesh 关键点编号 -> 标准人脸模型坐标（毫米级的相对尺度，鼻尖为原点）
+LANDMARK_IDS = np.array([
+    1,      # 鼻尖
+    152,    # 下巴
+    33,     # 画面左侧眼角
+    263,    # 画面右侧眼角
+    61,     # 画面左侧嘴角
+    291,    # 画面右侧嘴角
+])
+MODEL_POINTS = np.array([
+    (0.0,      0.0,    0.0),
+    (0.0,    330.0,   65.0),
+    (-225.0, -170.0, 135.0),
+    (225.0,  -170.0, 135.0),
+    (-150.0,  150.0, 125.0),
+    (150.0,   150.0, 125.0),
+], dtype=np.float64)
+
+ERROR_SCALE = 8.0       # 平均重投影误差（像素）达到这个值时置信度降为 0
+
+HeadPose = namedtuple('HeadPose', ['yaw', 'pitch', 'roll', 'tvec', 'error', 'confidence'])
+
+
+class HeadPoseSolver:
+    """带热启动的 solvePnP 头部姿态求解器，一路视频流一个实例"""
+
+    def __init__(self, ids=LANDMARK_IDS, model=MODEL_POINTS):
+        self.ids = ids
+        self.model = model
+        self.image_points = np.empty((len(ids), 2), np.float64)   # 每帧复用
+        self.projected = None
+        self.camera = np.eye(3, dtype=np.float64)
+        self.dist = np.zeros((4, 1), np.float64)
+        self.frame_size = None
+        self.rvec = None
+        self.tvec = None
+
+    def reset(self):
+        """丢脸后调用，下一帧重新冷启动"""
+        self.rvec = None
+        self.tvec = None
+
+    def _set_frame_size(self, frame_size):
+        # 没有标定时用经验内参：焦距 ≈ 画面宽度，主点在中心
+        w, h = frame_size
+        self.camera[0, 0] = self.camera[1, 1] = w
+        self.camera[0, 2] = w / 2.0
+        self.camera[1, 2] = h / 2.0
+        self.frame_size = frame_size
+
+    def extract(self, landmarks, frame_size):
+        """把需要的关键点（归一化坐标）一次性取到 image_points（像素坐标）
+
+        landmarks 可以是 MediaPipe 的 landmark 列表（或 头部跟踪.FaceLandmarks，只按编号取这几个点），
+        也可以是 (N, 2+) 的数组（回放用）。
+        """
+        pts = self.image_points
+        if isinstance(landmarks, np.ndarray):
+            pts[:] = landmarks[self.ids, :2]
+        else:
+            for i, idx in enumerate(self.ids):
+                p = landmarks[idx]
+                pts[i, 0] = p.x
+                pts[i, 1] = p.y
+        pts[:, 0] *= frame_size[0]
+        pts[:, 1] *= frame_size[1]
+        return pts
+
+    def solve(self, landmarks, frame_size):
+        """求解一帧，返回 HeadPose；解不出来返回 None"""
+        if frame_size != self.frame_size:
+            self._set_frame_size(frame_size)
+            self.reset()
+        pts = self.extract(landmarks, frame_size)
+
+        if self.rvec is None:
+            flags = getattr(cv2, 'SOLVEPNP_SQPNP', cv2.SOLVEPNP_EPNP)
+            ok, rvec, tvec = cv2.solvePnP(self.model, pts, self.camera, self.dist, flags=flags)
+        else:
+            ok, rvec, tvec = cv2.solvePnP(self.model, pts, self.camera, self.dist,
+                                          self.rvec, self.tvec, useExtrinsicGuess=True,
+                                          flags=cv2.SOLVEPNP_ITERATIVE)
+        if not ok or tvec[2, 0] <= 0:
+            # 解到了相机背后之类的退化情况，下次冷启动
+            self.reset()
+            return None
+        self.rvec, self.tvec = rvec, tvec
+
+        # 重投影误差 -> 置信度
+        self.projected, _ = cv2.projectPoints(self.model, rvec, tvec, self.camera, self.dist,
+                                              self.projected)
+        error = float(np.mean(np.linalg.norm(self.projected[:, 0, :] - pts, axis=1)))
+        confidence = max(0.0, 1.0 - error / ERROR_SCALE)
+
+        # 脸朝向 = 模型里指向相机的方向 (0, 0, -1) 旋转到相机坐标系
+        rot, _ = cv2.Rodrigues(rvec)
+        fx, fy, fz = -rot[0, 2], -rot[1, 2], -rot[2, 2]
+        yaw = math.atan2(fx, -fz)
+        pitch = math.asin(max(-1.0, min(1.0, fy)))
+        roll = math.atan2(rot[1, 0], rot[0, 0])
+        return HeadPose(yaw, pitch, roll, tvec.ravel().copy(), error, confidence)
@@ -0,0 +1,140 @@
+"""
+头部跟踪个人校准
+=====================================================
+依次在屏幕中心和四个角显示目标点，用户把头转向目标（用鼻尖去“指”它），
+每个点先等 SETTLE 秒让头稳住，再采 SAMPLE 秒的 (yaw, pitch) 取中位数。
+五个点拟合出 (yaw, pitch) -> 屏幕坐标 的单应矩阵，写进 头部跟踪.CALIBRATION_PATH，
+头部跟踪.py 启动时读入并预计算查找表，之后不用再校准。
+
+    python 头部校准.py              # 写到默认文件
+    python 头部校准.py my.json      # 写到指定文件
+
+ESC 随时退出（不保存）。
+"""
+
+import sys
+import time
+
+import cv2
+import numpy as np
+import pygame
+
+import 头部跟踪 as tracking
+from 头部姿态 import HeadPoseSolver
+
+SETTLE       = 1.0        # 目标出现后先等多少秒再开始采样
+SAMPLE       = 1.5        # 每个目标采样多少秒
+MIN_SAMPLES  = 10         # 每个目标至少要采到多少帧有效姿态，不够就重来
+MIN_CONFIDENCE = 0.3      # 置信度低于这个的帧不要
+
+
+def calibration_targets():
+    """中心 + 四个角；角点内缩 GLOW_RADIUS，正好是光球能到达的最远位置"""
+    w, h, r = tracking.WINDOW_WIDTH, tracking.WINDOW_HEIGHT, tracking.GLOW_RADIUS
+    return [(w / 2, h / 2), (r, r), (w - r, r), (w - r, h - r), (r, h - r)]
+
+
+def draw_target(screen, font, target, progress, text):
+    screen.fill((0, 0, 0))
+    x, y = int(target[0]), int(target[1])
+    pygame.draw.circle(screen, (60, 60, 60), (x, y), 40, 2)
+    if progress > 0:
+        pygame.draw.circle(screen, (100, 255, 255), (x, y), int(8 + 32 * progress))
+    pygame.draw.circle(screen, (255, 255, 255), (x, y), 6)
+    label = font.render(text, True, (180, 180, 180))
+    screen.blit(label, label.get_rect(center=(tracking.WINDOW_WIDTH // 2, tracking.WINDOW_HEIGHT - 60)))
+    pygame.display.flip()
+
+
+def read_pose(cap, face_mesh, solver):
+    """读一帧并求姿态，返回 HeadPose 或 None；摄像头断了返回 False"""
+    ret, frame = cap.read()
+    if not ret:
+        return False
+    frame = cv2.flip(frame, 1)                     # 和 头部跟踪.py 一样镜像
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    results = face_mesh.process(rgb)
+    if not results.multi_face_landmarks:
+        solver.reset()
+        return None
+    pose = solver.solve(results.multi_face_landmarks[0].landmark, (frame.shape[1], frame.shape[0]))
+    if pose is None:
+        solver.reset()
+    return pose
+
+
+def collect(cap, face_mesh, solver, screen, font, target, index, total):
+    """采一个目标点，返回 (yaw 中位数, pitch 中位数)；用户按 ESC 返回 None"""
+    while True:
+        yaws, pitches = [], []
+        t0 = time.perf_counter()
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    return None
+            elapsed = time.perf_counter() - t0
+            if elapsed >= SETTLE + SAMPLE:
+                break
+            pose = read_pose(cap, face_mesh, solver)
+            if pose is False:
+                raise SystemExit("摄像头读取失败")
+            if elapsed >= SETTLE and pose is not None and pose.confidence >= MIN_CONFIDENCE:
+                yaws.append(pose.yaw)
+                pitches.append(pose.pitch)
+            progress = max(0.0, (elapsed - SETTLE) / SAMPLE)
+            draw_target(screen, font, target, progress,
+                        "{}/{}  把头转向这个点并保持不动".format(index + 1, total))
+        if len(yaws) >= MIN_SAMPLES:
+            return float(np.median(yaws)), float(np.median(pitches))
+        draw_target(screen, font, target, 0, "没看清你的脸，再来一次")
+        time.sleep(1.0)
+
+
+def fit(samples):
+    """五点最小二乘拟合单应矩阵，返回 (H, 平均残差像素)"""
+    src = np.array([(s[2], s[3]) for s in samples], np.float64)
+    dst = np.array([(s[0], s[1]) for s in samples], np.float64)
+    H, _ = cv2.findHomography(src, dst, 0)
+    if H is None:
+        raise SystemExit("拟合失败：几个点的头部角度太接近，请转头幅度大一些再试")
+    mapped = cv2.perspectiveTransform(src.reshape(-1, 1, 2), H).reshape(-1, 2)
+    return H, float(np.mean(np.linalg.norm(mapped - dst, axis=1)))
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else tracking.CALIBRATION_PATH
+
+    cap = cv2.VideoCapture(tracking.CAM_SOURCE)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    face_mesh = tracking.make_face_mesh()
+    solver = HeadPoseSolver()
+
+    pygame.init()
+    screen = pygame.display.set_mode((tracking.WINDOW_WIDTH, tracking.WINDOW_HEIGHT), pygame.NOFRAME)
+    pygame.display.set_caption("Head Pose Calibration - ESC to quit")
+    pygame.mouse.set_visible(False)
+    font = pygame.font.SysFont('simhei,microsoftyahei,arial', 36)
+
+    targets = calibration_targets()
+    samples = []
+    try:
+        for i, target in enumerate(targets):
+            result = collect(cap, face_mesh, solver, screen, font, target, i, len(targets))
+            if result is None:
+                print("已取消，未保存")
+                return
+            samples.append((target[0], target[1], result[0], result[1]))
+            print("目标 {}: yaw {:+.3f}  pitch {:+.3f}".format(i + 1, result[0], result[1]))
+    finally:
+        face_mesh.close()
+        cap.release()
+        pygame.quit()
+
+    H, residual = fit(samples)
+    tracking.save_calibration(path, H, samples, (tracking.WINDOW_WIDTH, tracking.WINDOW_HEIGHT))
+    print("已保存到 {}（平均残差 {:.1f} 像素）".format(path, residual))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,142 +1,872 @@
+import os
 import cv2
-import mediapipe as mp
 import pygame
 import numpy as np
 import threading
+import time
+import json
 import math
 import sys
+from collections import namedtuple
+
+try:
+    import mediapipe as mp
+except ImportError:          # 只回放录好的关键点时不需要 MediaPipe
+    mp = None
+
+from 头部姿态 import HeadPoseSolver
 
 # ==================== 配置 ====================
 WINDOW_WIDTH  = 1920      # 改成你的屏幕宽
 WINDOW_HEIGHT = 1080      # 改成你的屏幕高
 CAM_SOURCE    = 0
 SMOOTHING     = 0.60      # 惯性，越小越跟手
-SENSITIVITY   = 3.0       # 核心！！！调高到 3.0 才能抬头低头满屏
+SENSITIVITY   = 3.0       # 核心！！！调高到 3.0 才能抬头低头满屏（没有校准文件时才用）
+CALIBRATION_PATH = 'head_calibration.json'   # 头部校准.py 生成的个人映射；文件不存在时退回 SENSITIVITY
+CALIBRATION_LUT_STEP = 0.005                 # 查找表的角度分辨率（弧度，约 0.3°）
+CALIBRATION_MARGIN   = 0.5                   # 查找表在校准角度范围两侧各外扩的比例
 GLOW_RADIUS   = 180
+GLOW_TINT     = (10, 4, 1)          # 光晕颜色：亮度分别除以这三个数得到 RGB
+GLOW_CORE     = ((255, 255, 255), (100, 255, 255))   # 中心两层实心圆的颜色
+FILTER        = 'one_euro'  # 光标滤波：'exp'（固定指数平滑）/ 'one_euro' / 'kalman'
+PREDICT       = True        # 渲染时按估计速度把光标外推到当前时刻
+PREDICT_MAX   = 0.10        # 最多外推多少秒（丢脸或卡顿时不至于飞出去）
+ONE_EURO_MIN_CUTOFF = 1.0   # One-Euro：静止时的截止频率，越小越稳
+ONE_EURO_BETA       = 0.02  # One-Euro：速度越快截止频率升得越多，越大越跟手
+ONE_EURO_D_CUTOFF   = 1.0   # One-Euro：速度估计的截止频率
+KALMAN_ACCEL_NOISE  = 4000.0  # Kalman：加速度噪声（像素/秒²），越大越跟手
+KALMAN_MEAS_NOISE   = 20.0    # Kalman：测量噪声（像素）
+MAX_FACES     = 1         # >1 开启多人模式：每张脸一个光球
+SEARCH_EVERY  = 10        # 多人模式：每隔多少帧整图搜索一次新面孔，其余帧只跑 ROI
+ROI_PAD       = 0.4       # ROI 在人脸框四周外扩的比例
+ROI_SIZE      = 192       # ROI 统一缩放到这个边长（像素）再送进网格模型
+TRACK_MAX_DIST   = 0.15   # 同一张脸两次结果间质心的最大位移（归一化坐标）
+TRACK_MAX_MISSES = 5      # 连续多少帧找不到就认为这个人离开了
+ORB_TINTS     = [(10, 4, 1), (1, 4, 10), (4, 1, 10), (1, 10, 4)]   # 多人模式各光球配色
+RECORD_PATH   = None      # 设成目录名即录制本次会话（原始帧 + 关键点），供 头部跟踪回放.py 使用
+RECORD_FRAMES = True      # False 时只录关键点，文件小得多，但回放只能从关键点开始
+RECORD_MAX_FRAMES = 9000  # 预分配的最大帧数（30fps 约 5 分钟），录满后停止录制
+PREVIEW_FPS   = 15        # 摄像头预览窗口的刷新率，远低于推理率即可
+PREVIEW_WINDOW = 'Camera - Click × to EXIT'
 # ============================================
 
+# 退出协议：任何线程只负责 set 这个事件；各线程自己退出循环、释放自己持有的资源，
+# 主线程 join 完所有线程后才 pygame.quit()，工作线程里从不碰 pygame / sys.exit
 stop_event = threading.Event()
 
-# MediaPipe
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(
-    max_num_faces=1,
-    refine_landmarks=True,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
-
-cap = cv2.VideoCapture(CAM_SOURCE)
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-# Pygame 全屏黑窗
-pygame.init()
-screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.NOFRAME)
-pygame.display.set_caption("Head Pose Light - Close cam window to exit")
-pygame.mouse.set_visible(False)
-
-cur_x = WINDOW_WIDTH // 2
-cur_y = WINDOW_HEIGHT // 2
-lock = threading.Lock()
-
-# 关键3D点
-NOSE = 1
-CHIN = 152
-LEFT_EYE = 33
-RIGHT_EYE = 263
-
-def get_yaw_pitch(landmarks):
-    n = np.array([landmarks[NOSE].x,    landmarks[NOSE].y,    landmarks[NOSE].z])
-    c = np.array([landmarks[CHIN].x,    landmarks[CHIN].y,    landmarks[CHIN].z])
-    le = np.array([landmarks[LEFT_EYE].x, landmarks[LEFT_EYE].y, landmarks[LEFT_EYE].z])
-    re = np.array([landmarks[RIGHT_EYE].x, landmarks[RIGHT_EYE].y, landmarks[RIGHT_EYE].z])
-    
-    eye_mid = (le + re) / 2
-    face_vec = n - eye_mid                      # 脸朝向向量
-    
-    yaw   = math.atan2(face_vec[0], -face_vec[2])   # 左右
-    pitch = math.asin(np.clip(face_vec[1], -0.99, 0.99))  # 上下
-    
-    return yaw, pitch
-
-def camera_thread():
-    global cur_x, cur_y
-    prev_x = WINDOW_WIDTH // 2
-    prev_y = WINDOW_HEIGHT // 2
-    
+# 一条姿态样本（不可变）：时间戳均为 perf_counter 秒，坐标/速度为屏幕像素
+PoseSample = namedtuple('PoseSample', [
+    'seq',          # 递增序号，渲染端可据此判断是否有新样本
+    'stamp',        # 对应画面的采集时刻
+    'published',    # 发布时刻
+    'yaw', 'pitch', 'roll',   # 头部姿态（弧度）
+    'x', 'y',       # 滤波后的屏幕坐标
+    'vx', 'vy',     # 估计速度（像素/秒），用于外推
+    'confidence',   # 0~1，由重投影误差换算；没找到人脸时为 0
+    'face_id',      # 跟踪身份；多人模式下 -1 表示该槽位没人
+])
+
+class PoseChannel:
+    """相机线程 -> 渲染线程的“最新值”通道
+
+    单写者：只有推理线程调用 publish。每次发布都是一个新的不可变 PoseSample，
+    通过一次属性赋值整体替换（CPython 下引用赋值是原子的），所以读端不加锁、
+    永远不会阻塞，也不会读到半新半旧的数据。
+    """
+
+    def __init__(self, face_id=0):
+        self._latest = PoseSample(0, 0.0, 0.0, 0.0, 0.0, 0.0,
+                                  WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2, 0.0, 0.0, 0.0, face_id)
+        self.closed = False
+
+    def publish(self, **fields):
+        prev = self._latest
+        sample = PoseSample(seq=prev.seq + 1, published=time.perf_counter(), **fields)
+        self._latest = sample
+        return sample
+
+    def latest(self):
+        return self._latest
+
+    def close(self):
+        self.closed = True
+
+# 光球贴图缓存：(半径, 配色) -> Surface，只有参数变了才重画
+_glow_cache = {}
+
+def get_glow_sprite(radius=GLOW_RADIUS, tint=GLOW_TINT, core=GLOW_CORE):
+    """取（必要时生成）预渲染的发光球贴图"""
+    key = (radius, tint, core)
+    sprite = _glow_cache.get(key)
+    if sprite is None:
+        sprite = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+        c = (radius, radius)
+        for r in range(radius, 0, -9):
+            intensity = int(255 * (1 - r/radius * 0.8))
+            color = (intensity//tint[0], intensity//tint[1], intensity//tint[2])
+            pygame.draw.circle(sprite, color, c, r)
+        pygame.draw.circle(sprite, core[0], c, 22)
+        pygame.draw.circle(sprite, core[1], c, 10)
+        sprite = sprite.convert_alpha()
+        if len(_glow_cache) > len(ORB_TINTS):
+            _glow_cache.clear()      # 参数改过了，旧贴图不再需要
+        _glow_cache[key] = sprite
+    return sprite
+
+# ==================== 光标滤波 ====================
+# 统一接口：update(x, y, t) -> (x, y, vx, vy)，t 为采集时间戳（秒）
+
+class ExpFilter:
+    """原来的固定指数平滑，不估计速度（不做外推）"""
+
+    def __init__(self, smoothing=SMOOTHING):
+        self.smoothing = smoothing
+        self.x = None
+        self.y = None
+
+    def update(self, x, y, t):
+        if self.x is None:
+            self.x, self.y = x, y
+        self.x += (x - self.x) * (1 - self.smoothing)
+        self.y += (y - self.y) * (1 - self.smoothing)
+        return self.x, self.y, 0.0, 0.0
+
+class OneEuro1D:
+    """One-Euro 滤波（单轴）：慢时强平滑去抖，快时放开减少拖影"""
+
+    def __init__(self, min_cutoff, beta, d_cutoff):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.x = None
+        self.dx = 0.0
+        self.t = None
+
+    @staticmethod
+    def alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def update(self, x, t):
+        if self.x is None or t <= self.t:
+            self.x, self.t = x, t
+            return self.x, self.dx
+        dt = t - self.t
+        self.t = t
+        dx = (x - self.x) / dt
+        a_d = self.alpha(self.d_cutoff, dt)
+        self.dx += a_d * (dx - self.dx)
+        cutoff = self.min_cutoff + self.beta * abs(self.dx)
+        a = self.alpha(cutoff, dt)
+        self.x += a * (x - self.x)
+        return self.x, self.dx
+
+class OneEuroFilter:
+    def __init__(self, min_cutoff=ONE_EURO_MIN_CUTOFF, beta=ONE_EURO_BETA, d_cutoff=ONE_EURO_D_CUTOFF):
+        self.fx = OneEuro1D(min_cutoff, beta, d_cutoff)
+        self.fy = OneEuro1D(min_cutoff, beta, d_cutoff)
+
+    def update(self, x, y, t):
+        x, vx = self.fx.update(x, t)
+        y, vy = self.fy.update(y, t)
+        return x, y, vx, vy
+
+class Kalman1D:
+    """匀速模型 Kalman（单轴）：状态 [位置, 速度]，协方差用四个标量展开"""
+
+    def __init__(self, accel_noise, meas_noise):
+        self.q = accel_noise ** 2
+        self.r = meas_noise ** 2
+        self.x = None
+        self.v = 0.0
+        self.p = (self.r, 0.0, 0.0, 1e6)   # P00, P01, P10, P11
+        self.t = None
+
+    def update(self, z, t):
+        if self.x is None:
+            self.x, self.t = z, t
+            return self.x, self.v
+        dt = max(t - self.t, 1e-3)
+        self.t = t
+        # 预测
+        x = self.x + self.v * dt
+        p00, p01, p10, p11 = self.p
+        dt2 = dt * dt
+        p00, p01, p10, p11 = (p00 + dt * (p01 + p10) + dt2 * p11 + self.q * dt2 * dt2 / 4,
+                              p01 + dt * p11 + self.q * dt2 * dt / 2,
+                              p10 + dt * p11 + self.q * dt2 * dt / 2,
+                              p11 + self.q * dt2)
+        # 更新
+        s = p00 + self.r
+        k0, k1 = p00 / s, p10 / s
+        y = z - x
+        self.x = x + k0 * y
+        self.v = self.v + k1 * y
+        self.p = (p00 - k0 * p00, p01 - k0 * p01, p10 - k1 * p00, p11 - k1 * p01)
+        return self.x, self.v
+
+class KalmanFilter:
+    def __init__(self, accel_noise=KALMAN_ACCEL_NOISE, meas_noise=KALMAN_MEAS_NOISE):
+        self.fx = Kalman1D(accel_noise, meas_noise)
+        self.fy = Kalman1D(accel_noise, meas_noise)
+
+    def update(self, x, y, t):
+        x, vx = self.fx.update(x, t)
+        y, vy = self.fy.update(y, t)
+        return x, y, vx, vy
+
+FILTERS = {'exp': ExpFilter, 'one_euro': OneEuroFilter, 'kalman': KalmanFilter}
+
+def predict_pose(sample, now):
+    """把最新姿态样本外推到渲染时刻 now，返回屏幕整数坐标"""
+    x, y = sample.x, sample.y
+    if PREDICT and sample.stamp:
+        dt = min(max(now - sample.stamp, 0.0), PREDICT_MAX)
+        x += sample.vx * dt
+        y += sample.vy * dt
+    x = min(max(x, GLOW_RADIUS), WINDOW_WIDTH - GLOW_RADIUS)
+    y = min(max(y, GLOW_RADIUS), WINDOW_HEIGHT - GLOW_RADIUS)
+    return int(x), int(y)
+
+class LatestFrame:
+    """只保留最新一帧的单槽缓冲：采集线程不断覆盖，消费者只取比上次新的帧
+
+    推理跟不上时旧帧直接被覆盖掉（丢帧），保证每次推理用的都是最新画面。
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.frame = None
+        self.stamp = 0.0      # 采集时间戳（perf_counter）
+        self.seq = 0
+        self.closed = False
+
+    def put(self, frame, stamp):
+        with self.cond:
+            self.frame, self.stamp = frame, stamp
+            self.seq += 1
+            self.cond.notify_all()
+
+    def get_newer(self, last_seq, timeout=0.1):
+        """等待比 last_seq 新的帧，超时返回 None"""
+        with self.cond:
+            if self.seq == last_seq and not self.closed:
+                self.cond.wait(timeout)
+            if self.seq == last_seq:
+                return None
+            return self.seq, self.frame, self.stamp
+
+    def peek(self):
+        with self.cond:
+            return self.seq, self.frame, self.stamp
+
+    def close(self):
+        """采集结束：唤醒所有等待者，让它们尽快看到 stop_event"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+class StageTimer:
+    """各阶段延迟统计（毫秒）：均值 + 最大值"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}        # 阶段 -> [总和, 次数, 最大值]
+        self.counters = {}
+
+    def add(self, stage, seconds):
+        ms = seconds * 1000.0
+        with self.lock:
+            d = self.data.setdefault(stage, [0.0, 0, 0.0])
+            d[0] += ms
+            d[1] += 1
+            d[2] = max(d[2], ms)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self):
+        with self.lock:
+            lines = ["{:<10} avg {:6.2f} ms   max {:6.2f} ms".format(k, v[0] / v[1], v[2])
+                     for k, v in self.data.items() if v[1]]
+            lines += ["{:<10} {}".format(k, v) for k, v in self.counters.items()]
+        return "\n".join(lines)
+
+timer = StageTimer()
+
+def capture_thread(cap, latest):
+    """采集：只读帧 + 镜像，立刻覆盖最新帧槽；摄像头归本线程所有，退出时由它释放"""
     while not stop_event.is_set():
         ret, frame = cap.read()
         if not ret:
+            stop_event.set()
             break
-            
+        stamp = time.perf_counter()
         frame = cv2.flip(frame, 1)                     # 镜像
+        latest.put(frame, stamp)
+        timer.count('captured')
+    cap.release()
+    latest.close()
+
+def make_face_mesh(max_faces=1, static=False):
+    if mp is None:
+        raise RuntimeError("需要先 pip install mediapipe 才能做人脸推理")
+    return mp.solutions.face_mesh.FaceMesh(
+        static_image_mode=static,
+        max_num_faces=max_faces,
+        refine_landmarks=True,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+
+# ==================== 个人校准 ====================
+# 头部校准.py 让用户依次看屏幕中心和四个角，记下每个点的 (yaw, pitch)，拟合出
+# 一个 (yaw, pitch) -> 屏幕坐标 的单应矩阵，存成 JSON。启动时读入并在校准角度
+# 范围（外扩 CALIBRATION_MARGIN）上预先算好查找表，运行时只做一次双线性插值。
+
+class CalibrationMap:
+    """预计算的 (yaw, pitch) -> 屏幕坐标 查找表"""
+
+    def __init__(self, homography, yaw_range, pitch_range, screen, step=CALIBRATION_LUT_STEP,
+                 margin=CALIBRATION_MARGIN):
+        span_yaw = yaw_range[1] - yaw_range[0]
+        span_pitch = pitch_range[1] - pitch_range[0]
+        # 没有跨度时表只有一列 / 一行，双线性插值的下标会变成 -1 悄悄绕到最后一格
+        for name, span in (('yaw', span_yaw), ('pitch', span_pitch)):
+            if not span > 0:
+                raise ValueError("校准数据的 {} 范围是 {!r}，几个目标点的头部角度没有拉开；"
+                                 "请重新运行 头部校准.py，转头幅度大一些".format(name, span))
+        self.yaw0 = yaw_range[0] - span_yaw * margin
+        self.pitch0 = pitch_range[0] - span_pitch * margin
+        self.step = step
+        nx = max(2, int(math.ceil(span_yaw * (1 + 2 * margin) / step)) + 1)
+        ny = max(2, int(math.ceil(span_pitch * (1 + 2 * margin) / step)) + 1)
+        self.max_i = nx - 1
+        self.max_j = ny - 1
+
+        # 网格上的每个角度组合一次性过单应矩阵
+        yaw, pitch = np.meshgrid(self.yaw0 + np.arange(nx) * step,
+                                 self.pitch0 + np.arange(ny) * step)
+        grid = np.stack([yaw, pitch], axis=-1).reshape(-1, 1, 2)
+        mapped = cv2.perspectiveTransform(grid, np.asarray(homography, np.float64)).reshape(ny, nx, 2)
+        # 校准时的屏幕尺寸和现在不同就按比例缩放
+        mapped[..., 0] *= WINDOW_WIDTH / screen[0]
+        mapped[..., 1] *= WINDOW_HEIGHT / screen[1]
+        self.lut_x = np.clip(mapped[..., 0], GLOW_RADIUS, WINDOW_WIDTH - GLOW_RADIUS).astype(np.float32)
+        self.lut_y = np.clip(mapped[..., 1], GLOW_RADIUS, WINDOW_HEIGHT - GLOW_RADIUS).astype(np.float32)
+
+    def lookup(self, yaw, pitch):
+        # 超出表范围的角度钳到边上（那里早已贴着屏幕边缘）
+        fi = min(max((yaw - self.yaw0) / self.step, 0.0), self.max_i)
+        fj = min(max((pitch - self.pitch0) / self.step, 0.0), self.max_j)
+        i = min(int(fi), self.max_i - 1)
+        j = min(int(fj), self.max_j - 1)
+        ax, ay = fi - i, fj - j
+        lx, ly = self.lut_x, self.lut_y
+        w00, w01, w10, w11 = (1 - ax) * (1 - ay), ax * (1 - ay), (1 - ax) * ay, ax * ay
+        x = w00 * lx[j, i] + w01 * lx[j, i + 1] + w10 * lx[j + 1, i] + w11 * lx[j + 1, i + 1]
+        y = w00 * ly[j, i] + w01 * ly[j, i + 1] + w10 * ly[j + 1, i] + w11 * ly[j + 1, i + 1]
+        return float(x), float(y)
+
+def save_calibration(path, homography, samples, screen):
+    """samples: [(屏幕 x, 屏幕 y, yaw, pitch), ...]"""
+    yaws = [s[2] for s in samples]
+    pitches = [s[3] for s in samples]
+    profile = {
+        'screen': list(screen),
+        'homography': np.asarray(homography, np.float64).tolist(),
+        'yaw_range': [min(yaws), max(yaws)],
+        'pitch_range': [min(pitches), max(pitches)],
+        'samples': [{'target': [x, y], 'yaw': yaw, 'pitch': pitch} for x, y, yaw, pitch in samples],
+    }
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2)
+
+def load_calibration(path=CALIBRATION_PATH):
+    """读校准文件并预计算查找表；没有文件返回 None（退回线性映射）"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        profile = json.load(f)
+    return CalibrationMap(profile['homography'], profile['yaw_range'], profile['pitch_range'],
+                          profile['screen'])
+
+calibration = None            # main() 启动时载入
+
+def pose_to_target(pose):
+    """头部姿态 -> 屏幕目标点（未滤波）"""
+    if calibration is not None:
+        return calibration.lookup(pose.yaw, pose.pitch)
+
+    # 没校准：SENSITIVITY 越大，转头/抬头越小的角度就能满屏
+    # solvePnP 的 pitch 正视时为 0，所以纵向以屏幕中心为基准
+    target_x = WINDOW_WIDTH / 2  + pose.yaw   * WINDOW_WIDTH  * SENSITIVITY
+    target_y = WINDOW_HEIGHT / 2 + pose.pitch * WINDOW_HEIGHT * SENSITIVITY
+
+    target_x = float(np.clip(target_x, GLOW_RADIUS, WINDOW_WIDTH  - GLOW_RADIUS))
+    target_y = float(np.clip(target_y, GLOW_RADIUS, WINDOW_HEIGHT - GLOW_RADIUS))
+    return target_x, target_y
+
+def publish_pose(channel, pose_filter, pose, stamp, face_id=0):
+    """滤波并发布一帧姿态；pose 为 None 表示这张脸这一帧丢了"""
+    if pose is None:
+        # 丢脸：光标停在原地，速度清零，渲染端不再外推
+        prev = channel.latest()
+        return channel.publish(stamp=stamp, yaw=prev.yaw, pitch=prev.pitch, roll=prev.roll,
+                               x=prev.x, y=prev.y, vx=0.0, vy=0.0, confidence=0.0,
+                               face_id=face_id)
+    target_x, target_y = pose_to_target(pose)
+    # 滤波时间轴用采集时间戳，和渲染外推对齐
+    sx, sy, vx, vy = pose_filter.update(target_x, target_y, stamp)
+    sample = channel.publish(stamp=stamp, yaw=pose.yaw, pitch=pose.pitch, roll=pose.roll,
+                             x=sx, y=sy, vx=vx, vy=vy, confidence=pose.confidence,
+                             face_id=face_id)
+    timer.add('publish', sample.published - stamp)   # 采集到光标更新
+    return sample
+
+# ==================== 多人跟踪 ====================
+
+# 人脸框只看脸部轮廓最外侧的四个点：额头顶、下巴、画面左右两侧脸颊
+BBOX_IDS = (10, 152, 234, 454)
+
+LandmarkPoint = namedtuple('LandmarkPoint', ['x', 'y', 'z'])
+
+class FaceLandmarks:
+    """MediaPipe 关键点列表的包装，坐标换算到整幅画面的归一化坐标
+
+    不把 478 个点整体转成数组：HeadPoseSolver 和人脸框只按编号取用到的几个点，
+    取的时候才按 ROI 的偏移 / 缩放换算。只有录制会话时才需要全部点（to_array）。
+    """
+
+    def __init__(self, landmarks, roi=None, frame_size=None):
+        self.landmarks = landmarks
+        self.ox = self.oy = 0.0
+        self.sx = self.sy = 1.0
+        if roi is not None:
+            w, h = frame_size
+            rx, ry, rw, rh = roi
+            self.ox, self.oy = rx / w, ry / h
+            self.sx, self.sy = rw / w, rh / h    # MediaPipe 的 z 与图像宽度同尺度，也按 sx 缩放
+
+    def __len__(self):
+        return len(self.landmarks)
+
+    def __getitem__(self, idx):
+        p = self.landmarks[idx]
+        return LandmarkPoint(self.ox + p.x * self.sx, self.oy + p.y * self.sy, p.z * self.sx)
+
+    def to_array(self, count=None):
+        """前 count 个（默认全部）关键点 -> (N, 3) 数组"""
+        points = np.array([(p.x, p.y, p.z) for p in self.landmarks[:count]], dtype=np.float64)
+        points[:, 0] = self.ox + points[:, 0] * self.sx
+        points[:, 1] = self.oy + points[:, 1] * self.sy
+        points[:, 2] *= self.sx
+        return points
+
+def landmark_bbox(landmarks):
+    """人脸框 (x0, y0, x1, y1)，归一化坐标"""
+    pts = [landmarks[i] for i in BBOX_IDS]
+    xs = [p.x for p in pts]
+    ys = [p.y for p in pts]
+    return min(xs), min(ys), max(xs), max(ys)
+
+def roi_from_bbox(bbox, frame_size, pad=ROI_PAD):
+    """人脸框四周外扩 pad 倍后的正方形像素 ROI (x, y, w, h)，整体平移/裁剪到画面内"""
+    w, h = frame_size
+    x0, y0, x1, y1 = bbox
+    cx, cy = (x0 + x1) / 2 * w, (y0 + y1) / 2 * h
+    side = max((x1 - x0) * w, (y1 - y0) * h) * (1 + 2 * pad)
+    side = int(min(max(side, 16), w, h))
+    rx = int(min(max(cx - side / 2, 0), w - side))
+    ry = int(min(max(cy - side / 2, 0), h - side))
+    return rx, ry, side, side
+
+class FaceTrack:
+    """一张被跟踪的脸：自己的 ROI 网格模型、姿态求解器和滤波器"""
+
+    def __init__(self, track_id, slot, points):
+        self.id = track_id
+        self.slot = slot                  # 对应的光球 / 通道编号
+        self.mesh = make_face_mesh(1)
+        self.roi_buf = np.empty((ROI_SIZE, ROI_SIZE, 3), np.uint8)   # 缩放后的 ROI，每帧复用
+        self.solver = HeadPoseSolver()
+        self.filter = FILTERS[FILTER]()
+        self.points = points
+        self.bbox = landmark_bbox(points)
+        self.misses = 0
+
+    def centroid(self):
+        x0, y0, x1, y1 = self.bbox
+        return (x0 + x1) / 2, (y0 + y1) / 2
+
+    def distance(self, cx, cy):
+        """人脸框质心到 (cx, cy) 的距离，归一化坐标"""
+        tx, ty = self.centroid()
+        return math.hypot(cx - tx, cy - ty)
+
+    def update(self, points):
+        self.points = points
+        self.bbox = landmark_bbox(points)
+        self.misses = 0
+
+    def reassign(self, track_id, points):
+        """这个槽位换成另一张脸：身份、求解器和滤波器从头开始，网格模型留着复用"""
+        self.id = track_id
+        self.solver = HeadPoseSolver()
+        self.filter = FILTERS[FILTER]()
+        self.update(points)
+
+    def close(self):
+        self.mesh.close()
+
+class FaceTracker:
+    """人脸跟踪：每 search_every 帧整图找一次脸，其余帧每张脸只在自己的 ROI 里跑网格
+
+    ROI 是上一帧人脸框外扩后的正方形，缩放到固定的 ROI_SIZE，推理开销和画面分辨率、
+    人脸远近都无关。有脸在 ROI 里丢了，当帧补一次整图搜索把它找回来；
+    ROI 里找到了的脸保留 ROI 的结果，整图搜索只用来填丢了的轨迹和新面孔。
+    search_every=0 表示只在丢失时才整图搜索（单人模式）。
+
+    身份靠相邻两次结果的人脸框质心最近匹配来保持。整图搜索的开销被摊到多帧上，
+    ROI 推理又比整图小得多，所以人数增加时总开销增长远慢于线性。
+    """
+
+    def __init__(self, max_faces=MAX_FACES, search_every=SEARCH_EVERY):
+        self.max_faces = max_faces
+        self.search_every = search_every
+        self.search_mesh = make_face_mesh(max_faces, static=True)
+        self.tracks = []
+        self.free_slots = list(range(max_faces))
+        self.next_id = 0
+        self.frame_index = 0
+
+    def update(self, rgb):
+        """处理一帧，返回 (本帧有新关键点的轨迹, 本帧被删除的轨迹)"""
+        frame_size = (rgb.shape[1], rgb.shape[0])
+        updated = []
+        if not self.tracks or (self.search_every and self.frame_index % self.search_every == 0):
+            updated = self._search(rgb)
+        else:
+            lost = False
+            for track in self.tracks:
+                if self._track_roi(track, rgb, frame_size):
+                    updated.append(track)
+                else:
+                    lost = True
+                    timer.count('roi_lost')
+            if lost:
+                # 只为丢了的脸整图搜索一次，ROI 里找到的脸不动
+                updated += self._search(rgb, keep=updated)
+        self.frame_index += 1
+
+        removed = [t for t in self.tracks if t.misses > TRACK_MAX_MISSES]
+        for track in removed:
+            self.tracks.remove(track)
+            self.free_slots.append(track.slot)
+            track.close()
+        return updated, removed
+
+    def _search(self, rgb, keep=()):
+        """整图搜索：把检测结果按质心距离匹配到已有轨迹，多出来的新建轨迹
+
+        keep 是本帧已经在 ROI 里更新过的轨迹：落在它们附近的检测结果就是它们自己，跳过。
+        离所有轨迹都远的检测结果优先占空槽位；没有空槽位时直接顶替本帧没匹配上的旧轨迹
+        （单人模式下头转得太快、ROI 跟丢后脸出现在远处就是这种情况），不等它连丢
+        TRACK_MAX_MISSES 帧被删掉，否则这段时间光标会一直停在原地。
+        返回本帧由搜索更新或新建的轨迹（不含 keep）。
+        """
+        results = self.search_mesh.process(rgb)
+        timer.count('searches')
+        found = [FaceLandmarks(f.landmark) for f in (results.multi_face_landmarks or [])]
+
+        updated = []
+        unmatched = [t for t in self.tracks if t not in keep]
+        far = []                     # 离所有轨迹都太远的检测结果：(质心, 关键点)
+        for points in found:
+            x0, y0, x1, y1 = landmark_bbox(points)
+            cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+            if any(t.distance(cx, cy) < TRACK_MAX_DIST for t in keep):
+                continue
+            best, best_d = None, TRACK_MAX_DIST
+            for track in unmatched:
+                d = track.distance(cx, cy)
+                if d < best_d:
+                    best, best_d = track, d
+            if best is not None:
+                unmatched.remove(best)
+                best.update(points)
+                updated.append(best)
+            else:
+                far.append(((cx, cy), points))
+
+        # 近的都匹配完了再处理远的，免得远处的新脸抢走本来能匹配上的轨迹
+        for (cx, cy), points in far:
+            if self.free_slots:
+                track = FaceTrack(self.next_id, self.free_slots.pop(0), points)
+                self.tracks.append(track)
+            elif unmatched:
+                track = min(unmatched, key=lambda t: t.distance(cx, cy))
+                unmatched.remove(track)
+                track.reassign(self.next_id, points)
+                timer.count('reassigned')
+            else:
+                continue
+            self.next_id += 1
+            updated.append(track)
+        for track in unmatched:
+            track.misses += 1
+        return updated
+
+    def _track_roi(self, track, rgb, frame_size):
+        """只在这张脸上一帧位置附近的 ROI 里跑网格；丢失的计数交给随后的整图搜索"""
+        x, y, w, h = roi_from_bbox(track.bbox, frame_size)
+        # 归一化坐标与缩放无关，所以缩放后的结果可以直接按原 ROI 换算回整图
+        crop = cv2.resize(rgb[y:y + h, x:x + w], (ROI_SIZE, ROI_SIZE), dst=track.roi_buf,
+                          interpolation=cv2.INTER_AREA if w > ROI_SIZE else cv2.INTER_LINEAR)
+        results = track.mesh.process(crop)
+        if not results.multi_face_landmarks:
+            return False
+        track.update(FaceLandmarks(results.multi_face_landmarks[0].landmark, (x, y, w, h), frame_size))
+        return True
+
+    def close(self):
+        for track in self.tracks:
+            track.close()
+        self.search_mesh.close()
+
+# ==================== 会话录制 ====================
+# 一次会话是一个目录：
+#   frames.npy     (N, H, W, 3) uint8   原始（已镜像）画面，可选
+#   landmarks.npy  (N, 478, 3)  float32 主人脸的归一化关键点，没脸的帧为 NaN
+#   stamps.npy     (N,)         float64 采集时间（秒，相对第一帧）
+#   index.json     有效帧数、画面大小等
+# 数组都是预分配的内存映射文件，录制时只是往映射里拷贝，不产生额外分配。
+
+NUM_LANDMARKS = 478          # refine_landmarks=True 时 FaceMesh 的关键点数
+
+class SessionRecorder:
+    """把原始帧和关键点录进内存映射的 .npy 文件"""
+
+    def __init__(self, path, frame_size, max_frames=RECORD_MAX_FRAMES, save_frames=RECORD_FRAMES):
+        os.makedirs(path, exist_ok=True)
+        w, h = frame_size
+        open_memmap = np.lib.format.open_memmap
+        self.path = path
+        self.frame_size = frame_size
+        self.max_frames = max_frames
+        self.frames = None
+        if save_frames:
+            self.frames = open_memmap(os.path.join(path, 'frames.npy'), mode='w+',
+                                      dtype=np.uint8, shape=(max_frames, h, w, 3))
+        self.landmarks = open_memmap(os.path.join(path, 'landmarks.npy'), mode='w+',
+                                     dtype=np.float32, shape=(max_frames, NUM_LANDMARKS, 3))
+        self.stamps = open_memmap(os.path.join(path, 'stamps.npy'), mode='w+',
+                                  dtype=np.float64, shape=(max_frames,))
+        self.count = 0
+        self.t0 = None
+
+    def add(self, frame, stamp, points):
+        """录一帧；points 为 FaceLandmarks，None 表示没找到脸。录满返回 False"""
+        if self.count >= self.max_frames:
+            return False
+        if self.t0 is None:
+            self.t0 = stamp
+        i = self.count
+        if self.frames is not None:
+            self.frames[i] = frame
+        if points is None:
+            self.landmarks[i] = np.nan
+        else:
+            self.landmarks[i] = points.to_array(NUM_LANDMARKS)
+        self.stamps[i] = stamp - self.t0
+        self.count += 1
+        return True
+
+    def close(self):
+        for arr in (self.frames, self.landmarks, self.stamps):
+            if arr is not None:
+                arr.flush()
+        with open(os.path.join(self.path, 'index.json'), 'w') as f:
+            json.dump({'count': self.count, 'frame_size': list(self.frame_size),
+                       'has_frames': self.frames is not None,
+                       'landmarks': NUM_LANDMARKS}, f)
+
+def load_session(path):
+    """只读方式打开一次录制，返回 (index, frames 或 None, landmarks, stamps)，都截到有效帧数"""
+    with open(os.path.join(path, 'index.json')) as f:
+        index = json.load(f)
+    n = index['count']
+    frames = None
+    if index['has_frames']:
+        frames = np.load(os.path.join(path, 'frames.npy'), mmap_mode='r')[:n]
+    landmarks = np.load(os.path.join(path, 'landmarks.npy'), mmap_mode='r')[:n]
+    stamps = np.load(os.path.join(path, 'stamps.npy'), mmap_mode='r')[:n]
+    return index, frames, landmarks, stamps
+
+def inference_thread(latest, channels):
+    """推理：总是取最新帧，过期的帧直接跳过；是所有 channel 唯一的写者"""
+    multi = MAX_FACES > 1
+    tracker = FaceTracker(MAX_FACES, SEARCH_EVERY if multi else 0)
+    recorder = None
+    last_seq = 0
+
+    while not stop_event.is_set():
+        item = latest.get_newer(last_seq)
+        if item is None:
+            continue
+        seq, frame, stamp = item
+        if last_seq and seq - last_seq > 1:
+            timer.count('dropped', seq - last_seq - 1)
+        last_seq = seq
+        frame_size = (frame.shape[1], frame.shape[0])
+
+        t0 = time.perf_counter()
+        timer.add('wait', t0 - stamp)                  # 采集到开始推理
         rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = face_mesh.process(rgb)
-        
-        if results.multi_face_landmarks:
-            lm = results.multi_face_landmarks[0].landmark
-            yaw, pitch = get_yaw_pitch(lm)
-            
-            # 核心：这里除以 3.14*0.9 ≈ π 让 ±45° 左右就能满屏
-            target_x = WINDOW_WIDTH / 2  + yaw   * WINDOW_WIDTH  * SENSITIVITY
-            target_y = WINDOW_HEIGHT / 4 + pitch * WINDOW_HEIGHT * SENSITIVITY
-            
-            target_x = np.clip(target_x, GLOW_RADIUS, WINDOW_WIDTH  - GLOW_RADIUS)
-            target_y = np.clip(target_y, GLOW_RADIUS, WINDOW_HEIGHT - GLOW_RADIUS)
-            
-            sx = prev_x + (target_x - prev_x) * (1 - SMOOTHING)
-            sy = prev_y + (target_y - prev_y) * (1 - SMOOTHING)
-            
-            with lock:
-                cur_x, cur_y = int(sx), int(sy)
-            prev_x, prev_y = sx, sy
-        
-        # 纯画面！一个像素都不画
-        small = cv2.resize(frame, (400, 300))
-        cv2.imshow('Camera - Click × to EXIT', small)
-        
+        updated, removed = tracker.update(rgb)
+        t1 = time.perf_counter()
+        timer.add('infer', t1 - t0)
+        timer.count('inferred')
+
+        for track in updated:
+            pose = track.solver.solve(track.points, frame_size)
+            if pose is None:
+                track.solver.reset()       # 下次重新冷启动求解
+            # 单人模式光球一直显示，身份固定为 0
+            publish_pose(channels[track.slot], track.filter, pose, stamp,
+                         track.id if multi else 0)
+        if multi:
+            for track in removed:
+                # 人离开了：这个槽位的光球隐藏
+                publish_pose(channels[track.slot], None, None, stamp, face_id=-1)
+        elif not updated:
+            publish_pose(channels[0], None, None, stamp)
+        timer.add('pose', time.perf_counter() - t1)
+
+        if RECORD_PATH:
+            if recorder is None:
+                recorder = SessionRecorder(RECORD_PATH, frame_size)
+            primary = next((t for t in updated if t.slot == 0), None)
+            if recorder.add(frame, stamp, primary.points if primary is not None else None):
+                timer.count('recorded')
+
+    if recorder is not None:
+        recorder.close()
+    tracker.close()
+    for channel in channels:
+        channel.close()
+
+def preview_thread(latest):
+    """预览：低频显示最新画面，同时负责检测预览窗口关闭"""
+    interval = 1.0 / PREVIEW_FPS
+    while not stop_event.is_set():
+        t0 = time.perf_counter()
+        _, frame, _ = latest.peek()
+        if frame is not None:
+            # 纯画面！一个像素都不画
+            small = cv2.resize(frame, (400, 300))
+            cv2.imshow(PREVIEW_WINDOW, small)
+
         key = cv2.waitKey(1)
         # 点×关闭 或 按q/ESC
         if key == ord('q') or key == 27:
             stop_event.set()
             break
-        if cv2.getWindowProperty('Camera - Click × to EXIT', cv2.WND_PROP_VISIBLE) < 1:
+        if frame is not None and cv2.getWindowProperty(PREVIEW_WINDOW, cv2.WND_PROP_VISIBLE) < 1:
             stop_event.set()
             break
-    
-    cap.release()
+        time.sleep(max(0.0, interval - (time.perf_counter() - t0)))
     cv2.destroyAllWindows()
-    pygame.quit()
-    sys.exit(0)        # 强制干净退出
 
-# 启动摄像头线程
-threading.Thread(target=camera_thread, daemon=False).start()
+def main():
+    global calibration
+    calibration = load_calibration(CALIBRATION_PATH)
+    if calibration is None:
+        print("未找到校准文件 {}，使用 SENSITIVITY 线性映射（运行 头部校准.py 生成）".format(CALIBRATION_PATH))
 
-# 主光球循环
-clock = pygame.time.Clock()
-while not stop_event.is_set():
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
-            stop_event.set()
-    
+    cap = cv2.VideoCapture(CAM_SOURCE)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+
+    # Pygame 全屏黑窗
+    pygame.init()
+    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.NOFRAME)
+    pygame.display.set_caption("Head Pose Light - Close cam window to exit")
+    pygame.mouse.set_visible(False)
+
+    # 采集 / 推理 / 预览 三个线程，各跑各的节奏
+    latest = LatestFrame()
+    # 每个光球一个通道；多人模式下槽位初始为空
+    channels = [PoseChannel(0 if MAX_FACES == 1 else -1) for _ in range(MAX_FACES)]
+    threads = [
+        threading.Thread(target=capture_thread, args=(cap, latest)),
+        threading.Thread(target=inference_thread, args=(latest, channels)),
+        threading.Thread(target=preview_thread, args=(latest,)),
+    ]
+    for t in threads:
+        t.start()
+
+    # 主光球循环：整屏只在第一帧清一次，之后每帧只擦旧位置、贴新位置，
+    # 并且只把这些脏矩形提交给显示
+    clock = pygame.time.Clock()
     screen.fill((0, 0, 0))
-    
-    with lock:
-        x, y = cur_x, cur_y
-    
-    # 发光球
-    for r in range(GLOW_RADIUS, 0, -9):
-        intensity = int(255 * (1 - r/GLOW_RADIUS * 0.8))
-        color = (intensity//10, intensity//4, intensity)
-        pygame.draw.circle(screen, color, (x, y), r)
-    pygame.draw.circle(screen, (255, 255, 255), (x, y), 22)
-    pygame.draw.circle(screen, (100, 255, 255), (x, y), 10)
-    
     pygame.display.flip()
-    clock.tick(120)
+    old_rects = [None] * len(channels)
+    age_sum, age_max, rendered = 0.0, 0.0, 0
+    while not stop_event.is_set() and not channels[0].closed:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                stop_event.set()
+
+        now = time.perf_counter()
+        new_rects = []
+        sprites = []
+        for slot, channel in enumerate(channels):
+            # 无锁读取最新样本；样本年龄 = 渲染时刻 - 采集时刻
+            sample = channel.latest()
+            if sample.face_id < 0:
+                new_rects.append(None)          # 空槽位不画
+                sprites.append(None)
+                continue
+            if sample.stamp:
+                age = now - sample.stamp
+                age_sum += age
+                age_max = max(age_max, age)
+                rendered += 1
+            # 30Hz 左右的姿态在 120Hz 渲染里按速度外推，而不是停在旧位置
+            x, y = predict_pose(sample, now)
+
+            # 发光球（预渲染贴图）
+            tint = GLOW_TINT if len(channels) == 1 else ORB_TINTS[slot % len(ORB_TINTS)]
+            sprite = get_glow_sprite(tint=tint)
+            sprites.append(sprite)
+            new_rects.append(sprite.get_rect(center=(x, y)))
+
+        if new_rects != old_rects:
+            # 光球可能互相重叠：先统一擦掉旧的，再统一贴新的
+            dirty = [r for r in old_rects if r is not None]
+            for r in dirty:
+                screen.fill((0, 0, 0), r)
+            for sprite, r in zip(sprites, new_rects):
+                if r is not None:
+                    screen.blit(sprite, r)
+                    dirty.append(r)
+            pygame.display.update(dirty)
+            old_rects = new_rects
+
+        clock.tick(120)
+
+    # 退出：通知所有线程，等它们各自释放资源后，主线程最后关闭 pygame
+    stop_event.set()
+    for t in threads:
+        t.join()
+    pygame.quit()
+    if rendered:
+        print("sample age avg {:6.2f} ms   max {:6.2f} ms".format(
+            age_sum / rendered * 1000.0, age_max * 1000.0))
+    print(timer.report())
+    sys.exit(0)
 
-# 最终保险退出
-stop_event.set()
-pygame.quit()
-sys.exit(0)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
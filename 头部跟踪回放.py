@@ -0,0 +1,182 @@
+"""
+头部跟踪会话回放 / 基准（不需要摄像头）
+=====================================================
+先在 头部跟踪.py 里把 RECORD_PATH 设成一个目录录一段会话，然后：
+
+    python 头部跟踪回放.py session_dir                    # 无窗口，尽快跑完
+    python 头部跟踪回放.py session_dir --window           # 开窗口看光球
+    python 头部跟踪回放.py session_dir --source frames    # 从原始帧重跑 MediaPipe
+    python 头部跟踪回放.py session_dir --json report.json # 输出报告给 CI 做回归对比
+
+回放把录好的帧或关键点直接送进 姿态求解 -> 滤波 -> 渲染 这条路径，
+输出每个阶段和端到端的耗时（均值 / p50 / p95 / 最大值，毫秒）。
+无窗口时使用 SDL 的 dummy 显示驱动，渲染代码照样执行。
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+import 头部跟踪 as tracking
+from 头部姿态 import HeadPoseSolver
+
+
+class StageStats:
+    """逐帧记录各阶段耗时，最后算分位数"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds * 1000.0)
+
+    def summary(self):
+        out = {}
+        for stage, values in self.samples.items():
+            v = np.asarray(values)
+            out[stage] = {'avg': float(v.mean()), 'p50': float(np.percentile(v, 50)),
+                          'p95': float(np.percentile(v, 95)), 'max': float(v.max())}
+        return out
+
+
+def replay(args):
+    index, frames, landmarks, stamps = tracking.load_session(args.session)
+    n = index['count']
+    frame_size = tuple(index['frame_size'])
+    if n == 0:
+        raise SystemExit("会话里没有帧")
+
+    source = args.source
+    if source == 'auto':
+        source = 'frames' if frames is not None and tracking.mp is not None else 'landmarks'
+    if source == 'frames' and frames is None:
+        raise SystemExit("这段会话没有录原始帧，只能 --source landmarks")
+
+    # pygame 必须在设置好显示驱动之后再初始化
+    if not args.window:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    import pygame
+    pygame.init()
+    screen = pygame.display.set_mode((tracking.WINDOW_WIDTH, tracking.WINDOW_HEIGHT),
+                                     pygame.NOFRAME if args.window else 0)
+    screen.fill((0, 0, 0))
+    pygame.display.flip()
+
+    tracking.calibration = tracking.load_calibration(args.calibration)
+    tracker = tracking.FaceTracker(1, 0) if source == 'frames' else None
+    solver = HeadPoseSolver()
+    pose_filter = tracking.FILTERS[args.filter]()
+    channel = tracking.PoseChannel()
+    sprite = tracking.get_glow_sprite()
+    stats = StageStats()
+    old_rect = None
+    faces = 0
+    # 多轮回放时把时间轴接上，保证滤波器看到的时间单调递增
+    period = float(stamps[-1]) + (float(stamps[-1]) / max(1, n - 1) if n > 1 else 1 / 30.0)
+
+    t_start = time.perf_counter()
+    for rep in range(args.repeat):
+        for i in range(n):
+            t0 = time.perf_counter()
+            stamp = float(stamps[i]) + rep * period
+
+            # 1. 取数据（帧模式下再跑一遍 MediaPipe）
+            if source == 'frames':
+                frame = np.array(frames[i])            # 从内存映射读进来
+                t1 = time.perf_counter()
+                stats.add('load', t1 - t0)
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                updated, _ = tracker.update(rgb)
+                points = updated[0].points if updated else None
+                t2 = time.perf_counter()
+                stats.add('infer', t2 - t1)
+            else:
+                row = landmarks[i]
+                points = None if np.isnan(row[0, 0]) else np.asarray(row, dtype=np.float64)
+                t2 = time.perf_counter()
+                stats.add('load', t2 - t0)
+
+            # 2. 姿态求解
+            pose = solver.solve(points, frame_size) if points is not None else None
+            if pose is None:
+                solver.reset()
+            else:
+                faces += 1
+            t3 = time.perf_counter()
+            stats.add('pose', t3 - t2)
+
+            # 3. 映射 + 滤波 + 发布（和实时路径共用同一个函数）
+            sample = tracking.publish_pose(channel, pose_filter, pose, stamp)
+            t4 = time.perf_counter()
+            stats.add('filter', t4 - t3)
+
+            # 4. 渲染（回放没有真实时钟，按采集时刻渲染，不外推）
+            x, y = tracking.predict_pose(sample, sample.stamp)
+            new_rect = sprite.get_rect(center=(x, y))
+            if new_rect != old_rect:
+                dirty = [new_rect]
+                if old_rect is not None:
+                    screen.fill((0, 0, 0), old_rect)
+                    dirty.append(old_rect)
+                screen.blit(sprite, new_rect)
+                pygame.display.update(dirty)
+                old_rect = new_rect
+            if args.window:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                        pygame.quit()
+                        return None
+            t5 = time.perf_counter()
+            stats.add('render', t5 - t4)
+            stats.add('end_to_end', t5 - t0)
+
+    elapsed = time.perf_counter() - t_start
+    if tracker is not None:
+        tracker.close()
+    pygame.quit()
+
+    total = n * args.repeat
+    return {
+        'session': os.path.abspath(args.session),
+        'source': source,
+        'filter': args.filter,
+        'frames': total,
+        'face_ratio': faces / total,
+        'fps': total / elapsed if elapsed > 0 else float('inf'),
+        'stages_ms': stats.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="头部跟踪会话回放 / 基准")
+    parser.add_argument('session', help="录制目录（头部跟踪.py 的 RECORD_PATH）")
+    parser.add_argument('--source', choices=['auto', 'frames', 'landmarks'], default='auto',
+                        help="从原始帧重跑推理，还是直接用录好的关键点")
+    parser.add_argument('--filter', choices=sorted(tracking.FILTERS), default=tracking.FILTER)
+    parser.add_argument('--calibration', default=tracking.CALIBRATION_PATH,
+                        help="个人校准文件（不存在则用线性映射）")
+    parser.add_argument('--repeat', type=int, default=1, help="重复回放几遍")
+    parser.add_argument('--window', action='store_true', help="开窗口显示（默认无窗口）")
+    parser.add_argument('--json', help="把报告写成 JSON 文件")
+    args = parser.parse_args()
+
+    report = replay(args)
+    if report is None:
+        sys.exit(0)
+    print("{} frames from {} ({} filter)   {:.1f} FPS   face found {:.0%}".format(
+        report['frames'], report['source'], report['filter'], report['fps'], report['face_ratio']))
+    for stage, v in report['stages_ms'].items():
+        print("{:<11} avg {:7.3f}  p50 {:7.3f}  p95 {:7.3f}  max {:7.3f} ms".format(
+            stage, v['avg'], v['p50'], v['p95'], v['max']))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+头部姿态输入源（给游戏用）
+=====================================================
+在后台跑 头部跟踪.py 的 采集 / 推理 线程，不开光球窗口，把每个姿态样本
+作为一条带时间戳的瞄准事件，用本机 UDP 发给游戏：
+
+    python 头部输入.py                 # 发到 127.0.0.1:HEAD_AIM_PORT
+    python "shooting game/终极射击小游戏.py"   # 游戏里按 H 切换头部瞄准，空格射击
+
+发送直接挂在推理线程的 publish 上（推理出结果的那一刻就发出去），
+游戏每帧把收到的数据报一次读空，只用最新的一条——和鼠标事件一样每帧取一次，
+所以延迟不会比鼠标路径更差。
+
+数据报格式（小端，共 36 字节）：
+    4s   魔数 b'HAIM'
+    I    序号
+    d    采集时刻（time.perf_counter，同一台机器上各进程可直接比较）
+    f f  瞄准点，归一化到 0~1（相对头部跟踪的屏幕尺寸）
+    f f  速度，归一化单位/秒，接收端可按它外推到当前时刻
+    f    置信度 0~1，没找到人脸时为 0
+"""
+
+import socket
+import struct
+import threading
+
+import cv2
+
+import 头部跟踪 as tracking
+
+# ==================== 配置 ====================
+HEAD_AIM_HOST = '127.0.0.1'
+HEAD_AIM_PORT = 50515
+# ============================================
+
+AIM_MAGIC = b'HAIM'
+AIM_FORMAT = struct.Struct('<4sIdfffff')
+
+
+class UdpPoseChannel(tracking.PoseChannel):
+    """发布时顺手把样本发成一条 UDP 瞄准事件；仍然保留最新值，供本进程读取"""
+
+    def __init__(self, address, face_id=0):
+        super().__init__(face_id)
+        self.address = address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sent = 0
+
+    def publish(self, **fields):
+        sample = super().publish(**fields)
+        w, h = tracking.WINDOW_WIDTH, tracking.WINDOW_HEIGHT
+        packet = AIM_FORMAT.pack(AIM_MAGIC, sample.seq & 0xFFFFFFFF, sample.stamp,
+                                 sample.x / w, sample.y / h, sample.vx / w, sample.vy / h,
+                                 sample.confidence)
+        try:
+            self.sock.sendto(packet, self.address)
+            self.sent += 1
+        except OSError:
+            pass            # 游戏没开或缓冲区满：丢掉这一条，下一条马上就来
+        return sample
+
+    def close(self):
+        super().close()
+        self.sock.close()
+
+
+def main():
+    tracking.calibration = tracking.load_calibration(tracking.CALIBRATION_PATH)
+
+    cap = cv2.VideoCapture(tracking.CAM_SOURCE)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+
+    # 只有 0 号槽位（主人脸）发给游戏，多人模式下其余槽位照常跟踪但不发送
+    sender = UdpPoseChannel((HEAD_AIM_HOST, HEAD_AIM_PORT), 0 if tracking.MAX_FACES == 1 else -1)
+    channels = [sender] + [tracking.PoseChannel(-1) for _ in range(tracking.MAX_FACES - 1)]
+    latest = tracking.LatestFrame()
+    threads = [
+        threading.Thread(target=tracking.capture_thread, args=(cap, latest)),
+        threading.Thread(target=tracking.inference_thread, args=(latest, channels)),
+        threading.Thread(target=tracking.preview_thread, args=(latest,)),
+    ]
+    for t in threads:
+        t.start()
+    print("头部瞄准事件发往 {}:{}，关闭摄像头窗口或按 q 退出".format(HEAD_AIM_HOST, HEAD_AIM_PORT))
+
+    try:
+        while not tracking.stop_event.is_set():
+            tracking.stop_event.wait(0.2)
+    except KeyboardInterrupt:
+        pass
+    tracking.stop_event.set()
+    for t in threads:
+        t.join()
+    print("sent {} aim events".format(sender.sent))
+    print(tracking.timer.report())
+
+
+if __name__ == "__main__":
+    main()